@@ -0,0 +1 @@
+"""Benchmarks for the example backend. Run modules with ``python -m`` from backend/."""
@@ -0,0 +1,127 @@
+"""Concurrent write throughput and latency on SQLite, before and after tuning.
+
+Each worker repeatedly inserts a payment and then updates its status in a
+second transaction, the way a checkout followed by a webhook does, while
+reader tasks page through payments. "before" uses the engine the library
+builds (rollback journal, default pool); "after" uses the settings from
+``config.get_payment_config`` (WAL, synchronous=NORMAL, busy_timeout,
+mmap_size). Each run gets a fresh database file.
+
+Usage (from backend/)::
+
+    python -m benchmarks.concurrent_writes [--workers 32] [--writes 50] [--readers 4]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Mapping
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_payments.db.models import Base, Payment, PaymentStatus
+
+from config import get_payment_config
+from patches.database import create_tuned_engine
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _run(settings: Mapping[str, Any], workers: int, writes: int, readers: int) -> Dict[str, Any]:
+    engine = create_tuned_engine(settings)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    latencies: List[float] = []
+    errors = 0
+    done = asyncio.Event()
+
+    async def writer(worker: int) -> None:
+        nonlocal errors
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                async with Session() as session:
+                    payment = Payment(
+                        customer_id=f"cust_{worker}",
+                        provider="stripe",
+                        provider_payment_id=f"pi_{worker}_{i}",
+                        amount=10.0,
+                        currency="USD",
+                        status=PaymentStatus.PENDING,
+                    )
+                    session.add(payment)
+                    await session.commit()
+                    await session.execute(
+                        update(Payment)
+                        .where(Payment.id == payment.id)
+                        .values(status=PaymentStatus.COMPLETED)
+                    )
+                    await session.commit()
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async def reader() -> None:
+        while not done.is_set():
+            async with Session() as session:
+                await session.execute(
+                    select(Payment).order_by(Payment.created_at.desc()).limit(50)
+                )
+            await asyncio.sleep(0)
+
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(workers)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*reader_tasks)
+    await engine.dispose()
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "per_second": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--writes", type=int, default=50, help="insert+update pairs per worker")
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    tuned = get_payment_config()["database"]
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = {
+            # What initialize_db builds for SQLite: url and echo only.
+            "before": {"url": f"sqlite+aiosqlite:///{os.path.join(tmp, 'before.db')}", "echo": False},
+            "after": dict(tuned, url=f"sqlite+aiosqlite:///{os.path.join(tmp, 'after.db')}"),
+        }
+        for label, settings in runs.items():
+            result = asyncio.run(_run(settings, args.workers, args.writes, args.readers))
+            print(
+                f"{label:>6}: {result['ok']} ok, {result['errors']} errors, "
+                f"{result['per_second']:.0f} txn pairs/s, "
+                f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Per-request cost of the payment config dependency, rebuilt versus shared.
+
+"before" rebuilds the config on every call, as ``dependencies.get_payment_config``
+used to: it re-reads the environment, rebuilds the provider dicts and
+callback URLs, and validates a new PaymentConfig. "after" returns the shared
+frozen object. The benchmark times the bare call, then whole requests to a
+minimal app whose route depends on it, served in-process over ASGI.
+
+Usage (from backend/)::
+
+    python -m benchmarks.config_dependency [--calls 2000] [--requests 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from fastapi_payments.config.config_schema import PaymentConfig
+
+import dependencies
+from config import get_payment_config
+
+
+def rebuild_payment_config() -> PaymentConfig:
+    return PaymentConfig(**get_payment_config())
+
+
+VARIANTS = {
+    "before": rebuild_payment_config,
+    "after": dependencies.get_payment_config,
+}
+
+
+def _per_call_us(func: Callable[[], PaymentConfig], calls: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def _per_request_us(dependency: Callable[[], PaymentConfig], requests: int) -> float:
+    app = FastAPI()
+
+    @app.get("/config")
+    async def read_default_provider(config: PaymentConfig = Depends(dependency)):
+        return {"default_provider": config.default_provider}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/config")
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/config")
+        return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    for label, dependency in VARIANTS.items():
+        call_us = _per_call_us(dependency, args.calls)
+        request_us = asyncio.run(_per_request_us(dependency, args.requests))
+        print(f"{label:>6}: {call_us:8.1f} us per call, {request_us:8.1f} us per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Latency of GET /customers?search= at a million customers, scan versus index.
+
+Builds a throwaway SQLite database with ``--customers`` generated customers
+(names from small first/last name lists, emails at a handful of weighted
+domains). The trigram index and its triggers exist from the start, so
+loading also shows the write cost of keeping the index in sync. It then
+times the first page (50 rows) of a few kinds of query:
+
+- "scan": the library's ``CustomerRepository.list(search=...)``, an
+  ``ILIKE '%q%'`` filter over name and email, newest first.
+- "indexed": ``customer_search.search_customers``, ranked.
+
+A scan that finds 50 matches early in the newest-first order stops there,
+so it is fastest for very common terms. The indexed search ranks every
+match, so its cost grows with the number of matches instead.
+
+Usage (from backend/)::
+
+    python -m benchmarks.customer_search [--customers 1000000] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_payments.db.models import Customer
+from fastapi_payments.db.repositories.customer_repository import CustomerRepository
+
+import customer_search
+from models import ensure_schema
+
+FIRST_NAMES = (
+    "Aarav Aditi Amit Ananya Arjun Asha Deepak Divya Farhan Gaurav Ishaan Kavya Kiran Lakshmi "
+    "Manish Meera Mohan Neha Nikhil Pooja Pranav Priya Rahul Rajesh Ritu Rohan Sanjay Sara "
+    "Shreya Siddharth Sneha Sunil Tanvi Varun Vikram Zoya"
+).split()
+LAST_NAMES = (
+    "Agarwal Bose Chatterjee Desai Gupta Iyer Jain Joshi Kapoor Khan Kulkarni Kumar Mehta "
+    "Menon Mishra Nair Patel Pillai Rao Reddy Saxena Shah Sharma Singh Sinha Verma"
+).split()
+DOMAINS = (
+    ("gmail.com", 50), ("yahoo.co.in", 15), ("outlook.com", 12), ("rediffmail.com", 8),
+    ("hotmail.com", 6), ("icloud.com", 4), ("acme-corp.in", 3), ("zylker.io", 2),
+)
+
+BATCH = 50_000
+
+
+def _customers(count: int, seed: int) -> Iterator[Tuple[str, str, str, str]]:
+    rng = random.Random(seed)
+    domains, weights = zip(*DOMAINS)
+    start = datetime(2020, 1, 1)
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        domain = rng.choices(domains, weights)[0]
+        email = f"{first.lower()}.{last.lower()}{i}@{domain}"
+        created_at = start + timedelta(seconds=i * 60)
+        yield str(uuid.UUID(int=rng.getrandbits(128))), email, f"{first} {last}", created_at.isoformat(" ")
+
+
+def _load(path: str, count: int, seed: int) -> float:
+    started = time.perf_counter()
+    connection = sqlite3.connect(path)
+    rows = _customers(count, seed)
+    with connection:
+        while True:
+            batch = [row for _, row in zip(range(BATCH), rows)]
+            if not batch:
+                break
+            connection.executemany(
+                "INSERT INTO customers (id, email, name, created_at) VALUES (?, ?, ?, ?)", batch
+            )
+    connection.close()
+    return time.perf_counter() - started
+
+
+async def _median_ms(run: Callable[[], Awaitable[object]], repeat: int) -> float:
+    await run()  # warm the page cache
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def _bench(path: str, count: int, repeat: int) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    await ensure_schema(engine)
+    print(f"loading {count:,} customers ...", flush=True)
+    elapsed = await asyncio.to_thread(_load, path, count, 1)
+    print(f"loaded in {elapsed:.1f} s ({count / elapsed:,.0f} rows/s), database {os.path.getsize(path) / 2**20:,.0f} MiB")
+
+    sessions = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with sessions() as session:
+        some_email = await session.scalar(select(Customer.email).offset(count // 2).limit(1))
+        other_email = await session.scalar(select(Customer.email).offset(count // 3).limit(1))
+    queries: Dict[str, str] = {
+        "exact email": some_email,
+        # Last name and sequence number, e.g. "nair333333"
+        "rare substring": other_email.split("@")[0].split(".")[1],
+        "name prefix": "siddharth kulk",
+        "email domain": "@rediffmail.com",
+        "common term": "priya",
+    }
+    print(f"{'query':>15} {'matches':>9} {'scan ms':>9} {'indexed ms':>11}")
+    async with sessions() as session:
+        for label, query in queries.items():
+            pattern = f"%{query}%"
+            matches = await session.scalar(
+                select(func.count()).where(Customer.email.ilike(pattern) | Customer.name.ilike(pattern))
+            )
+
+            async def scan() -> object:
+                return await CustomerRepository(session).list(
+                    limit=50, search=query, include_provider_customers=False
+                )
+
+            async def indexed() -> object:
+                return await customer_search.search_customers(
+                    session, query=query, default_provider="stripe", limit=50
+                )
+
+            scan_ms = await _median_ms(scan, repeat)
+            indexed_ms = await _median_ms(indexed, repeat)
+            print(f"{label:>15} {matches:>9,} {scan_ms:>9.1f} {indexed_ms:>11.1f}", flush=True)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(_bench(os.path.join(tmp, "search.db"), args.customers, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
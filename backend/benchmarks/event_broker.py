@@ -0,0 +1,91 @@
+"""Publish throughput of the in-memory broker versus the Redis stream broker.
+
+Every variant publishes the same events through ``EventPublisher.publish_event``
+from ``--concurrency`` tasks at once, the way concurrent requests do. The
+Redis variants wait for Redis to acknowledge each event. "unbatched" writes
+one event per round trip (``batch_size=1``), "batched" uses the configured
+batch size.
+
+Without ``--redis-url`` the Redis variants run against fakeredis's TCP server
+in a background thread. That still makes real socket round trips, but the
+single-threaded Python server is so slow that it hides the gain from
+batching. Point ``--redis-url`` at a real Redis for meaningful numbers.
+
+Usage (from backend/)::
+
+    python -m benchmarks.event_broker [--events 20000] [--concurrency 200] [--redis-url redis://localhost:6379/15]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, Optional
+
+from fastapi_payments.config.config_schema import MessagingConfig
+from fastapi_payments.messaging.publishers import PaymentEvents
+
+from config import get_event_broker_config
+from event_broker import EventPublisher
+
+STREAM = "bench:events"
+
+
+@contextmanager
+def _fake_redis_url() -> Iterator[str]:
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f"redis://{host}:{port}/0"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def _events_per_second(publisher: EventPublisher, events: int, concurrency: int) -> float:
+    data = {"payment_id": "pay_bench", "amount": 4999, "currency": "INR", "status": "completed"}
+    per_task = events // concurrency
+
+    async def publish_many() -> None:
+        for _ in range(per_task):
+            await publisher.publish_event(PaymentEvents.PAYMENT_SUCCEEDED, data)
+
+    await publisher.publish_event(PaymentEvents.PAYMENT_SUCCEEDED, data)  # connect
+    started = time.perf_counter()
+    await asyncio.gather(*(publish_many() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await publisher.stop()
+    return per_task * concurrency / elapsed
+
+
+def _publisher(broker_type: str, url: Optional[str], **overrides: Any) -> EventPublisher:
+    settings: Dict[str, Any] = dict(get_event_broker_config(), stream=STREAM, **overrides)
+    return EventPublisher(MessagingConfig(broker_type=broker_type, url=url), settings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--redis-url", help="a Redis database the benchmark may write to")
+    args = parser.parse_args()
+
+    with _fake_redis_url() if args.redis_url is None else nullcontext(args.redis_url) as url:
+        variants = {
+            "memory": lambda: _publisher("memory", None),
+            "redis, unbatched": lambda: _publisher("redis", url, batch_size=1),
+            "redis, batched": lambda: _publisher("redis", url),
+        }
+        for label, make in variants.items():
+            rate = asyncio.run(_events_per_second(make(), args.events, args.concurrency))
+            print(f"{label:>16}: {rate:10,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
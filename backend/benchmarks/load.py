@@ -0,0 +1,362 @@
+"""Load test the example backend over HTTP with stubbed providers.
+
+Starts ``main.app`` under uvicorn on a free local port, against a throwaway
+SQLite database, with ``StubProvider`` standing in for Stripe, PayU,
+Cashfree and Razorpay (``--provider-latency`` simulates their round-trip).
+It seeds customers, products and plans for every provider and then drives
+a weighted request mix from ``--concurrency`` clients:
+
+- ``GET /customers`` (one page)
+- ``POST /payments``
+- ``POST /customers/{customer_id}/subscriptions``
+- ``POST /razorpay/verify-payment``
+
+It prints throughput and p50/p95/p99 latency per route and writes the same
+numbers as JSON. Pass an earlier result file as ``--compare`` to print the
+change per route; the run exits with status 1 if any route's p99 grew by
+more than ``--tolerance``.
+
+Usage (from backend/)::
+
+    python -m benchmarks.load [--mix checkout] [--requests 2000] [--concurrency 32]
+                              [--output results.json] [--compare baseline.json]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+# Route weights per mix. Keys are the route templates used in the report.
+MIXES: Dict[str, Dict[str, int]] = {
+    "checkout": {
+        "GET /customers": 4,
+        "POST /payments": 3,
+        "POST /customers/{customer_id}/subscriptions": 2,
+        "POST /razorpay/verify-payment": 1,
+    },
+    "read-heavy": {
+        "GET /customers": 8,
+        "POST /payments": 1,
+        "POST /customers/{customer_id}/subscriptions": 1,
+    },
+    "write-heavy": {
+        "POST /payments": 4,
+        "POST /customers/{customer_id}/subscriptions": 3,
+        "POST /razorpay/verify-payment": 3,
+    },
+    # Concurrent Checkout JS handlers posting back to us.
+    "verify": {
+        "POST /razorpay/verify-payment": 1,
+    },
+}
+
+PROVIDERS = ("stripe", "payu", "cashfree", "razorpay")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Fixtures:
+    """Ids created during seeding that the request mix draws from."""
+
+    def __init__(self) -> None:
+        self.customers: Dict[str, List[str]] = {}
+        self.plans: Dict[str, str] = {}
+        self.razorpay_payments: List[str] = []
+
+
+async def _seed(client: httpx.AsyncClient, customers_per_provider: int) -> Fixtures:
+    fixtures = Fixtures()
+    for provider in PROVIDERS:
+        resp = await client.post(
+            "/customers/batch",
+            json={
+                "customers": [
+                    {
+                        "email": f"load-{provider}-{i}@example.com",
+                        "name": f"Load {provider} {i}",
+                        "meta_info": {"provider": provider, "phone": "9999999999"},
+                    }
+                    for i in range(customers_per_provider)
+                ]
+            },
+        )
+        resp.raise_for_status()
+        fixtures.customers[provider] = [
+            result["customer"]["id"] for result in resp.json()["results"]
+        ]
+
+        product = await client.post(
+            "/products", json={"name": f"Load {provider}", "meta_info": {"provider": provider}}
+        )
+        product.raise_for_status()
+        plan = await client.post(
+            f"/products/{product.json()['id']}/plans",
+            json={
+                "name": "Monthly",
+                "amount": 499.0,
+                "currency": "INR",
+                "billing_interval": "month",
+                "meta_info": {"provider": provider},
+            },
+        )
+        plan.raise_for_status()
+        fixtures.plans[provider] = plan.json()["id"]
+
+    for customer_id in fixtures.customers["razorpay"]:
+        payment = await client.post(
+            "/payments",
+            json={"amount": 100.0, "currency": "INR", "customer_id": customer_id, "provider": "razorpay"},
+        )
+        payment.raise_for_status()
+        fixtures.razorpay_payments.append(payment.json()["id"])
+    return fixtures
+
+
+def _requests(fixtures: Fixtures) -> Dict[str, Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]]:
+    def customer(rng: random.Random):  # type: ignore[no-untyped-def]
+        provider = rng.choice(PROVIDERS)
+        return provider, rng.choice(fixtures.customers[provider])
+
+    async def list_customers(client, rng):  # type: ignore[no-untyped-def]
+        return await client.get("/customers", params={"limit": 20})
+
+    async def create_payment(client, rng):  # type: ignore[no-untyped-def]
+        provider, customer_id = customer(rng)
+        return await client.post(
+            "/payments",
+            json={
+                "amount": round(rng.uniform(10, 500), 2),
+                "currency": "INR",
+                "customer_id": customer_id,
+                "provider": provider,
+            },
+        )
+
+    async def create_subscription(client, rng):  # type: ignore[no-untyped-def]
+        provider, customer_id = customer(rng)
+        return await client.post(
+            f"/customers/{customer_id}/subscriptions",
+            json={"plan_id": fixtures.plans[provider], "provider": provider},
+        )
+
+    async def verify_razorpay(client, rng):  # type: ignore[no-untyped-def]
+        return await client.post(
+            "/razorpay/verify-payment",
+            json={
+                "razorpay_payment_id": f"pay_{rng.randrange(10**9)}",
+                "razorpay_order_id": "order_load",
+                "razorpay_signature": "valid",
+                "payment_id": rng.choice(fixtures.razorpay_payments),
+            },
+        )
+
+    return {
+        "GET /customers": list_customers,
+        "POST /payments": create_payment,
+        "POST /customers/{customer_id}/subscriptions": create_subscription,
+        "POST /razorpay/verify-payment": verify_razorpay,
+    }
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    fixtures: Fixtures,
+    mix: Dict[str, int],
+    total: int,
+    concurrency: int,
+    seed: int,
+) -> Dict[str, Any]:
+    senders = _requests(fixtures)
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    plan_rng = random.Random(seed)
+    schedule = plan_rng.choices(routes, weights=weights, k=total)
+
+    latencies: Dict[str, List[float]] = {route: [] for route in routes}
+    errors: Dict[str, int] = {route: 0 for route in routes}
+    cursor = iter(enumerate(schedule))
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        for _, route in cursor:
+            started = time.perf_counter()
+            try:
+                resp = await senders[route](client, rng)
+                failed = resp.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if failed:
+                errors[route] += 1
+            else:
+                latencies[route].append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    def summary(samples: List[float], failed: int) -> Dict[str, Any]:
+        return {
+            "requests": len(samples) + failed,
+            "errors": failed,
+            "throughput_rps": round(len(samples) / duration, 2),
+            "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(_percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+        }
+
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    return {
+        "duration_s": round(duration, 3),
+        "routes": {route: summary(latencies[route], errors[route]) for route in routes},
+        "total": summary(all_samples, sum(errors.values())),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import uvicorn
+    from fastapi_payments.api import dependencies as payment_deps
+
+    import main
+    from stub_providers import install_stub_providers
+
+    install_stub_providers(payment_deps._payment_service, latency=args.provider_latency)
+
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0
+        ) as client:
+            fixtures = await _seed(client, args.customers)
+            mix = MIXES[args.mix]
+            if args.warmup:
+                await _drive(client, fixtures, mix, args.warmup, args.concurrency, args.seed + 1)
+            measured = await _drive(client, fixtures, mix, args.requests, args.concurrency, args.seed)
+    finally:
+        server.should_exit = True
+        await serving
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "mix": args.mix,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "provider_latency_s": args.provider_latency,
+            "customers_per_provider": args.customers,
+            "seed": args.seed,
+        },
+        **measured,
+    }
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    print(
+        f"mix={result['config']['mix']} requests={result['config']['requests']} "
+        f"concurrency={result['config']['concurrency']} duration={result['duration_s']}s "
+        f"commit={result['commit']}"
+    )
+    print(f"{'route':<46} {'req':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(result["routes"].items()) + [("total", result["total"])]
+    for route, stats in rows:
+        print(
+            f"{route:<46} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput_rps']:>8.1f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+        )
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print per-route changes against ``baseline``; False if p99 regressed."""
+    ok = True
+    print(f"\ncompared with {baseline.get('commit', '?')} ({baseline.get('timestamp', '?')}):")
+    for route, stats in result["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            print(f"  {route:<46} (not in baseline)")
+            continue
+        changes = []
+        for key in ("throughput_rps", "p95_ms", "p99_ms"):
+            if before[key]:
+                changes.append(f"{key} {100 * (stats[key] - before[key]) / before[key]:+.1f}%")
+        regressed = before["p99_ms"] and stats["p99_ms"] > before["p99_ms"] * (1 + tolerance)
+        ok = ok and not regressed
+        print(f"  {route:<46} {', '.join(changes)}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="checkout")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured requests first")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--customers", type=int, default=50, help="seeded customers per provider")
+    parser.add_argument("--provider-latency", type=float, default=0.02, help="stub round-trip, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/load-<commit>-<mix>.json)")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99 growth before failing")
+    args = parser.parse_args()
+
+    # Never touch the checked-in payments.db; this must happen before main.py
+    # is imported and reads the config.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/load.db"
+    logging.disable(logging.WARNING)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Route handlers print debug lines; keep them out of the report.
+        result = asyncio.run(run(args))
+
+    _print_report(result)
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{result['commit']}-{args.mix}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if not compare(result, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,167 @@
+"""Latency of PayU postservice calls with a new client per call versus a shared one.
+
+Starts a TLS stub of PayU's postservice under uvicorn, in its own process
+on a free local port, with a throwaway self-signed certificate (made with
+the ``openssl`` command). It then makes ``--calls`` SI API requests through
+``PayUProvider._make_si_api_request``:
+
+- "new client per call": the library's method, which opens an
+  ``httpx.AsyncClient`` (new SSL context, connection and TLS handshake)
+  for every call.
+- "shared client": the same method after ``use_shared_http_client``, reusing
+  the pooled client built from ``HTTP_CLIENT_*``.
+
+The stub answers at once and sits on the same machine, so the gap is the
+local CPU cost of the handshake and context. Against PayU over the internet
+each avoided handshake also saves two network round trips.
+
+Usage (from backend/)::
+
+    python -m benchmarks.provider_http [--calls 500] [--concurrency 1]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from fastapi_payments.providers.payu import PayUProvider
+
+from config import get_http_client_config
+from http_clients import ProviderHTTPClients
+from patches import use_shared_http_client
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def stub(scope, receive, send):  # type: ignore[no-untyped-def]
+    """ASGI app answering every postservice call like a successful SI request."""
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"status":1,"msg":"Request accepted"}'})
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _self_signed_certificate(directory: str) -> Dict[str, str]:
+    paths = {"certfile": os.path.join(directory, "cert.pem"), "keyfile": os.path.join(directory, "key.pem")}
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", paths["keyfile"], "-out", paths["certfile"],
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return paths
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_serving(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"stub exited with status {proc.returncode}")
+        try:
+            httpx.post(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("stub did not start serving in time")
+
+
+async def _latencies(provider: PayUProvider, calls: int, concurrency: int) -> List[float]:
+    samples: List[float] = []
+
+    async def call_many() -> None:
+        for _ in range(calls // concurrency):
+            started = time.perf_counter()
+            await provider._make_si_api_request("si_transaction", {"var1": "mandate_bench"})
+            samples.append(time.perf_counter() - started)
+
+    await provider._make_si_api_request("si_transaction", {"var1": "mandate_bench"})  # warm up
+    await asyncio.gather(*(call_many() for _ in range(concurrency)))
+    return samples
+
+
+def _report(label: str, samples: List[float]) -> Dict[str, Any]:
+    row = {
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": _percentile(samples, 50) * 1000,
+        "p99_ms": _percentile(samples, 99) * 1000,
+    }
+    print(f"{label:>20}: mean {row['mean_ms']:7.2f} ms  p50 {row['p50_ms']:7.2f} ms  p99 {row['p99_ms']:7.2f} ms")
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certificate = _self_signed_certificate(tmp)
+        # httpx trusts SSL_CERT_FILE, for the library's clients and ours alike.
+        os.environ["SSL_CERT_FILE"] = certificate["certfile"]
+        port = _free_port()
+        url = f"https://127.0.0.1:{port}/merchant/postservice?form=2"
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "benchmarks.provider_http:stub",
+                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+                "--ssl-certfile", certificate["certfile"], "--ssl-keyfile", certificate["keyfile"],
+            ],
+            cwd=BACKEND_DIR,
+        )
+        try:
+            _wait_until_serving(url, proc)
+            provider = PayUProvider(
+                {
+                    "api_key": "bench_key",
+                    "api_secret": "bench_salt",
+                    "sandbox_mode": True,
+                    "additional_settings": {"si_transaction_url": url},
+                }
+            )
+            per_call = _report(
+                "new client per call", asyncio.run(_latencies(provider, args.calls, args.concurrency))
+            )
+            clients = ProviderHTTPClients(**get_http_client_config())
+            use_shared_http_client(clients)
+
+            async def shared_run() -> List[float]:
+                try:
+                    return await _latencies(provider, args.calls, args.concurrency)
+                finally:
+                    await clients.aclose()
+
+            shared = _report("shared client", asyncio.run(shared_run()))
+            print(f"{'saved per call':>20}: {per_call['mean_ms'] - shared['mean_ms']:7.2f} ms (mean)")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Razorpay verifications per second, one request per payment versus batches.
+
+Starts ``main.app`` under uvicorn on a free local port, against a throwaway
+SQLite database and the real Razorpay provider configured with a made-up
+key, so every signature is a genuine HMAC-SHA256 check (nothing is sent to
+Razorpay). It seeds ``--payments`` pending payments, signs a Checkout
+payload for each, and verifies all of them twice:
+
+- "single": ``POST /razorpay/verify-payment`` per payment, from
+  ``--concurrency`` clients.
+- "batch": ``POST /razorpay/verify-payment/batch`` with ``--batch-size``
+  items per request, one request at a time.
+
+Every tenth payload carries a bad signature. The load generator runs in the
+same process, so server and client share one core.
+
+Usage (from backend/)::
+
+    python -m benchmarks.razorpay_verify [--payments 20000] [--batch-size 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, TextIO
+
+import httpx
+
+KEY_SECRET = "bench_secret"
+
+
+def _payloads(payment_ids: List[str]) -> List[Dict[str, Any]]:
+    payloads = []
+    for i, payment_id in enumerate(payment_ids):
+        order_id, razorpay_payment_id = f"order_{i}", f"pay_rzp_{i}"
+        signature = hmac.new(
+            KEY_SECRET.encode(), f"{order_id}|{razorpay_payment_id}".encode(), hashlib.sha256
+        ).hexdigest()
+        payloads.append(
+            {
+                "razorpay_payment_id": razorpay_payment_id,
+                "razorpay_order_id": order_id,
+                "razorpay_signature": signature if i % 10 else "0" * 64,
+                "payment_id": payment_id,
+            }
+        )
+    return payloads
+
+
+async def _seed(count: int) -> List[str]:
+    from fastapi_payments.db import repositories as payment_db
+    from fastapi_payments.db.models import Payment, PaymentStatus
+
+    async with payment_db._sessionmaker() as session:
+        payments = [
+            Payment(
+                customer_id="cust_bench",
+                amount=100.0,
+                currency="INR",
+                status=PaymentStatus.PENDING,
+                provider="razorpay",
+            )
+            for _ in range(count)
+        ]
+        session.add_all(payments)
+        await session.commit()
+        return [payment.id for payment in payments]
+
+
+async def _single(client: httpx.AsyncClient, payloads: List[Dict[str, Any]], concurrency: int) -> int:
+    pending = iter(payloads)
+    verified = 0
+
+    async def worker() -> None:
+        nonlocal verified
+        for payload in pending:
+            resp = await client.post("/razorpay/verify-payment", json=payload)
+            verified += resp.status_code == 200
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return verified
+
+
+async def _batched(client: httpx.AsyncClient, payloads: List[Dict[str, Any]], size: int) -> int:
+    verified = 0
+    for start in range(0, len(payloads), size):
+        resp = await client.post(
+            "/razorpay/verify-payment/batch", json={"items": payloads[start : start + size]}
+        )
+        resp.raise_for_status()
+        verified += resp.json()["verified"]
+    return verified
+
+
+async def run(args: argparse.Namespace, report: TextIO) -> None:
+    import uvicorn
+
+    import main
+
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    try:
+        payloads = _payloads(await _seed(args.payments))
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60.0
+        ) as client:
+            runs = {
+                "single": lambda: _single(client, payloads, args.concurrency),
+                "batch": lambda: _batched(client, payloads, args.batch_size),
+            }
+            header = f"{'mode':>6} {'payloads':>9} {'verified':>9} {'seconds':>8} {'per second':>11}"
+            print(header, file=report)
+            for mode, verify in runs.items():
+                started = time.perf_counter()
+                verified = await verify()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{mode:>6} {len(payloads):>9,} {verified:>9,} {elapsed:>8.2f} {len(payloads) / elapsed:>11,.0f}",
+                    file=report,
+                    flush=True,
+                )
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payments", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32, help="clients for single requests")
+    args = parser.parse_args()
+
+    # Set before main.py is imported and reads the config.
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/verify.db"
+    os.environ["RAZORPAY_KEY_ID"] = "rzp_test_bench"
+    os.environ["RAZORPAY_KEY_SECRET"] = KEY_SECRET
+    os.environ["RAZORPAY_VERIFY_BATCH_MAX_ITEMS"] = str(args.batch_size)
+    logging.disable(logging.WARNING)
+    report = sys.stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Route handlers print debug lines; keep them out of the report.
+        asyncio.run(run(args, report))
+
+
+if __name__ == "__main__":
+    main()
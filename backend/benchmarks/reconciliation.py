@@ -0,0 +1,123 @@
+"""Time and peak memory of settlement reconciliation as the row count grows.
+
+Builds a throwaway SQLite database with ``--payments`` Razorpay payments and
+a settlement export listing the same payments in a different order, with a
+little drift mixed in: about 1% each of amounts that differ, payments still
+pending locally, payments missing locally and payments missing from the
+export. It then runs ``reconciliation.reconcile`` once and prints the time,
+the rows per second and the process's peak RSS.
+
+Peak RSS only ever grows within a process, so each size is a separate run:
+
+Usage (from backend/)::
+
+    python -m benchmarks.reconciliation [--payments 1000000] [--sort-run-rows 500000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+import uuid
+from typing import Iterator, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import reconciliation
+from models import ensure_schema
+
+BATCH = 50_000
+
+
+def _payments(count: int, seed: int) -> Iterator[Tuple[str, int, str]]:
+    """Yield (order id, amount in paise, drift) per payment; drift is "" for clean rows."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        order_id = "order_" + uuid.UUID(int=rng.getrandbits(128)).hex[:14]
+        roll = rng.random()
+        drift = (
+            "amount" if roll < 0.01
+            else "pending" if roll < 0.02
+            else "not_local" if roll < 0.03
+            else "not_settled" if roll < 0.04
+            else ""
+        )
+        yield order_id, rng.randrange(100, 10_000_00), drift
+
+
+def _load(db_path: str, csv_path: str, count: int, seed: int) -> None:
+    connection = sqlite3.connect(db_path)
+    rows = _payments(count, seed)
+    with connection, open(csv_path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["entity_id", "type", "order_id", "amount", "currency"])
+        while True:
+            batch = [payment for _, payment in zip(range(BATCH), rows)]
+            if not batch:
+                break
+            connection.executemany(
+                "INSERT INTO payments (id, customer_id, provider, provider_payment_id, amount, currency,"
+                " status, created_at) VALUES (?, 'cust_bench', 'razorpay', ?, ?, 'INR', ?, '2024-05-01')",
+                [
+                    (str(uuid.uuid4()), order_id, amount / 100, "PENDING" if drift == "pending" else "COMPLETED")
+                    for order_id, amount, drift in batch
+                    if drift != "not_local"
+                ],
+            )
+            # Settlement exports come in settlement order, not id order.
+            random.Random(len(batch)).shuffle(batch)
+            writer.writerows(
+                (f"pay_{order_id[6:]}", "payment", order_id, f"{(amount + (100 if drift == 'amount' else 0)) / 100:.2f}", "INR")
+                for order_id, amount, drift in batch
+                if drift != "not_settled"
+            )
+    connection.close()
+
+
+async def _bench(directory: str, count: int, run_rows: int) -> None:
+    db_path, csv_path = os.path.join(directory, "recon.db"), os.path.join(directory, "settlement.csv")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    await ensure_schema(engine)
+    print(f"generating {count:,} payments ...", flush=True)
+    started = time.perf_counter()
+    await asyncio.to_thread(_load, db_path, csv_path, count, 1)
+    print(f"generated in {time.perf_counter() - started:.1f} s, export {os.path.getsize(csv_path) / 2**20:,.0f} MiB")
+
+    report_path = os.path.join(directory, "mismatches.ndjson")
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    async with sessionmaker(engine, class_=AsyncSession)() as session:
+        with open(csv_path, newline="") as settlement, open(report_path, "w") as report:
+            started = time.perf_counter()
+            counts = await reconciliation.reconcile(
+                session, "razorpay", settlement, report, sort_run_rows=run_rows, tmp_dir=directory
+            )
+            elapsed = time.perf_counter() - started
+    await engine.dispose()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    rows = counts["settlement_rows"] + counts["local_payments"]
+    mismatches = {kind: n for kind, n in counts.items() if kind not in reconciliation.TOTALS}
+    print(f"reconciled {rows:,} rows in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+    print(f"peak RSS {rss_before:,.0f} MiB before, {rss_after:,.0f} MiB after; report {os.path.getsize(report_path) / 2**20:,.1f} MiB")
+    print(f"matched {counts['matched']:,}; mismatches {mismatches}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--sort-run-rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(_bench(tmp, args.payments, args.sort_run_rows))
+
+
+if __name__ == "__main__":
+    main()
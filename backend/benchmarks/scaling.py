@@ -0,0 +1,118 @@
+"""Throughput of the API under gunicorn with 1 to N worker processes.
+
+For each worker count, starts ``gunicorn -c gunicorn.conf.py
+benchmarks.stub_app:app`` on a free local port with a fresh SQLite database
+and stub providers. It then seeds data and drives the same request mix as
+``benchmarks.load``. It prints throughput, p99 latency and the speedup over
+one worker.
+
+Provider latency defaults to zero so the workers are CPU-bound, which is the
+case more processes help with. The load generator runs on the same machine
+and uses CPU too, so leave it a core (``--workers`` up to cores - 1) for the
+numbers to mean anything.
+
+Usage (from backend/)::
+
+    python -m benchmarks.scaling [--workers 1,2,4] [--mix read-heavy] [--requests 4000] [--concurrency 64]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.load import MIXES, _drive, _seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_serving(base_url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start serving in time")
+
+
+async def _measure(base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        fixtures = await _seed(client, args.customers)
+        mix = MIXES[args.mix]
+        await _drive(client, fixtures, mix, args.warmup, args.concurrency, args.seed + 1)
+        return await _drive(client, fixtures, mix, args.requests, args.concurrency, args.seed)
+
+
+def _run(workers: int, args: argparse.Namespace) -> Dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'scaling.db')}",
+            WEB_CONCURRENCY=str(workers),
+            BIND=f"127.0.0.1:{port}",
+            LOGGING_LEVEL="WARNING",
+            STUB_PROVIDER_LATENCY=str(args.provider_latency),
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "benchmarks.stub_app:app"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_serving(base_url, proc)
+            return asyncio.run(_measure(base_url, args))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="read-heavy")
+    parser.add_argument("--requests", type=int, default=4000, help="measured requests per run")
+    parser.add_argument("--warmup", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--customers", type=int, default=50, help="seeded customers per provider")
+    parser.add_argument("--provider-latency", type=float, default=0.0, help="stub round-trip, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} mix={args.mix} requests={args.requests} concurrency={args.concurrency}")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'speedup':>8}")
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(",")):
+        total = _run(workers, args)["total"]
+        baseline = baseline or total["throughput_rps"]
+        print(
+            f"{workers:>7} {total['throughput_rps']:>9.1f} {total['p50_ms']:>8.1f} "
+            f"{total['p99_ms']:>8.1f} {total['errors']:>7} {total['throughput_rps'] / baseline:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Rows/second for a 100-row list page, before and after ``serializers``.
+
+"before" reproduces what FastAPI does with a returned list of dicts: validate
+each payload against the response model, run ``jsonable_encoder`` and encode
+with the stdlib ``json``. "after" is the ``ResponseSerializer`` path used by
+the list routes.
+
+Usage (from backend/)::
+
+    python -m benchmarks.serialization [--rounds 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+
+import main
+from schemas import CustomerResponse, PaymentResponse, SubscriptionResponse
+
+PAGE_SIZE = 100
+
+
+def _customers() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "meta_info": {"segment": "smb", "source": "import"},
+            "address": {"line1": f"{i} Road St", "city": "Kolkata", "country": "IN"},
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-02T00:00:00",
+            "provider_customer_id": f"cus_{i}",
+            "provider_customers": [{"provider": "stripe", "provider_customer_id": f"cus_{i}"}],
+        }
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def _payments() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "customer_id": str(uuid.uuid4()),
+            "amount": 100.0 + i,
+            "refunded_amount": 0.0,
+            "currency": "USD",
+            "status": "completed",
+            "payment_method": "pm_card_visa",
+            "provider": "stripe",
+            "provider_payment_id": f"pi_{i}",
+            "created_at": "2024-01-01T00:00:00",
+            "meta_info": {"description": f"Order {i}"},
+        }
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def _subscriptions() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "customer_id": str(uuid.uuid4()),
+            "plan_id": str(uuid.uuid4()),
+            "provider": "razorpay",
+            "provider_subscription_id": f"sub_{i}",
+            "status": "active",
+            "quantity": 1,
+            "current_period_start": "2024-01-01T00:00:00",
+            "current_period_end": "2024-02-01T00:00:00",
+            "cancel_at_period_end": False,
+            "created_at": "2024-01-01T00:00:00",
+            "meta_info": {"checkout_config": {"key": "rzp_test", "subscription_id": f"sub_{i}"}},
+        }
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def _before(model, payload: Callable) -> Callable[[List[Dict[str, Any]]], bytes]:
+    def run(items: List[Dict[str, Any]]) -> bytes:
+        validated = parse_obj_as(List[model], [payload(item) for item in items])
+        return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+    return run
+
+
+def _after(serializer) -> Callable[[List[Dict[str, Any]]], bytes]:
+    def run(items: List[Dict[str, Any]]) -> bytes:
+        return serializer.response(items).body
+
+    return run
+
+
+def _rows_per_second(run: Callable, items: List[Dict[str, Any]], rounds: int) -> float:
+    run(items)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        run(items)
+    return rounds * len(items) / (time.perf_counter() - started)
+
+
+def report(rounds: int) -> None:
+    cases = [
+        ("customers", _customers(), CustomerResponse, main._customer_payload, main.CUSTOMER_LIST),
+        ("payments", _payments(), PaymentResponse, main._payment_payload, main.PAYMENT_LIST),
+        (
+            "subscriptions",
+            _subscriptions(),
+            SubscriptionResponse,
+            main._subscription_payload,
+            main.SUBSCRIPTION_LIST,
+        ),
+    ]
+    print(f"{'endpoint':<14} {'before rows/s':>14} {'after rows/s':>14} {'speedup':>8}")
+    for name, items, model, payload, serializer in cases:
+        before = _rows_per_second(_before(model, payload), items, rounds)
+        after = _rows_per_second(_after(serializer), items, rounds)
+        print(f"{name:<14} {before:>14,.0f} {after:>14,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000, help="pages serialized per case")
+    report(parser.parse_args().rounds)
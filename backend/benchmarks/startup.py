@@ -0,0 +1,122 @@
+"""Cold-start cost of importing the app, with eager and lazy provider loading.
+
+Each sample starts a fresh interpreter with ``python -X importtime``, imports
+``main`` and then makes the first provider call (an attribute access that
+forces a lazy provider to build). The report shows:
+
+- the time to import ``main`` (what delays a new worker's readiness),
+- how much of that went to provider SDK imports, from ``-X importtime``,
+- the time of the first provider use.
+
+Two deployments are compared: a Razorpay-only worker and one with every
+provider whose SDK is installed.
+
+Usage (from backend/)::
+
+    python -m benchmarks.startup [--samples 5]
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Mapping
+
+SDK_MODULES = ("stripe", "razorpay", "cashfree_pg")
+
+IMPORTED_MARKER = "-- main imported --"
+
+PROBE = f"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+print("{IMPORTED_MARKER}", file=sys.stderr, flush=True)
+from fastapi_payments.api.dependencies import get_payment_service
+service = asyncio.run(get_payment_service())
+service.get_provider(service.default_provider).initialize
+used = time.perf_counter()
+print(json.dumps({{"import_s": imported - started, "first_use_s": used - imported}}))
+"""
+
+
+def _deployments() -> Dict[str, Dict[str, str]]:
+    razorpay = {"RAZORPAY_KEY_ID": "rzp_bench", "RAZORPAY_KEY_SECRET": "bench"}
+    everything = {
+        "STRIPE_API_KEY": "sk_test_bench",
+        "PAYU_API_KEY": "bench",
+        "PAYU_API_SECRET": "bench",
+        **razorpay,
+    }
+    if importlib.util.find_spec("cashfree_pg") is not None:
+        everything.update(CASHFREE_CLIENT_ID="bench", CASHFREE_CLIENT_SECRET="bench")
+    return {
+        "razorpay only": dict(razorpay, STRIPE_API_KEY="", DEFAULT_PAYMENT_PROVIDER="razorpay"),
+        "all providers": dict(everything, DEFAULT_PAYMENT_PROVIDER="stripe"),
+    }
+
+
+def _sdk_import_ms(importtime: str) -> float:
+    """Sum the cumulative import time of the SDK packages imported with ``main``."""
+    total = 0
+    for line in importtime.split(IMPORTED_MARKER)[0].splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() in SDK_MODULES:
+            total += int(parts[1])
+    return total / 1000
+
+
+def _sample(env: Mapping[str, str]) -> Dict[str, float]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "import_ms": result["import_s"] * 1000,
+        "sdk_ms": _sdk_import_ms(proc.stderr),
+        "first_use_ms": result["first_use_s"] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5, help="interpreter starts per row")
+    args = parser.parse_args()
+
+    print(f"{'deployment':<15} {'loading':<7} {'import main':>12} {'SDK imports':>12} {'first use':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for deployment, provider_env in _deployments().items():
+            for lazy in ("false", "true"):
+                env = {
+                    key: value
+                    for key, value in os.environ.items()
+                    if not key.startswith(("STRIPE_", "PAYU_", "CASHFREE_", "RAZORPAY_"))
+                }
+                env.update(
+                    provider_env,
+                    PAYMENT_LAZY_PROVIDERS=lazy,
+                    DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'startup.db')}",
+                    LOGGING_LEVEL="WARNING",
+                )
+                samples: List[Dict[str, float]] = [_sample(env) for _ in range(args.samples)]
+                median = {
+                    key: statistics.median(sample[key] for sample in samples) for key in samples[0]
+                }
+                print(
+                    f"{deployment:<15} {'lazy' if lazy == 'true' else 'eager':<7} "
+                    f"{median['import_ms']:>9.0f} ms {median['sdk_ms']:>9.0f} ms "
+                    f"{median['first_use_ms']:>7.0f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""``main.app`` with stub providers installed, for serving under gunicorn.
+
+Stubs are installed at import, so with ``preload_app`` every worker forks
+with them. ``STUB_PROVIDER_LATENCY`` sets their simulated round-trip in seconds.
+"""
+import os
+
+from fastapi_payments.api import dependencies as payment_deps
+
+import main
+from stub_providers import install_stub_providers
+
+install_stub_providers(
+    payment_deps._payment_service, latency=float(os.getenv("STUB_PROVIDER_LATENCY", "0"))
+)
+app = main.app
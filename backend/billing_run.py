@@ -0,0 +1,553 @@
+"""Bulk recurring charges against PayU Standing Instruction mandates.
+
+A billing run debits every active PayU subscription whose period ends on or
+before the run's debit date and whose ``meta_info`` holds a
+``mandate_token``. It works in two phases, because RBI rules require the
+customer to be notified at least 24 hours before the debit:
+
+1. ``create_run`` snapshots the due mandates as ``billing_run_items`` rows,
+   and the notify phase sends every pre-debit notification.
+2. Once the notice period has passed, the charge phase calls
+   ``si_transaction`` for every notified item and records a payment per
+   successful debit.
+
+Each item bills one subscription period. A successful debit moves the
+subscription on to its next period in the same transaction that marks the
+item charged, and a run never picks up a subscription that another run has
+already billed, or is billing, for the same period.
+
+Only a definite decline, or a failed pre-debit notice, marks an item
+``failed`` and frees its period for a later run. A timeout, connection error
+or 5xx from PayU leaves the debit possibly accepted, so the item goes to
+``unknown`` and keeps the period. ``resolve_unknown`` asks PayU about those
+txnids before a new run is created, and settles each item as charged or
+failed once PayU has a final answer.
+
+Provider calls run on ``concurrency`` workers behind a shared rate limiter.
+Outcomes are checkpointed as they arrive by a single writer that commits
+whatever has accumulated in one transaction, so a crash loses at most the
+calls that were in flight. Resuming only picks up items that have not
+reached their next state, and each item keeps the ``txnid`` it was created
+with: a charge that was sent but not checkpointed is resent with the same
+``txnid``, which PayU rejects as a duplicate instead of debiting twice.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Update
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, PaymentStatus, Plan, Subscription
+from fastapi_payments.utils.helpers import calculate_subscription_period_end
+
+from leases import naive_utcnow, worker_id
+from models import BillingRun, BillingRunItem
+from patches.payu import NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+PROVIDER = "payu"
+ACTIVE_STATUSES = ("notifying", "charging")
+# Plan intervals as stored by the providers, in the helper's vocabulary.
+INTERVALS = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year", "annual": "year"}
+
+
+def _outcome_unknown(exc: Exception) -> bool:
+    """Whether PayU may have accepted a debit that raised ``exc``."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def _charged(run_id: str, item: BillingRunItem, provider_payment_id: Optional[str]) -> Dict[str, Any]:
+    """Item changes recording a successful debit, its payment and period."""
+    payment = Payment(
+        customer_id=item.customer_id,
+        provider=PROVIDER,
+        provider_payment_id=provider_payment_id or item.txnid,
+        amount=item.amount,
+        currency=item.currency,
+        status=PaymentStatus.PROCESSING,
+        payment_method="si_mandate",
+        meta_info={
+            "billing_run_id": run_id,
+            "subscription_id": item.subscription_id,
+            "mandate_token": item.mandate_token,
+            "txnid": item.txnid,
+        },
+        created_at=naive_utcnow(),
+        updated_at=naive_utcnow(),
+    )
+    changes = {"state": "charged", "charged_at": naive_utcnow(), "payment": payment, "error": None}
+    if item.next_period_end is not None:
+        changes["period"] = (item.subscription_id, item.period_end, item.next_period_end)
+    return changes
+
+
+async def _apply(session: AsyncSession, item_id: int, changes: Dict[str, Any]) -> None:
+    payment = changes.pop("payment", None)
+    if payment is not None:
+        session.add(payment)
+        await session.flush()
+        changes["payment_id"] = payment.id
+    period = changes.pop("period", None)
+    if period is not None:
+        await session.execute(_advance_period(*period))
+    await session.execute(
+        update(BillingRunItem).where(BillingRunItem.id == item_id).values(**changes)
+    )
+
+
+class RunStateError(Exception):
+    """The run is not in a state that allows the requested phase."""
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across all workers."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _due_amount(subscription: Subscription, plan: Plan) -> Optional[float]:
+    amount = (subscription.meta_info or {}).get("amount")
+    if amount is None and plan.amount is not None:
+        amount = plan.amount * (subscription.quantity or 1)
+    return float(amount) if amount is not None else None
+
+
+def _next_period_end(period_end: datetime, plan: Plan) -> Optional[datetime]:
+    interval = (plan.billing_interval or "month").lower()
+    try:
+        return calculate_subscription_period_end(
+            period_end, INTERVALS.get(interval, interval), plan.billing_interval_count or 1
+        )
+    except ValueError:
+        return None
+
+
+def _advance_period(subscription_id: str, period_end: datetime, next_period_end: datetime) -> Update:
+    # Guarded on the billed period, so the subscription moves on at most once.
+    return (
+        update(Subscription)
+        .where(Subscription.id == subscription_id, Subscription.current_period_end == period_end)
+        .values(
+            current_period_start=period_end,
+            current_period_end=next_period_end,
+            updated_at=naive_utcnow(),
+        )
+    )
+
+
+def run_to_dict(run: BillingRun, counts: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "debit_date": run.debit_date.isoformat(),
+        "status": run.status,
+        "created_at": run.created_at.isoformat(),
+        "notified_at": run.notified_at.isoformat() if run.notified_at else None,
+        "completed_at": run.completed_at.isoformat() if run.completed_at else None,
+        "total": sum(counts.values()),
+        "counts": counts,
+    }
+
+
+def item_to_dict(item: BillingRunItem) -> Dict[str, Any]:
+    return {
+        "id": item.id,
+        "subscription_id": item.subscription_id,
+        "customer_id": item.customer_id,
+        "mandate_token": item.mandate_token,
+        "amount": item.amount,
+        "currency": item.currency,
+        "txnid": item.txnid,
+        "state": item.state,
+        "error": item.error,
+        "payment_id": item.payment_id,
+        "notified_at": item.notified_at.isoformat() if item.notified_at else None,
+        "charged_at": item.charged_at.isoformat() if item.charged_at else None,
+    }
+
+
+class BillingRunner:
+    """Creates billing runs and executes their phases in the background."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int,
+        rate_per_second: float,
+        lease_seconds: int,
+        min_notice_hours: float,
+    ):
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.lease = timedelta(seconds=lease_seconds)
+        self.min_notice = timedelta(hours=min_notice_hours)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # Creating and reporting ----------------------------------------------
+
+    async def create_run(self, debit_date: date) -> Tuple[str, bool]:
+        """Snapshot the mandates due on ``debit_date`` into a new run.
+
+        Returns the run ID and whether the run was created; there is one run
+        per debit date, so asking again returns the existing run.
+        """
+        period_cutoff = datetime.combine(debit_date + timedelta(days=1), datetime.min.time())
+        # Billed, being billed, or possibly billed (``unknown``) for its
+        # current period by an earlier run.
+        already_billed = (
+            select(BillingRunItem.id)
+            .where(
+                BillingRunItem.subscription_id == Subscription.id,
+                BillingRunItem.period_end == Subscription.current_period_end,
+                BillingRunItem.state != "failed",
+            )
+            .exists()
+        )
+        existing_run = select(BillingRun.id).where(BillingRun.debit_date == debit_date)
+        async with payment_db._sessionmaker() as session:
+            existing = (await session.execute(existing_run)).scalar_one_or_none()
+            if existing is not None:
+                return existing, False
+
+            due = await session.execute(
+                select(Subscription, Plan)
+                .join(Plan, Plan.id == Subscription.plan_id)
+                .where(
+                    Subscription.provider == PROVIDER,
+                    Subscription.status == "active",
+                    Subscription.current_period_end < period_cutoff,
+                    ~already_billed,
+                )
+            )
+            run = BillingRun(debit_date=debit_date, status="notifying", created_at=naive_utcnow())
+            session.add(run)
+            await session.flush()
+            for subscription, plan in due:
+                mandate_token = (subscription.meta_info or {}).get("mandate_token")
+                amount = _due_amount(subscription, plan)
+                if not mandate_token or amount is None:
+                    continue
+                next_period_end = _next_period_end(subscription.current_period_end, plan)
+                if next_period_end is None:
+                    logger.warning(
+                        "Skipping subscription with an unsupported billing interval",
+                        extra={"subscription_id": subscription.id, "interval": plan.billing_interval},
+                    )
+                    continue
+                session.add(
+                    BillingRunItem(
+                        run_id=run.id,
+                        subscription_id=subscription.id,
+                        customer_id=subscription.customer_id,
+                        mandate_token=mandate_token,
+                        amount=amount,
+                        currency=plan.currency or "INR",
+                        txnid="si" + uuid.uuid4().hex[:23],
+                        state="pending",
+                        period_end=subscription.current_period_end,
+                        next_period_end=next_period_end,
+                    )
+                )
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another request created the run for this date first.
+                await session.rollback()
+                return (await session.execute(existing_run)).scalar_one(), False
+            return run.id, True
+
+    async def resolve_unknown(self, provider: Any) -> int:
+        """Settle ``unknown`` debits with PayU; return how many were settled.
+
+        A txnid PayU reports as successful is charged, one it failed or never
+        received is failed, and anything else stays ``unknown`` until a later
+        call.
+        """
+        async with payment_db._sessionmaker() as session:
+            items = (
+                await session.execute(
+                    select(BillingRunItem)
+                    .where(BillingRunItem.state == "unknown")
+                    .order_by(BillingRunItem.id)
+                )
+            ).scalars().all()
+        settled = 0
+        for item in items:
+            try:
+                result = await provider.verify_transaction(item.txnid)
+            except Exception:
+                logger.warning(
+                    "Could not verify billing run debit",
+                    extra={"txnid": item.txnid},
+                    exc_info=True,
+                )
+                continue
+            status = result.get("status")
+            if status == "success":
+                changes = _charged(item.run_id, item, result.get("provider_payment_id"))
+            elif status in ("failure", NOT_FOUND):
+                changes = {"state": "failed", "error": f"debit {status} at PayU"}
+            else:
+                continue
+            async with payment_db._sessionmaker() as session:
+                await _apply(session, item.id, changes)
+                await session.commit()
+            settled += 1
+        return settled
+
+    async def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        async with payment_db._sessionmaker() as session:
+            run = await session.get(BillingRun, run_id)
+            if run is None:
+                return None
+            counts = dict(
+                (
+                    await session.execute(
+                        select(BillingRunItem.state, func.count())
+                        .where(BillingRunItem.run_id == run_id)
+                        .group_by(BillingRunItem.state)
+                    )
+                ).all()
+            )
+        return run_to_dict(run, counts)
+
+    async def list_items(
+        self, run_id: str, *, state: Optional[str], after: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        stmt = select(BillingRunItem).where(
+            BillingRunItem.run_id == run_id, BillingRunItem.id > after
+        )
+        if state:
+            stmt = stmt.where(BillingRunItem.state == state)
+        async with payment_db._sessionmaker() as session:
+            items = (await session.execute(stmt.order_by(BillingRunItem.id).limit(limit))).scalars()
+            return [item_to_dict(item) for item in items]
+
+    # Scheduling ------------------------------------------------------------
+
+    async def start_charging(self, run_id: str, provider: Any) -> None:
+        """Move a notified run into the charge phase and execute it.
+
+        Raises:
+            RunStateError: If the run is not notified yet or the notice
+                period has not passed.
+        """
+        async with payment_db._sessionmaker() as session:
+            run = await session.get(BillingRun, run_id)
+            if run.status == "notified":
+                if naive_utcnow() < run.notified_at + self.min_notice:
+                    raise RunStateError(
+                        f"Customers were notified at {run.notified_at.isoformat()}; "
+                        f"charging is allowed after {self.min_notice} of notice"
+                    )
+                run.status = "charging"
+                await session.commit()
+            elif run.status != "charging":
+                raise RunStateError(f"Run is {run.status}; it must be notified before charging")
+        self.start(run_id, provider)
+
+    def start(self, run_id: str, provider: Any) -> None:
+        """Execute the run's current phase in the background, once per worker."""
+        task = self._tasks.get(run_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self.execute(run_id, provider))
+        self._tasks[run_id] = task
+
+    async def resume_interrupted(self, provider: Any) -> List[str]:
+        """Start every run whose phase was left unfinished by a dead worker."""
+        async with payment_db._sessionmaker() as session:
+            run_ids = (
+                await session.execute(
+                    select(BillingRun.id).where(
+                        BillingRun.status.in_(ACTIVE_STATUSES),
+                        or_(
+                            BillingRun.lease_expires_at.is_(None),
+                            BillingRun.lease_expires_at < naive_utcnow(),
+                        ),
+                    )
+                )
+            ).scalars().all()
+        for run_id in run_ids:
+            self.start(run_id, provider)
+        return list(run_ids)
+
+    async def wait(self, run_id: str) -> None:
+        """Wait for this worker's background execution of ``run_id``."""
+        task = self._tasks.get(run_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def shutdown(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    # Execution -----------------------------------------------------------
+
+    async def execute(self, run_id: str, provider: Any) -> None:
+        """Run the current phase of ``run_id`` if this worker gets the lease."""
+        if not await self._claim_lease(run_id):
+            logger.info("Billing run is leased by another worker", extra={"run_id": run_id})
+            return
+        try:
+            async with payment_db._sessionmaker() as session:
+                status = (await session.get(BillingRun, run_id)).status
+            if status == "notifying":
+                await self._notify(run_id, provider)
+            elif status == "charging":
+                await self._charge(run_id, provider)
+        except Exception:
+            logger.exception("Billing run stopped", extra={"run_id": run_id})
+            raise
+        finally:
+            await self._release_lease(run_id)
+
+    async def _notify(self, run_id: str, provider: Any) -> None:
+        async with payment_db._sessionmaker() as session:
+            debit_date = (await session.get(BillingRun, run_id)).debit_date
+        debit_date_text = debit_date.strftime("%d-%m-%Y")
+
+        async def notify(item: BillingRunItem) -> Dict[str, Any]:
+            try:
+                result = await provider.pre_debit_notify(
+                    mandate_token=item.mandate_token,
+                    amount=item.amount,
+                    debit_date=debit_date_text,
+                )
+            except Exception as exc:
+                return {"state": "failed", "error": f"pre-debit notification failed: {exc}"}
+            if result.get("notification_sent") is False:
+                return {"state": "failed", "error": "pre-debit notification was not sent"}
+            return {"state": "notified", "notified_at": naive_utcnow()}
+
+        await self._process(run_id, "pending", notify)
+        await self._finish_phase(run_id, "notified", notified_at=naive_utcnow())
+
+    async def _charge(self, run_id: str, provider: Any) -> None:
+        async def charge(item: BillingRunItem) -> Dict[str, Any]:
+            try:
+                result = await provider.si_transaction(
+                    mandate_token=item.mandate_token, amount=item.amount, txnid=item.txnid
+                )
+            except Exception as exc:
+                if _outcome_unknown(exc):
+                    return {"state": "unknown", "error": f"debit outcome unknown: {exc}"}
+                return {"state": "failed", "error": f"debit failed: {exc}"}
+            return _charged(run_id, item, result.get("provider_payment_id"))
+
+        await self._process(run_id, "notified", charge)
+        await self._finish_phase(run_id, "completed", completed_at=naive_utcnow())
+
+    async def _process(
+        self,
+        run_id: str,
+        from_state: str,
+        call: Callable[[BillingRunItem], Awaitable[Dict[str, Any]]],
+    ) -> None:
+        async with payment_db._sessionmaker() as session:
+            items = (
+                await session.execute(
+                    select(BillingRunItem)
+                    .where(BillingRunItem.run_id == run_id, BillingRunItem.state == from_state)
+                    .order_by(BillingRunItem.id)
+                )
+            ).scalars().all()
+        if not items:
+            return
+
+        pending = iter(items)
+        limiter = RateLimiter(self.rate_per_second)
+        outcomes: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            for item in pending:
+                await limiter.wait()
+                outcomes.put_nowait((item.id, await call(item)))
+
+        writer = asyncio.create_task(self._checkpoint(run_id, outcomes))
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(items)))))
+        finally:
+            outcomes.put_nowait(None)
+            await writer
+
+    async def _checkpoint(self, run_id: str, outcomes: asyncio.Queue) -> None:
+        """Commit item outcomes in batches of whatever has arrived."""
+        finished = False
+        while not finished:
+            batch = [await outcomes.get()]
+            while not outcomes.empty():
+                batch.append(outcomes.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                finished = True
+            if not batch:
+                continue
+            async with payment_db._sessionmaker() as session:
+                for item_id, changes in batch:
+                    await _apply(session, item_id, changes)
+                await session.execute(
+                    update(BillingRun)
+                    .where(BillingRun.id == run_id, BillingRun.lease_owner == worker_id())
+                    .values(lease_expires_at=naive_utcnow() + self.lease)
+                )
+                await session.commit()
+
+    async def _finish_phase(self, run_id: str, status: str, **values: Any) -> None:
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                update(BillingRun).where(BillingRun.id == run_id).values(status=status, **values)
+            )
+            await session.commit()
+
+    async def _claim_lease(self, run_id: str) -> bool:
+        now = naive_utcnow()
+        async with payment_db._sessionmaker() as session:
+            result = await session.execute(
+                update(BillingRun)
+                .where(
+                    BillingRun.id == run_id,
+                    or_(
+                        BillingRun.lease_owner == worker_id(),
+                        BillingRun.lease_expires_at.is_(None),
+                        BillingRun.lease_expires_at < now,
+                    ),
+                )
+                .values(lease_owner=worker_id(), lease_expires_at=now + self.lease)
+            )
+            await session.commit()
+        return bool(result.rowcount)
+
+    async def _release_lease(self, run_id: str) -> None:
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                update(BillingRun)
+                .where(BillingRun.id == run_id, BillingRun.lease_owner == worker_id())
+                .values(lease_owner=None, lease_expires_at=None)
+            )
+            await session.commit()
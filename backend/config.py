@@ -2,11 +2,22 @@
 import os
 from typing import Dict, Any
 
-from dotenv import load_dotenv
+from dotenv import dotenv_values, find_dotenv, load_dotenv
+
+# Variables set by the process environment win over the .env file, also
+# when the file is re-read by reload_dotenv.
+_PROCESS_ENV = frozenset(os.environ)
 
 # Load environment variables from a .env file if present
 load_dotenv()
 
+
+def reload_dotenv() -> None:
+    """Re-read the .env file so a config reload sees edits made since start-up."""
+    for key, value in dotenv_values(find_dotenv()).items():
+        if key not in _PROCESS_ENV and value is not None:
+            os.environ[key] = value
+
 def get_stripe_config() -> Dict[str, Any]:
     """Get Stripe configuration from environment variables."""
     return {
@@ -78,6 +89,140 @@ def get_razorpay_config() -> Dict[str, Any]:
     }
 
 
+def get_provider_loading_config() -> Dict[str, Any]:
+    """Get provider start-up behaviour from environment variables."""
+    return {
+        # Build each provider (and import its SDK) on first use instead of at start-up
+        "lazy": os.getenv("PAYMENT_LAZY_PROVIDERS", "true").lower() == "true",
+    }
+
+
+def get_customer_batch_config() -> Dict[str, Any]:
+    """Get limits for bulk customer creation from environment variables."""
+    return {
+        "max_items": int(os.getenv("CUSTOMER_BATCH_MAX_ITEMS", "500")),
+        # Concurrent in-flight create_customer calls allowed per provider
+        "provider_concurrency": int(os.getenv("CUSTOMER_BATCH_PROVIDER_CONCURRENCY", "10")),
+    }
+
+
+def get_razorpay_verify_batch_config() -> Dict[str, Any]:
+    """Get limits for bulk Razorpay signature verification from environment variables."""
+    return {
+        "max_items": int(os.getenv("RAZORPAY_VERIFY_BATCH_MAX_ITEMS", "5000")),
+    }
+
+
+def get_reconciliation_config() -> Dict[str, Any]:
+    """Get settlement reconciliation limits from environment variables."""
+    return {
+        # Settlement rows sorted in memory before spilling a run to disk
+        "sort_run_rows": int(os.getenv("RECONCILIATION_SORT_RUN_ROWS", "500000")),
+        # Where sort runs are spilled; the system temp directory when unset
+        "tmp_dir": os.getenv("RECONCILIATION_TMP_DIR") or None,
+    }
+
+
+def get_catalog_cache_config() -> Dict[str, Any]:
+    """Get product/plan cache limits from environment variables."""
+    return {
+        "max_entries": int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "2048")),
+        # Upper bound on how stale a row changed by another worker can be
+        "ttl_seconds": float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300")),
+    }
+
+
+def get_idempotency_config() -> Dict[str, Any]:
+    """Get Idempotency-Key retention settings from environment variables."""
+    return {
+        "ttl_seconds": int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+        # How long a duplicate waits for the in-flight original before a 409
+        "wait_timeout": float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT_SECONDS", "30")),
+        # A running request renews its claim on the key for this long; a
+        # retry takes over the key once the claim of a dead request lapses
+        "lock_seconds": float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30")),
+        # How often expired keys are deleted
+        "purge_interval": float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600")),
+    }
+
+
+def get_billing_run_config() -> Dict[str, Any]:
+    """Get PayU Standing Instruction billing run settings from environment variables."""
+    return {
+        # Provider calls in flight at once, and the cap on calls per second
+        "concurrency": int(os.getenv("BILLING_RUN_CONCURRENCY", "10")),
+        "rate_per_second": float(os.getenv("BILLING_RUN_RATE_PER_SECOND", "20")),
+        # A run whose worker stops renewing this lease is resumed by another
+        "lease_seconds": int(os.getenv("BILLING_RUN_LEASE_SECONDS", "300")),
+        # RBI requires pre-debit notice at least 24 hours before the debit
+        "min_notice_hours": float(os.getenv("BILLING_RUN_MIN_NOTICE_HOURS", "24")),
+    }
+
+
+def get_event_broker_config() -> Dict[str, Any]:
+    """Get event broker batching and stream settings from environment variables."""
+    return {
+        # One stream for every event, trimmed to roughly this many entries
+        "stream": os.getenv("MESSAGE_BROKER_STREAM", "payments:events"),
+        "stream_maxlen": int(os.getenv("MESSAGE_BROKER_STREAM_MAXLEN", "100000")),
+        # Most events written in one pipeline
+        "batch_size": int(os.getenv("MESSAGE_BROKER_BATCH_SIZE", "100")),
+        # Events queued in a worker before publishers wait for room
+        "max_pending": int(os.getenv("MESSAGE_BROKER_MAX_PENDING", "10000")),
+    }
+
+
+def get_webhook_queue_config() -> Dict[str, Any]:
+    """Get webhook processing settings from environment variables."""
+    return {
+        # Events processed at once by each app worker
+        "workers": int(os.getenv("WEBHOOK_WORKERS", "8")),
+        # An event claimed by a worker that stops is claimed again after this
+        "lease_seconds": int(os.getenv("WEBHOOK_LEASE_SECONDS", "60")),
+        # Failed events are retried after retry_seconds, doubling each time
+        "max_attempts": int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8")),
+        "retry_seconds": float(os.getenv("WEBHOOK_RETRY_SECONDS", "5")),
+        # How often to look for events enqueued by other app workers
+        "poll_seconds": float(os.getenv("WEBHOOK_POLL_SECONDS", "2")),
+        # Finished events are kept this long, which is also the dedup window
+        "retention_days": int(os.getenv("WEBHOOK_RETENTION_DAYS", "30")),
+    }
+
+
+def get_http_client_config() -> Dict[str, Any]:
+    """Get outbound provider HTTP client settings from environment variables."""
+    return {
+        # Per provider: connections open at once, and idle ones kept alive
+        "max_connections": int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "50")),
+        "max_keepalive_connections": int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        "keepalive_expiry": float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS", "60")),
+        # Negotiated per connection; servers without HTTP/2 get HTTP/1.1
+        "http2": os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true",
+        "timeout": float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "30")),
+        "connect_timeout": float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS", "5")),
+        # How long a call waits for a free connection when all are in use
+        "pool_timeout": float(os.getenv("HTTP_CLIENT_POOL_TIMEOUT_SECONDS", "10")),
+    }
+
+
+def get_admin_config() -> Dict[str, Any]:
+    """Get admin endpoint settings from environment variables."""
+    return {
+        # Shared secret for X-Admin-Token; admin endpoints are disabled without it
+        "token": os.getenv("ADMIN_TOKEN"),
+    }
+
+
+def get_logging_config() -> Dict[str, Any]:
+    """Get log pipeline settings from environment variables."""
+    return {
+        "level": os.getenv("LOGGING_LEVEL", "INFO").upper(),
+        "format": os.getenv("LOG_FORMAT", "json").lower(),  # json or text
+        # Fraction of verbose payload logs (full meta_info dumps) that are kept
+        "payload_sample_rate": float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01")),
+    }
+
+
 def get_payment_config() -> Dict[str, Any]:
     """Get the full payment configuration."""
     providers: Dict[str, Any] = {}
@@ -144,7 +289,23 @@ def get_payment_config() -> Dict[str, Any]:
         "providers": providers,
         "database": {
             "url": os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./payments.db"),
-            "echo": os.getenv("DB_ECHO", "false").lower() == "true"
+            "echo": os.getenv("DB_ECHO", "false").lower() == "true",
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+            "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500")),
+            # Optional replica for list and detail routes; unset reads the primary.
+            "replica_url": os.getenv("DATABASE_REPLICA_URL") or None,
+            # Seconds to read the primary after the replica failed to connect.
+            "replica_retry_after": float(os.getenv("DATABASE_REPLICA_RETRY_AFTER", "30")),
+            # Applied to every new SQLite connection; ignored for other databases.
+            "sqlite_pragmas": {
+                "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+                "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+                "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+                "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+            },
         },
         "messaging": {
             "broker_type": os.getenv("MESSAGE_BROKER_TYPE", "memory"),
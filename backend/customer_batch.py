@@ -0,0 +1,137 @@
+"""Bulk customer creation with concurrent provider fan-out.
+
+Creating customers one request at a time pays a provider round-trip and a
+database commit per customer. ``create_customers`` registers every customer
+with its provider concurrently, capped by a per-provider semaphore so a
+large import cannot trip provider rate limits, and then writes every local
+row in a single transaction.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi_payments.db.models import Customer, ProviderCustomer, generate_uuid
+from fastapi_payments.services.payment_service import PaymentService
+
+from schemas import CustomerCreate
+
+logger = logging.getLogger(__name__)
+
+
+async def _register_with_provider(
+    payment_service: PaymentService,
+    provider_name: str,
+    item: CustomerCreate,
+    address: Optional[Dict[str, Any]],
+    limit: asyncio.Semaphore,
+) -> str:
+    provider = payment_service.get_provider(provider_name)
+    async with limit:
+        created = await provider.create_customer(
+            email=item.email, name=item.name, meta_info=item.meta_info, address=address
+        )
+
+    provider_customer_id = created.get("provider_customer_id") or created.get("id")
+    if not provider_customer_id:
+        raise ValueError("Provider did not return a customer identifier")
+    return provider_customer_id
+
+
+def _split_address(item: CustomerCreate):
+    # Same normalisation as CustomerRepository.create: an address nested in
+    # meta_info moves to the dedicated column.
+    meta_info = dict(item.meta_info or {})
+    address = item.address
+    if address:
+        if isinstance(meta_info.get("address"), dict):
+            meta_info.pop("address", None)
+    elif isinstance(meta_info.get("address"), dict):
+        address = meta_info.pop("address")
+    return meta_info, address
+
+
+async def create_customers(
+    payment_service: PaymentService,
+    items: Sequence[CustomerCreate],
+    *,
+    provider_concurrency: int,
+) -> List[Dict[str, Any]]:
+    """Create ``items`` and return one result dict per item, in order.
+
+    Each result has ``index`` and ``status`` ("created" or "failed") plus
+    either ``customer`` (service-shaped customer dict) or ``error``.
+    """
+    limits: Dict[str, asyncio.Semaphore] = {}
+    providers: List[str] = []
+    normalized = []
+    calls = []
+    for item in items:
+        provider_name = (item.meta_info or {}).get("provider") or payment_service.default_provider
+        limit = limits.setdefault(provider_name, asyncio.Semaphore(provider_concurrency))
+        meta_info, address = _split_address(item)
+        providers.append(provider_name)
+        normalized.append((meta_info, address))
+        calls.append(
+            _register_with_provider(payment_service, provider_name, item, address, limit)
+        )
+
+    outcomes = await asyncio.gather(*calls, return_exceptions=True)
+
+    results: List[Dict[str, Any]] = []
+    rows: List[Any] = []
+    created: List[tuple] = []
+    for index, (item, provider_name, (meta_info, address), outcome) in enumerate(
+        zip(items, providers, normalized, outcomes)
+    ):
+        if isinstance(outcome, BaseException):
+            results.append({"index": index, "status": "failed", "error": str(outcome)})
+            continue
+        customer = Customer(
+            id=generate_uuid(),
+            email=item.email,
+            name=item.name,
+            meta_info=meta_info,
+            address=address,
+        )
+        rows.append(customer)
+        rows.append(
+            ProviderCustomer(
+                customer_id=customer.id,
+                provider=provider_name,
+                provider_customer_id=outcome,
+            )
+        )
+        created.append((index, customer, outcome))
+        results.append({"index": index, "status": "created"})
+
+    if not created:
+        return results
+
+    session = payment_service.db_session
+    session.add_all(rows)
+    try:
+        await session.commit()
+    except Exception as exc:
+        await session.rollback()
+        logger.exception("Bulk customer insert failed; provider customers were created")
+        for index, _customer, provider_customer_id in created:
+            results[index] = {
+                "index": index,
+                "status": "failed",
+                "error": f"Database error after provider registration ({provider_customer_id}): {exc}",
+            }
+        return results
+
+    for index, customer, provider_customer_id in created:
+        results[index]["customer"] = {
+            "id": customer.id,
+            "email": customer.email,
+            "name": customer.name,
+            "created_at": customer.created_at.isoformat() if customer.created_at else None,
+            "provider_customer_id": provider_customer_id,
+            "meta_info": customer.meta_info,
+            "address": customer.address,
+        }
+    return results
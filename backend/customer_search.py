@@ -0,0 +1,199 @@
+"""Indexed, ranked customer search for ``GET /customers?search=``.
+
+The library filters with ``email ILIKE '%q%' OR name ILIKE '%q%'``, which no
+B-tree index can serve, so every search reads the whole customers table.
+Search here keeps the same substring semantics but answers from a trigram
+index:
+
+- SQLite: an FTS5 table ``customers_search`` with the ``trigram`` tokenizer
+  over ``customers.name`` and ``customers.email``, keyed by the customers
+  rowid. Triggers on ``customers`` keep it in step with every insert,
+  update and delete, whichever code path makes them.
+- PostgreSQL: ``pg_trgm`` GIN indexes on ``name`` and ``email``, which the
+  planner uses for the ``ILIKE`` filter directly.
+
+Trigram indexes only help queries of at least three characters. Shorter
+ones, and databases where the index could not be created, fall back to the
+``ILIKE`` scan.
+
+Matches are ranked: the exact email first, then names or emails starting
+with the query (a name matches at the start of any word), then emails
+whose domain starts with it (``example.com`` or ``@example.com``), then any
+other substring match. Within a rank, newest first. Pages continue by a
+cursor over ``(rank, created_at, id)``.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import and_, case, func, literal_column, or_, select, text, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import ColumnElement
+
+from fastapi_payments.db.models import Customer
+
+from pagination import Page, customer_to_dict, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "customers_search"
+MIN_INDEXED_LENGTH = 3
+
+_SQLITE_DDL = (
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, email, content='customers', content_rowid='rowid', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_search_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, email) VALUES (new.rowid, new.name, new.email);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_search_ad AFTER DELETE ON customers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email)
+        VALUES ('delete', old.rowid, old.name, old.email);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_search_au AFTER UPDATE OF name, email ON customers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email)
+        VALUES ('delete', old.rowid, old.name, old.email);
+        INSERT INTO {FTS_TABLE}(rowid, name, email) VALUES (new.rowid, new.name, new.email);
+    END""",
+    # Index customers that existed before the table did.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_customers_name_trgm ON customers USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_customers_email_trgm ON customers USING gin (email gin_trgm_ops)",
+)
+
+# Whether this process found or created the index; set by create_search_index.
+_indexed = False
+
+
+def create_search_index(connection) -> None:  # type: ignore[no-untyped-def]
+    """Create the trigram index for the connection's database if it is missing.
+
+    Runs inside ``models.ensure_schema``. Failing to create it (SQLite built
+    without FTS5, no permission for ``pg_trgm``) leaves search on the scan.
+    """
+    global _indexed
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        statements: Tuple[str, ...] = () if exists else _SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = _POSTGRES_DDL
+    else:
+        return
+    try:
+        # A savepoint, so a failure does not abort the schema transaction.
+        with connection.begin_nested():
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+    except DBAPIError as exc:
+        logger.warning("Customer search index unavailable; searching by scan", extra={"error": str(exc)})
+        _indexed = False
+    else:
+        _indexed = True
+
+
+def _like_pattern(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _match_condition(dialect: str, query: str) -> ColumnElement:
+    if _indexed and dialect == "sqlite" and len(query) >= MIN_INDEXED_LENGTH:
+        phrase = '"' + query.replace('"', '""') + '"'
+        matching = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase").bindparams(
+            phrase=phrase
+        )
+        return literal_column("customers.rowid").in_(matching)
+    pattern = f"%{_like_pattern(query)}%"
+    return or_(
+        Customer.email.ilike(pattern, escape="\\"),
+        Customer.name.ilike(pattern, escape="\\"),
+    )
+
+
+def _rank(query: str) -> ColumnElement:
+    lowered = query.lower()
+    prefix = _like_pattern(lowered) + "%"
+    domain = _like_pattern(lowered.lstrip("@")) + "%"
+    email = func.lower(Customer.email)
+    name = func.lower(Customer.name)
+    return case(
+        (email == lowered, 0),
+        (
+            or_(
+                email.like(prefix, escape="\\"),
+                name.like(prefix, escape="\\"),
+                name.like("% " + prefix, escape="\\"),
+            ),
+            1,
+        ),
+        (email.like("%@" + domain, escape="\\"), 2),
+        else_=3,
+    )
+
+
+def encode_search_cursor(rank: int, created_at: Any, row_id: str) -> str:
+    # URL-safe base64 has no ".", so the rank prefix is unambiguous.
+    return f"{rank}.{encode_cursor(created_at, row_id)}"
+
+
+def decode_search_cursor(cursor: str) -> Tuple[int, Any, str]:
+    """Decode a cursor produced by ``encode_search_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed, e.g. one from an unfiltered list.
+    """
+    rank, separator, rest = cursor.partition(".")
+    if not separator or not rank.isdigit():
+        raise ValueError("Invalid cursor")
+    created_at, row_id = decode_cursor(rest)
+    return int(rank), created_at, row_id
+
+
+async def search_customers(
+    session: AsyncSession,
+    *,
+    query: str,
+    default_provider: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Page:
+    """One page of customers matching ``query``, best matches first."""
+    rank = _rank(query).label("rank")
+    # Rank on narrow rows, then load the page's customers only.
+    stmt = select(Customer.id, Customer.created_at, rank).where(
+        _match_condition(session.bind.dialect.name, query)
+    )
+    if cursor:
+        last_rank, created_at, row_id = decode_search_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                rank > last_rank,
+                and_(rank == last_rank, tuple_(Customer.created_at, Customer.id) < (created_at, row_id)),
+            )
+        )
+    stmt = stmt.order_by(rank, Customer.created_at.desc(), Customer.id.desc()).limit(limit + 1)
+    if offset:
+        stmt = stmt.offset(offset)
+    ranked = list((await session.execute(stmt)).all())
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_search_cursor(ranked[-1].rank, ranked[-1].created_at, ranked[-1].id)
+    customers = await session.scalars(
+        select(Customer)
+        .options(selectinload(Customer.provider_customers))
+        .where(Customer.id.in_([row.id for row in ranked]))
+    )
+    by_id = {customer.id: customer for customer in customers}
+    return Page([customer_to_dict(by_id[row.id], default_provider) for row in ranked], next_cursor)
@@ -1,17 +1,73 @@
 """Dependencies for the payment API."""
+import threading
+from typing import Optional
+
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 
+from fastapi_payments.api import dependencies as payment_deps
 from fastapi_payments.config.config_schema import PaymentConfig
+from fastapi_payments.messaging.publishers import PaymentEventPublisher
+from fastapi_payments.services.payment_service import PaymentService
+
+from config import get_event_broker_config
 from config import get_payment_config as get_config_dict  # Renamed import to avoid recursion
+from event_broker import EventPublisher
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+
+class FrozenPaymentConfig(PaymentConfig):
+    """PaymentConfig that rejects attribute assignment after validation."""
+
+    class Config:
+        allow_mutation = False
+
+
+_payment_config: Optional[FrozenPaymentConfig] = None
+_reload_lock = threading.Lock()
+
+
 def get_payment_config() -> PaymentConfig:
-    """Get payment configuration as a PaymentConfig object."""
-    # Use the imported function from config.py instead of calling self
-    return PaymentConfig(**get_config_dict())
+    """Get the shared payment configuration.
+
+    Built from the environment on first use and reused afterwards, so as a
+    dependency it costs one global read per request.
+    """
+    config = _payment_config
+    if config is None:
+        config = reload_payment_config()
+    return config
+
+
+def reload_payment_config() -> PaymentConfig:
+    """Build the configuration from the environment again and swap it in.
+
+    The new object is fully validated before the swap, so readers see either
+    the old configuration or the new one. If validation fails, the old one
+    stays in place and the error propagates.
+    """
+    global _payment_config
+    with _reload_lock:
+        _payment_config = FrozenPaymentConfig(**get_config_dict())
+        return _payment_config
+
+
+def initialize_payment_dependencies(config: PaymentConfig) -> Optional[PaymentEventPublisher]:
+    """Set up the library's shared payment service and event publisher.
+
+    Does what fastapi_payments' ``initialize_dependencies`` does, except that
+    the publisher's broker is chosen by ``event_broker.BROKERS``. Returns the
+    publisher it replaced, if any, so the caller can stop it.
+    """
+    previous = payment_deps._event_publisher
+    publisher = EventPublisher(config.messaging, get_event_broker_config())
+    payment_deps.set_config(config)
+    payment_deps._event_publisher = publisher
+    payment_deps._payment_service = PaymentService(config, publisher, None)
+    return previous
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get the authenticated user from the token."""
@@ -20,4 +76,4 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     # from a database or authentication service.
     if not token:
         return None
-    return {"id": "user_123", "email": "demo@example.com"}
\ No newline at end of file
+    return {"id": "user_123", "email": "demo@example.com"}
@@ -0,0 +1,227 @@
+"""Event broker backends for PaymentEventPublisher, selected by MESSAGE_BROKER_TYPE.
+
+``memory`` keeps the library's InMemoryBroker. Its events stay inside the
+worker and are gone on restart. ``redis`` appends every event to one Redis
+stream. There they survive restarts, and the events of every worker end up
+in one place for consumers to read. Other types (rabbitmq, kafka, nats) are
+left to the library. A new backend is an entry in ``BROKERS``.
+
+RedisStreamBroker batches writes. Events queue up while a write is in flight
+and go out together in the next pipeline, so a busy worker makes one round
+trip per batch instead of one per event, and an idle one never waits to fill
+a batch. The queue holds at most ``max_pending`` events. When Redis falls
+behind, publishers wait for room instead of growing the queue. ``publish``
+returns the stream entry ID once Redis has acknowledged the write, and raises
+if the write failed.
+
+StreamConsumer reads the stream through a consumer group. It acknowledges
+(XACK) each entry only after its handler succeeded. Entries left pending by a
+failed handler or a dead consumer are claimed again after ``claim_idle_ms``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from fastapi_payments.messaging.publishers import InMemoryBroker, PaymentEventPublisher
+
+from serializers import dumps
+
+logger = logging.getLogger("fastapi_payments_example.events")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class RedisStreamBroker:
+    """Publishes events to a Redis stream in acknowledged, pipelined batches."""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        *,
+        stream: str = "payments:events",
+        stream_maxlen: int = 100_000,
+        batch_size: int = 100,
+        max_pending: int = 10_000,
+        client: Any = None,
+    ):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url or "redis://localhost:6379")
+        self.client = client
+        self.stream = stream
+        self.stream_maxlen = stream_maxlen
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start the batch writer; ``publish`` also starts it on first use."""
+        if self._flusher is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def publish(self, message: Mapping[str, Any], routing_key: Optional[str] = None, **_: Any) -> str:
+        """Queue ``message`` for the next batch and wait until Redis stored it.
+
+        The library's ``stream`` and ``maxlen`` arguments are ignored: every
+        event goes to ``self.stream``, so consumers read them in publish order.
+        """
+        await self.start()
+        event_type = routing_key or message.get("event_type")
+        fields = {"event_type": str(getattr(event_type, "value", event_type)), "body": dumps(message)}
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((fields, future))
+        return await future
+
+    async def close(self) -> None:
+        """Write out every queued event, then stop the writer and disconnect."""
+        if self._flusher is not None:
+            await self._queue.join()
+            self._flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+            self._queue = None
+        await self.client.aclose()
+
+    def consumer(self, group: str, name: str, **kwargs: Any) -> "StreamConsumer":
+        return StreamConsumer(self.client, self.stream, group, name, **kwargs)
+
+    async def _flush_forever(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for fields, _ in batch:
+                    pipe.xadd(self.stream, fields, maxlen=self.stream_maxlen, approximate=True)
+                entry_ids = await pipe.execute()
+        except Exception as exc:
+            logger.warning("Writing %d events to %s failed: %s", len(batch), self.stream, exc)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), entry_id in zip(batch, entry_ids):
+            if not future.done():  # the publisher may have been cancelled
+                future.set_result(entry_id.decode() if isinstance(entry_id, bytes) else entry_id)
+
+
+class StreamConsumer:
+    """Delivers stream entries to a handler and acknowledges the ones it handled."""
+
+    def __init__(
+        self,
+        client: Any,
+        stream: str,
+        group: str,
+        name: str,
+        *,
+        count: int = 100,
+        block_ms: int = 1000,
+        claim_idle_ms: int = 60_000,
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.name = name
+        self.count = count
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+
+    async def ensure_group(self) -> None:
+        """Create the consumer group (and the stream) if they do not exist yet."""
+        from redis.exceptions import ResponseError
+
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def poll(self, handler: Handler) -> int:
+        """Hand one batch to ``handler`` and return how many entries were acknowledged.
+
+        Entries pending for longer than ``claim_idle_ms`` come first, then new
+        ones. An entry whose handler raises stays pending and is retried later.
+        """
+        _, entries, *_ = await self.client.xautoclaim(
+            self.stream, self.group, self.name, self.claim_idle_ms, count=self.count
+        )
+        if len(entries) < self.count:
+            response = await self.client.xreadgroup(
+                self.group,
+                self.name,
+                {self.stream: ">"},
+                count=self.count - len(entries),
+                block=None if entries else self.block_ms,
+            )
+            for _, new_entries in response or ():
+                entries.extend(new_entries)
+
+        handled = []
+        for entry_id, fields in entries:
+            if fields:  # trimmed entries come back from XAUTOCLAIM without fields
+                try:
+                    await handler(json.loads(fields[b"body"]))
+                except Exception:
+                    logger.exception("Handler failed for stream entry %s", entry_id)
+                    continue
+            handled.append(entry_id)
+        if handled:
+            await self.client.xack(self.stream, self.group, *handled)
+        return len(handled)
+
+    async def run(self, handler: Handler) -> None:
+        await self.ensure_group()
+        while True:
+            await self.poll(handler)
+
+
+def _redis_broker(url: Optional[str], settings: Mapping[str, Any]) -> RedisStreamBroker:
+    return RedisStreamBroker(url, **settings)
+
+
+def _memory_broker(url: Optional[str], settings: Mapping[str, Any]) -> InMemoryBroker:
+    return InMemoryBroker()
+
+
+BROKERS: Dict[str, Callable[[Optional[str], Mapping[str, Any]], Any]] = {
+    "memory": _memory_broker,
+    "redis": _redis_broker,
+}
+
+
+class EventPublisher(PaymentEventPublisher):
+    """PaymentEventPublisher whose broker is built from ``BROKERS`` by ``broker_type``."""
+
+    def __init__(self, config: Any, broker_settings: Mapping[str, Any]):
+        self.broker_settings = dict(broker_settings)
+        super().__init__(config)
+
+    def _initialize_broker(self):  # type: ignore[no-untyped-def]
+        broker_type = str(self.config.broker_type).lower()
+        factory = BROKERS.get(broker_type)
+        if factory is None:
+            return super()._initialize_broker()
+        broker = factory(self.config.url, self.broker_settings)
+        if broker_type == "redis":
+            # The library's redis branch of publish_event passes this along.
+            self.stream_maxlen = broker.stream_maxlen
+        logger.info("Using the %s event broker", broker_type)
+        return broker
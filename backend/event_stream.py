@@ -0,0 +1,131 @@
+"""Server-Sent Events for subscription and payment status changes.
+
+Checkout pages used to poll ``GET /subscriptions/{id}`` until a webhook or
+``/razorpay/verify-payment`` flipped the status. ``EventHub`` receives every
+event PaymentEventPublisher publishes in this process and hands it to the
+SSE streams watching the affected subscription or payment, so a page keeps
+one open connection and sees the change as soon as it is published.
+
+Events only reach streams in the worker that published them, and under
+gunicorn the webhook or verification may land on another worker. So when a
+stream has been idle for a heartbeat it re-reads the status, and sends a
+``status`` event if it changed. Changes made elsewhere show up within
+``HEARTBEAT_SECONDS``.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set
+
+from fastapi import Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_payments.db import repositories as payment_db
+
+from serializers import dumps
+
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+HEARTBEAT_SECONDS = 15.0
+QUEUE_SIZE = 100
+
+# Event data keys that identify the entity an event is about.
+ENTITY_KEYS = {"subscription_id": "subscription", "payment_id": "payment"}
+
+
+def topic(kind: str, entity_id: str) -> str:
+    return f"{kind}:{entity_id}"
+
+
+class EventHub:
+    """Fans published events out to per-entity subscriber queues."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        data = message.get("data") or {}
+        for key, kind in ENTITY_KEYS.items():
+            entity_id = data.get(key)
+            if not entity_id:
+                continue
+            for queue in self._queues.get(topic(kind, entity_id), ()):
+                if queue.full():
+                    # A stalled client loses its oldest event, never the newest.
+                    queue.get_nowait()
+                queue.put_nowait(message)
+
+    @contextmanager
+    def subscribe(self, name: str) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._queues[name].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._queues[name]
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._queues[name]
+
+    def subscriber_count(self, name: str) -> int:
+        return len(self._queues.get(name, ()))
+
+
+async def current_status(session: AsyncSession, model: Any, row_id: str) -> Optional[str]:
+    """Return the row's status, or None if the row does not exist."""
+    result = await session.execute(select(model.status).where(model.id == row_id))
+    row = result.first()
+    if row is None:
+        return None
+    status = row[0]
+    return str(getattr(status, "value", status))
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: ".encode() + dumps(data) + b"\n\n"
+
+
+async def stream(
+    hub: EventHub,
+    kind: str,
+    model: Any,
+    entity_id: str,
+    request: Request,
+    heartbeat: float = HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """Yield SSE frames: the current status, then each event for the entity.
+
+    The stream subscribes before it reads the status, so a change that lands
+    in between is delivered rather than lost. It runs after the request's
+    session is gone, so the status reads use sessions of their own.
+    """
+
+    async def read_status() -> Optional[str]:
+        async with payment_db._sessionmaker() as session:
+            return await current_status(session, model, entity_id)
+
+    with hub.subscribe(topic(kind, entity_id)) as queue:
+        status = await read_status()
+        yield format_event("snapshot", {"id": entity_id, "status": status}, 0)
+        sequence = 0
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                latest = await read_status()
+                if latest == status:
+                    yield b": keep-alive\n\n"
+                    continue
+                status = latest
+                sequence += 1
+                yield format_event("status", {"id": entity_id, "status": status}, sequence)
+                continue
+            sequence += 1
+            yield format_event(message["event_type"], message, sequence)
@@ -0,0 +1,49 @@
+"""Gunicorn settings for production: several uvicorn worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+``main`` is imported once, in the master, and every worker is forked from
+it (``preload_app``). The workers share the imported code and the validated
+settings copy-on-write, and start quickly because there is nothing left to
+import. ``post_fork`` resets what cannot cross a fork. Everything with a
+lifetime (event loop tasks, broker and database connections) is created
+inside each worker.
+
+``kill -HUP <master pid>`` re-reads the settings in the master and replaces
+the workers gracefully, so they fork with the new settings.
+"""
+import asyncio
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers after this many requests (0 = never), staggered by the jitter
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+
+def when_ready(server):  # type: ignore[no-untyped-def]
+    import main
+
+    asyncio.run(main.create_schema())
+
+
+def post_fork(server, worker):  # type: ignore[no-untyped-def]
+    import main
+
+    main.reinitialize_after_fork()
+
+
+def on_reload(server):  # type: ignore[no-untyped-def]
+    import main
+
+    try:
+        main.reload_settings()
+    except Exception:
+        server.log.exception("Configuration reload failed; workers keep the previous settings")
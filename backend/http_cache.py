@@ -0,0 +1,83 @@
+"""HTTP validator (ETag / If-None-Match) helpers."""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from serializers import dumps
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def strong_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def weak_etag(*parts: Any) -> str:
+    """Weak ETag for a resource version identified by ``parts``."""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    return 'W/"' + digest[:32] + '"'
+
+
+async def row_version(session: AsyncSession, model: Any, row_id: str) -> Optional[str]:
+    """Return a row's version stamp, or None if the row does not exist.
+
+    Reads one indexed column instead of loading and serializing the row, so
+    a conditional GET can be answered before the expensive work.
+    """
+    stmt = select(func.coalesce(model.updated_at, model.created_at)).where(model.id == row_id)
+    result = await session.execute(stmt)
+    row = result.first()
+    if row is None:
+        return None
+    return str(row[0])
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True when an If-None-Match header matches ``etag``.
+
+    If-None-Match uses the weak comparison: ``W/"x"`` and ``"x"`` match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = _opaque(etag)
+    return any(_opaque(tag) == wanted for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str = "no-cache") -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+class PrecomputedJSON:
+    """A JSON body encoded once, with its ETag, served without re-serializing.
+
+    Requests carrying a matching If-None-Match get a 304 after a single
+    header comparison.
+    """
+
+    cache_control = "no-cache"
+
+    def __init__(self, content: Any):
+        self.body = dumps(content)
+        self.etag = strong_etag(self.body)
+
+    def response(self, request: Request) -> Response:
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return not_modified(self.etag, self.cache_control)
+        return Response(
+            content=self.body,
+            media_type=JSON_MEDIA_TYPE,
+            headers={"ETag": self.etag, "Cache-Control": self.cache_control},
+        )
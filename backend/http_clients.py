@@ -0,0 +1,82 @@
+"""Shared outbound HTTP clients for provider API calls.
+
+The library's PayU provider opens a new ``httpx.AsyncClient`` for every
+postservice call (SI debits, pre-debit notices, mandate changes). Each call
+therefore pays for a fresh TCP connection, a TLS handshake and a new SSL
+context, and a billing run makes thousands of them. ``ProviderHTTPClients``
+keeps one client per provider for the life of the worker instead. Its
+connections stay open between calls, up to ``max_keepalive_connections``
+idle ones for ``keepalive_expiry`` seconds.
+
+Clients are created on first use inside the worker, never at import, so a
+preloading gunicorn master does not hand sockets to its forks. HTTP/2 is
+offered through ALPN when ``h2`` is installed. Providers that do not speak
+it answer over HTTP/1.1 on the same client.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict
+
+import httpx
+
+try:  # h2 is optional; without it the clients speak HTTP/1.1 only.
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - exercised only without h2
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderHTTPClients:
+    """One pooled ``httpx.AsyncClient`` per provider, closed on shutdown."""
+
+    def __init__(
+        self,
+        *,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool,
+        timeout: float,
+        connect_timeout: float,
+        pool_timeout: float,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout)
+        if http2 and h2 is None:
+            logger.warning("HTTP/2 requested but h2 is not installed; using HTTP/1.1")
+        self.http2 = http2 and h2 is not None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._clients[provider] = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, http2=self.http2
+            )
+        return client
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Connections in use, idle connections and requests waiting for one, per provider."""
+        stats = {}
+        for provider, client in self._clients.items():
+            # httpx exposes no pool statistics; read httpcore's pool directly.
+            pool = client._transport._pool
+            connections = pool.connections
+            active = sum(1 for connection in connections if not connection.is_idle())
+            stats[provider] = {
+                "active": active,
+                "idle": len(connections) - active,
+                "waiting": sum(1 for request in pool._requests if request.is_queued()),
+            }
+        return stats
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
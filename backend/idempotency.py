@@ -0,0 +1,304 @@
+"""Idempotency-Key handling for routes that charge customers.
+
+A client that retries ``POST /payments`` after a timeout would otherwise
+charge twice. With an ``Idempotency-Key`` header the first request claims
+the key in the ``idempotency_keys`` table, runs, and stores its serialized
+response. Later requests with the same key get that response back without
+touching the provider. A duplicate that arrives while the first request is
+still running waits for it: on a future when both are in this worker,
+otherwise by polling the row. Reusing a key with a different body is
+rejected with 422. Only successful responses are stored; if the first
+request fails, the key is released so a retry runs again. The one exception
+is a response that cannot be encoded: the handler has already run, so a 500
+is stored and replayed instead of letting a retry run it a second time.
+
+A claim is held for ``lock_seconds`` at a time and renewed while the
+request runs. If the worker dies mid-request (a crash, or gunicorn
+recycling it), the claim lapses and the next retry takes the key over
+instead of waiting for the key to expire. Expired keys are purged every
+``purge_interval`` seconds.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from fastapi_payments.db import repositories as payment_db
+
+from leases import naive_utcnow
+from models import IdempotencyRecord
+from serializers import FastJSONResponse, dumps
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+JSON_MEDIA_TYPE = "application/json"
+POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = 255
+UNENCODABLE_BODY = dumps({"detail": "The response could not be encoded"})
+
+logger = logging.getLogger(__name__)
+
+
+def _lapsed(record: IdempotencyRecord, now: datetime) -> bool:
+    return record.status == "in_progress" and (
+        record.locked_until is None or record.locked_until <= now
+    )
+
+
+def fingerprint(payload: Any) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims keys, stores responses and replays them until they expire."""
+
+    def __init__(
+        self, ttl_seconds: int, wait_timeout: float, lock_seconds: float, purge_interval: float
+    ):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.wait_timeout = wait_timeout
+        self.lock = timedelta(seconds=lock_seconds)
+        self.purge_interval = purge_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._purger: Optional[asyncio.Task] = None
+
+    async def run(
+        self,
+        key: Optional[str],
+        scope: str,
+        payload: Mapping[str, Any],
+        handler: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """Run ``handler`` at most once per ``key`` and return its JSON response.
+
+        Without a key the handler simply runs.
+        """
+        if not key:
+            return FastJSONResponse(await handler())
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} is too long")
+
+        record_key = f"{scope}:{key}"
+        request_fingerprint = fingerprint(payload)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+
+        while True:
+            token = await self._claim(record_key, request_fingerprint)
+            if token is not None:
+                return await self._execute(record_key, token, handler)
+            record = await self._wait(record_key, request_fingerprint, deadline)
+            if record is not None:
+                return Response(
+                    content=record.response_body,
+                    status_code=record.status_code,
+                    media_type=JSON_MEDIA_TYPE,
+                    headers={REPLAYED_HEADER: "true"},
+                )
+            # The first request failed and released the key, or died and its
+            # claim lapsed: try to claim it.
+
+    async def _execute(
+        self, record_key: str, token: str, handler: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        done = asyncio.get_running_loop().create_future()
+        self._inflight[record_key] = done
+        try:
+            try:
+                content = await self._run_locked(record_key, token, handler)
+            except BaseException:
+                await self._release(record_key, token)
+                raise
+            try:
+                body = dumps(content)
+            except Exception:
+                await self._complete(record_key, token, UNENCODABLE_BODY, 500)
+                raise
+            await self._complete(record_key, token, body, 200)
+            return Response(content=body, media_type=JSON_MEDIA_TYPE)
+        finally:
+            # A request that took over this key's lapsed claim may have
+            # registered its own future since.
+            if self._inflight.get(record_key) is done:
+                del self._inflight[record_key]
+            done.set_result(None)
+
+    async def _run_locked(
+        self, record_key: str, token: str, handler: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        renewer = asyncio.create_task(self._renew(record_key, token))
+        try:
+            return await handler()
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+
+    async def _renew(self, record_key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lock.total_seconds() / 3)
+            try:
+                async with payment_db._sessionmaker() as session:
+                    await session.execute(
+                        update(IdempotencyRecord)
+                        .where(IdempotencyRecord.key == record_key, IdempotencyRecord.locked_by == token)
+                        .values(locked_until=naive_utcnow() + self.lock)
+                    )
+                    await session.commit()
+            except Exception:
+                # Keep trying: the claim has two more renewals' worth of time.
+                logger.warning(
+                    "Renewing an idempotency claim failed",
+                    extra={"idempotency_key": record_key},
+                    exc_info=True,
+                )
+
+    async def _claim(self, record_key: str, request_fingerprint: str) -> Optional[str]:
+        """Claim the key; returns the claim's token, or None if it is taken."""
+        now = naive_utcnow()
+        token = uuid.uuid4().hex
+        values = {
+            "fingerprint": request_fingerprint,
+            "status": "in_progress",
+            "status_code": None,
+            "response_body": None,
+            "created_at": now,
+            "expires_at": now + self.ttl,
+            "locked_by": token,
+            "locked_until": now + self.lock,
+        }
+        async with payment_db._sessionmaker() as session:
+            existing = await session.get(IdempotencyRecord, record_key)
+            if existing is None:
+                session.add(IdempotencyRecord(key=record_key, **values))
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # Another worker claimed it between the read and the insert.
+                    await session.rollback()
+                    return None
+                return token
+            if existing.expires_at > now and not _lapsed(existing, now):
+                return None
+            # Take over an expired key or a lapsed claim. The conditions are
+            # checked again by the UPDATE, so of several retries only one wins.
+            result = await session.execute(
+                update(IdempotencyRecord)
+                .where(
+                    IdempotencyRecord.key == record_key,
+                    or_(
+                        IdempotencyRecord.expires_at <= now,
+                        (IdempotencyRecord.status == "in_progress")
+                        & or_(
+                            IdempotencyRecord.locked_until.is_(None),
+                            IdempotencyRecord.locked_until <= now,
+                        ),
+                    ),
+                )
+                .values(**values)
+            )
+            await session.commit()
+        if not result.rowcount:
+            return None
+        if existing.status == "in_progress":
+            logger.warning(
+                "Took over an idempotency key whose request stopped renewing its claim",
+                extra={"idempotency_key": record_key},
+            )
+        return token
+
+    async def _wait(
+        self, record_key: str, request_fingerprint: str, deadline: float
+    ) -> Optional[IdempotencyRecord]:
+        """Wait for the claimed key to complete; None if it was released or
+        its claim lapsed."""
+        loop = asyncio.get_running_loop()
+        while True:
+            async with payment_db._sessionmaker() as session:
+                record = await session.get(IdempotencyRecord, record_key)
+            if record is None:
+                return None
+            if record.fingerprint != request_fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used with a different request",
+                )
+            if record.status == "completed":
+                return record
+            if _lapsed(record, naive_utcnow()):
+                return None
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                )
+            inflight = self._inflight.get(record_key)
+            if inflight is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(inflight), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Claimed by another worker; poll its row.
+                await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+    async def _complete(self, record_key: str, token: str, body: bytes, status_code: int) -> None:
+        async with payment_db._sessionmaker() as session:
+            result = await session.execute(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.key == record_key, IdempotencyRecord.locked_by == token)
+                .values(status="completed", status_code=status_code, response_body=body, locked_until=None)
+            )
+            await session.commit()
+        if not result.rowcount:
+            logger.warning(
+                "Idempotency key was taken over before its request finished",
+                extra={"idempotency_key": record_key},
+            )
+
+    async def _release(self, record_key: str, token: str) -> None:
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.key == record_key, IdempotencyRecord.locked_by == token
+                )
+            )
+            await session.commit()
+
+    async def purge_expired(self) -> int:
+        async with payment_db._sessionmaker() as session:
+            result = await session.execute(
+                delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= naive_utcnow())
+            )
+            await session.commit()
+        return result.rowcount or 0
+
+    def start(self) -> None:
+        """Purge expired keys now and every ``purge_interval`` seconds."""
+        if self._purger is None or self._purger.done():
+            self._purger = asyncio.create_task(self._purge_periodically())
+
+    async def shutdown(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            await asyncio.gather(self._purger, return_exceptions=True)
+            self._purger = None
+
+    async def _purge_periodically(self) -> None:
+        while True:
+            try:
+                await self.purge_expired()
+            except Exception:
+                logger.exception("Purging expired idempotency keys failed")
+            await asyncio.sleep(self.purge_interval)
@@ -0,0 +1,22 @@
+"""Helpers shared by the tables that lease rows to a worker.
+
+Billing runs, the webhook queue and idempotency claims all stamp a lease
+owner and compare lease deadlines in naive UTC.
+"""
+from __future__ import annotations
+
+import os
+import socket
+from datetime import datetime, timezone
+
+
+def worker_id() -> str:
+    """Identify this worker process as a lease owner."""
+    # Not a module constant: workers forked from a preloading gunicorn master
+    # would all inherit the master's PID.
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def naive_utcnow() -> datetime:
+    # Naive UTC: SQLite stores DateTime without a timezone.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
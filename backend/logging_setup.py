@@ -0,0 +1,187 @@
+"""Non-blocking structured logging with request IDs.
+
+``configure_logging`` routes every root-logger record through a
+``QueueHandler``. The event loop only enqueues the record, and a
+``QueueListener`` thread formats it and writes it to stdout. Each record
+carries the ``request_id`` of the request that emitted it (taken from
+``X-Request-ID`` or generated by ``RequestIdMiddleware``) plus any
+``extra=`` fields, rendered as one JSON object per line.
+
+Verbose payload logs (full meta_info dumps) are sampled at
+``payload_sample_rate``. ``log_payload`` decides before building the
+record, so unsampled calls cost a single ``random()``. The library's own
+meta_info dumps are recognised by message prefix and sampled by a filter;
+its other records are left alone.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PAYLOAD_LOGGER = "fastapi_payments_example.payloads"
+# Library records that dump whole meta_info dicts, by logger and message
+# prefix. Only those records are sampled at the payload rate; everything
+# else those loggers emit, and anything at WARNING or above, always passes.
+SAMPLED_PAYLOAD_RECORDS = {
+    "fastapi_payments.services.payment_service": (
+        "Plan meta_info: ",
+        "Passing meta_info to provider: ",
+    ),
+}
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+_payload_sample_rate = 1.0
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID.
+
+    Runs on the QueueHandler, in the emitting task, where the context
+    variable still holds the request's ID.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Pass a ``rate`` fraction of payload records below WARNING.
+
+    A payload record is one whose message starts with one of ``prefixes``;
+    other records are never dropped.
+    """
+
+    def __init__(self, rate: float, prefixes: Tuple[str, ...]):
+        super().__init__()
+        self.rate = rate
+        self.prefixes = prefixes
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if not (isinstance(record.msg, str) and record.msg.startswith(self.prefixes)):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+def configure_logging(settings: Mapping[str, Any]) -> None:
+    """Install the queue-based pipeline on the root logger.
+
+    ``settings`` is ``config.get_logging_config()``. Safe to call again,
+    for example after a config reload; the previous listener is stopped.
+    """
+    global _listener, _payload_sample_rate
+
+    stream = logging.StreamHandler()
+    if settings.get("format", "json") == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.get("level", "INFO"))
+
+    _payload_sample_rate = float(settings.get("payload_sample_rate", 1.0))
+    for name, prefixes in SAMPLED_PAYLOAD_RECORDS.items():
+        logger = logging.getLogger(name)
+        for existing in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+            logger.removeFilter(existing)
+        logger.addFilter(SamplingFilter(_payload_sample_rate, prefixes))
+
+    _listener = logging.handlers.QueueListener(
+        handler.queue, stream, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def log_payload(message: str, **payload: Any) -> None:
+    """Log a verbose payload record, subject to the payload sample rate."""
+    if random.random() < _payload_sample_rate:
+        _payload_logger.info(message, extra={"payload": payload})
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request ID to the request's context.
+
+    Reuses an incoming ``X-Request-ID`` header, otherwise generates one, and
+    echoes it on the response.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):  # type: ignore[no-untyped-def]
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        header = (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+
+        async def send_with_id(message):  # type: ignore[no-untyped-def]
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
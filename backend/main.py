@@ -1,31 +1,80 @@
 """Main FastAPI application."""
-from patches import ensure_memory_broker_support
-
-ensure_memory_broker_support()
+from patches import (
+    PLAN_PAGE,
+    add_event_listener,
+    add_transaction_verification,
+    configure_database_engine,
+    enable_lazy_providers,
+    install_catalog_cache,
+    offload_blocking_sdk_calls,
+    use_shared_http_client,
+)
 
+import asyncio
+import copy
+import functools
+import hmac
+import json
+import signal
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Literal, Optional
+from urllib.parse import parse_qsl
 
 import logging
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Fix the import - routes might be in a different location
 from fastapi_payments import FastAPIPayments
 from fastapi_payments.api import routes as payment_routes  # Updated import path
 from fastapi_payments.api.dependencies import (
+    get_db,
+    get_payment_service,
     get_payment_service_with_db,
-    initialize_dependencies,
 )
-from fastapi_payments.config.config_schema import PaymentConfig
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Customer, Payment, Subscription
+from fastapi_payments.messaging.publishers import PaymentEvents
 from fastapi_payments.services.payment_service import PaymentService
-from fastapi_payments.db.repositories.subscription_repository import SubscriptionRepository
-from fastapi_payments.db.repositories.payment_repository import PaymentRepository
 
-from config import get_payment_config
+import billing_run
+import customer_batch
+import customer_search
+import dependencies
+import event_stream
+import exports
+import metrics
+import pagination
+import razorpay_checkout
+import read_replica
+import webhook_queue
+from catalog_cache import TTLCache
+from config import (
+    get_admin_config,
+    get_billing_run_config,
+    get_catalog_cache_config,
+    get_customer_batch_config,
+    get_razorpay_verify_batch_config,
+    get_http_client_config,
+    get_idempotency_config,
+    get_logging_config,
+    get_payment_config,
+    get_provider_loading_config,
+    get_webhook_queue_config,
+    reload_dotenv,
+)
+from http_cache import PrecomputedJSON, etag_matches, not_modified, row_version, weak_etag
+from http_clients import ProviderHTTPClients
+from idempotency import IDEMPOTENCY_HEADER, IdempotencyStore
+from logging_setup import REQUEST_ID_HEADER, RequestIdMiddleware, configure_logging, log_payload
+from models import ensure_schema
+from serializers import ResponseSerializer
 from schemas import (
     CustomerCreate, CustomerResponse,
+    CustomerBatchCreate, CustomerBatchResponse,
     PaymentMethodCreate, PaymentMethodResponse,
     PaymentCreate, PaymentResponse,
     ProductCreate, ProductResponse,
@@ -33,6 +82,7 @@ from schemas import (
     SubscriptionCreate, SubscriptionResponse,
     ProviderLinkResponse,
     SITransactionRequest, PreDebitNotifyRequest,
+    BillingRunCreate, BillingRunResponse, BillingRunItemResponse,
 )
 
 from schemas import CustomerUpdate
@@ -54,12 +104,87 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, REQUEST_ID_HEADER],
 )
+app.add_middleware(RequestIdMiddleware)
+# Outermost, so the recorded latency covers CORS and every other middleware.
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Initialize FastAPI Payments
-payments_config = PaymentConfig(**get_payment_config())
+payment_settings = get_payment_config()
+payments_config = dependencies.get_payment_config()
 payments = FastAPIPayments(payments_config)
-initialize_dependencies(payments_config)
+# After FastAPIPayments, whose logging.basicConfig this replaces.
+configure_logging(get_logging_config())
+# DatabaseConfig keeps only url/echo/pool_size/max_overflow, so rebuild the
+# engine from the full settings (pool recycle, pre-ping, SQLite pragmas).
+configure_database_engine(payment_settings["database"])
+metrics.instrument_engine(payment_db._engine)
+replica = read_replica.ReadReplica(payment_settings["database"])
+if replica.engine is not None:
+    metrics.instrument_engine(replica.engine)
+metrics.instrument_service(PaymentService)
+metrics.instrument_providers(PaymentService)
+if get_provider_loading_config()["lazy"]:
+    enable_lazy_providers()
+dependencies.initialize_payment_dependencies(payments_config)
+customer_batch_config = get_customer_batch_config()
+razorpay_verify_batch_config = get_razorpay_verify_batch_config()
+idempotency_store = IdempotencyStore(**get_idempotency_config())
+billing_runner = billing_run.BillingRunner(**get_billing_run_config())
+catalog_cache = TTLCache(**get_catalog_cache_config())
+webhooks = webhook_queue.WebhookQueue(**get_webhook_queue_config())
+install_catalog_cache(catalog_cache)
+http_clients = ProviderHTTPClients(**get_http_client_config())
+use_shared_http_client(http_clients)
+add_transaction_verification()
+offload_blocking_sdk_calls()
+metrics.instrument_http_clients(http_clients)
+admin_config = get_admin_config()
+
+
+async def _request_payment_service(
+    payment_service: PaymentService = Depends(get_payment_service),
+    db: AsyncSession = Depends(get_db),
+) -> PaymentService:
+    """Per-request copy of the shared PaymentService bound to this request's session.
+
+    The library's dependency sets the session on the one global service, so
+    concurrent requests would overwrite each other's session. The copy shares
+    providers, config and the event publisher, and only owns ``db_session``.
+    """
+    service = copy.copy(payment_service)
+    service.set_db_session(db)
+    return service
+
+
+app.dependency_overrides[get_payment_service_with_db] = _request_payment_service
+
+
+def _read_primary(
+    value: Optional[str] = Header(None, alias=read_replica.READ_PRIMARY_HEADER),
+) -> bool:
+    return read_replica.wants_primary(value)
+
+
+async def get_read_payment_service(
+    payment_service: PaymentService = Depends(get_payment_service),
+    read_primary: bool = Depends(_read_primary),
+) -> AsyncIterator[PaymentService]:
+    """Like ``_request_payment_service``, for routes that only read.
+
+    The session is on the read replica when one is configured and reachable,
+    and on the primary otherwise or with ``X-Read-Primary: 1`` (see
+    ``read_replica``).
+    """
+    async with replica.session(read_primary) as session:
+        service = copy.copy(payment_service)
+        service.set_db_session(session)
+        yield service
+
+
+event_hub = event_stream.EventHub()
+add_event_listener(event_hub.publish)
 
 PROVIDER_CAPABILITIES = {
     "stripe": {
@@ -105,11 +230,149 @@ def _provider_catalog() -> Dict[str, Any]:
 
     return {"default_provider": payments_config.default_provider, "providers": providers}
 
-# Include payment routes
-app.include_router(
-    payment_routes.router,
-    tags=["payments"]
-)
+
+# The catalog only depends on payments_config, so it is encoded once and
+# served as pre-built bytes with a strong ETag.
+_provider_catalog_cache: Optional[PrecomputedJSON] = None
+
+
+def provider_catalog_response() -> PrecomputedJSON:
+    global _provider_catalog_cache
+    if _provider_catalog_cache is None:
+        _provider_catalog_cache = PrecomputedJSON(_provider_catalog())
+    return _provider_catalog_cache
+
+
+def invalidate_provider_catalog() -> None:
+    """Drop the cached catalog; call whenever payments_config is replaced."""
+    global _provider_catalog_cache
+    _provider_catalog_cache = None
+
+
+provider_catalog_response()
+
+
+def reload_settings() -> None:
+    """Apply edited settings without restarting the worker.
+
+    Re-reads the .env file, swaps in a new PaymentConfig and rebuilds the
+    payment service and event publisher from it, so provider keys, the
+    default provider, messaging and logging settings take effect. Database
+    settings still need a restart. Invalid settings raise and leave the
+    running configuration as it was.
+    """
+    global payments_config
+    reload_dotenv()
+    payments_config = dependencies.reload_payment_config()
+    configure_logging(get_logging_config())
+    previous_publisher = dependencies.initialize_payment_dependencies(payments_config)
+    invalidate_provider_catalog()
+    try:
+        # Let the old broker write out what it has queued, then disconnect.
+        asyncio.get_running_loop().create_task(previous_publisher.stop())
+    except RuntimeError:
+        pass  # not serving; the shutdown hook already stopped the old broker
+    logger.info("Configuration reloaded", extra={"providers": list(payments_config.providers)})
+
+
+def _reload_on_signal() -> None:
+    try:
+        reload_settings()
+    except Exception:
+        logger.exception("Configuration reload failed; keeping the previous settings")
+
+
+async def create_schema() -> None:
+    """Create missing tables and indexes, then close the connections used.
+
+    The gunicorn master runs this once before forking, so workers starting
+    together do not race to create the same tables.
+    """
+    await ensure_schema(payment_db._engine)
+    await payment_db._engine.dispose()
+
+
+def reinitialize_after_fork() -> None:
+    """Reset state a worker must not share with the process it was forked from.
+
+    Everything else built at import (config, payment service, caches,
+    patches) is inherited from a preloading master as is.
+    """
+    # Pooled connections belong to the parent; leave them for it to close.
+    payment_db._engine.sync_engine.dispose(close=False)
+    replica.reset_after_fork()
+    # Threads do not survive fork, so the log listener has to be restarted.
+    configure_logging(get_logging_config())
+
+
+@app.on_event("startup")
+async def prepare_database():
+    """Create missing tables and indexes, drop old processed webhooks and
+    resume billing runs interrupted by a restart."""
+    await ensure_schema(payment_db._engine)
+    await webhooks.purge_processed()
+    payment_service = await get_payment_service()
+    if billing_run.PROVIDER in payment_service.providers:
+        await billing_runner.resume_interrupted(
+            payment_service.get_provider(billing_run.PROVIDER)
+        )
+
+
+@app.on_event("startup")
+async def install_reload_signal():
+    """Reload settings on SIGHUP (``kill -HUP <worker pid>``)."""
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_on_signal)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # No SIGHUP on Windows, and only the main thread may install handlers.
+        logger.info("SIGHUP config reload unavailable; use POST /admin/config/reload")
+
+
+@app.on_event("startup")
+async def start_idempotency_purge():
+    """Delete expired Idempotency-Key records now and periodically."""
+    idempotency_store.start()
+
+
+@app.on_event("startup")
+async def start_webhook_workers():
+    """Process queued webhooks, including any left by a previous run."""
+    webhooks.start(process_webhook)
+
+
+@app.on_event("shutdown")
+async def stop_webhook_workers():
+    await webhooks.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_idempotency_purge():
+    await idempotency_store.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_billing_runs():
+    """Stop background billing runs; their leases lapse and another start resumes them."""
+    await billing_runner.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close the pooled provider connections; the next start-up opens new ones."""
+    await http_clients.aclose()
+
+
+@app.on_event("shutdown")
+async def close_read_replica():
+    await replica.dispose()
+
+
+@app.on_event("shutdown")
+async def stop_event_publisher():
+    """Write out queued events and close the broker connection."""
+    payment_service = await get_payment_service()
+    await payment_service.event_publisher.stop()
+
 
 # Serialization helpers -------------------------------------------------------
 
@@ -239,11 +502,12 @@ def _subscription_payload(subscription: Dict[str, Any]) -> Dict[str, Any]:
 
 def _payment_payload(payment: Dict[str, Any]) -> Dict[str, Any]:
     metadata = payment.get("meta_info") or payment.get("metadata") or {}
+    status = payment.get("status")
     return {
         "id": payment["id"],
         "amount": payment.get("amount"),
         "currency": payment.get("currency"),
-        "status": payment.get("status"),
+        "status": getattr(status, "value", status),  # PaymentStatus enum from the ORM
         "description": metadata.get("description"),
         "customer_id": payment.get("customer_id"),
         "payment_method_id": payment.get("payment_method"),
@@ -253,6 +517,55 @@ def _payment_payload(payment: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+# List routes return these directly so rows are serialized once instead of
+# being re-validated against the route's response_model.
+CUSTOMER_LIST = ResponseSerializer(CustomerResponse, _customer_payload)
+PAYMENT_LIST = ResponseSerializer(PaymentResponse, _payment_payload)
+PRODUCT_LIST = ResponseSerializer(ProductResponse, _product_payload)
+PLAN_LIST = ResponseSerializer(PlanResponse, _plan_payload)
+SUBSCRIPTION_LIST = ResponseSerializer(SubscriptionResponse, _subscription_payload)
+
+
+def _cursor_headers(next_cursor: Optional[str]) -> Optional[Dict[str, str]]:
+    if next_cursor:
+        return {pagination.NEXT_CURSOR_HEADER: next_cursor}
+    return None
+
+
+async def _event_stream_response(
+    request: Request,
+    payment_service: PaymentService,
+    kind: str,
+    model: Any,
+    entity_id: str,
+    not_found: str,
+) -> StreamingResponse:
+    try:
+        exists = await row_version(payment_service.db_session, model, entity_id)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    if exists is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return StreamingResponse(
+        event_stream.stream(event_hub, kind, model, entity_id, request),
+        media_type=event_stream.SSE_MEDIA_TYPE,
+        headers=event_stream.SSE_HEADERS,
+    )
+
+
+def _export_response(chunks, export_format: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=exports.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+
+def _check_pagination(cursor: Optional[str], offset: int) -> None:
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="cursor and offset cannot be combined")
+
+
 # Create custom routes
 @app.get("/")
 async def root():
@@ -266,9 +579,33 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Latency histograms for this worker in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/providers")
-async def list_providers():
-    """Return configured payment providers and their capabilities."""
+async def list_providers(request: Request):
+    """Return configured payment providers and their capabilities.
+
+    Responses carry an ETag; a matching If-None-Match gets a 304.
+    """
+    return provider_catalog_response().response(request)
+
+
+@app.post("/admin/config/reload", include_in_schema=False)
+async def reload_config(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Reload settings in the worker serving the request; see ``reload_settings``."""
+    expected = admin_config["token"]
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token or not hmac.compare_digest(admin_token, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    try:
+        reload_settings()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return _provider_catalog()
 
 
@@ -288,19 +625,48 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def list_customers(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     search: Optional[str] = Query(None, description="Filter by name or email"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
-    """List customers stored in the payments database."""
+    """List customers stored in the payments database.
+
+    Without ``offset`` the list is paged by cursor: follow the
+    ``X-Next-Cursor`` response header to fetch the next page. With
+    ``search`` the best matches come first (see ``customer_search``).
+    """
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        customers = await payment_service.list_customers(
-            limit=limit, offset=offset, search=search
-        )
-        return [_customer_payload(customer) for customer in customers]
+        if search:
+            page = await customer_search.search_customers(
+                payment_service.db_session,
+                query=search,
+                default_provider=payment_service.default_provider,
+                limit=limit,
+                cursor=cursor,
+                offset=offset,
+            )
+            customers = page.items
+            next_cursor = page.next_cursor
+        elif offset:
+            customers = await payment_service.list_customers(limit=limit, offset=offset)
+        else:
+            page = await pagination.list_customers(
+                payment_service.db_session,
+                default_provider=payment_service.default_provider,
+                limit=limit,
+                cursor=cursor,
+            )
+            customers = page.items
+            next_cursor = page.next_cursor
+        return CUSTOMER_LIST.response(customers, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         # Log the full traceback to help debug unexpected 500s
-        logger.exception("Unexpected error listing payment methods for %s (provider=%s)", customer_id, provider)
+        logger.exception("Unexpected error listing customers")
         raise HTTPException(status_code=500, detail=str(exc))
 
 
@@ -334,20 +700,60 @@ async def create_customer(
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/customers/batch", response_model=CustomerBatchResponse)
+async def create_customers_batch(
+    batch: CustomerBatchCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service_with_db),
+):
+    """Create many customers at once, reporting success or failure per item."""
+    max_items = customer_batch_config["max_items"]
+    if len(batch.customers) > max_items:
+        raise HTTPException(
+            status_code=413, detail=f"A batch may contain at most {max_items} customers"
+        )
+
+    results = await customer_batch.create_customers(
+        payment_service,
+        batch.customers,
+        provider_concurrency=customer_batch_config["provider_concurrency"],
+    )
+    for result in results:
+        if result.get("customer"):
+            result["customer"] = _customer_payload(result["customer"])
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+
 @app.get("/customers/{customer_id}", response_model=CustomerResponse)
 async def get_customer(
     customer_id: str,
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
-    """Return a single customer."""
+    """Return a single customer.
+
+    Honours If-None-Match: a matching weak ETag gets a 304 without loading
+    the customer or calling its providers.
+    """
     try:
+        version = await row_version(payment_service.db_session, Customer, customer_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        etag = weak_etag(customer_id, version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
         customer = await payment_service.get_customer(customer_id)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
+    response.headers["ETag"] = etag
     return _customer_payload(customer)
 
 
@@ -404,7 +810,7 @@ async def list_payment_methods(
     customer_id: str,
     provider: Optional[str] = Query(None, description="Filter by provider"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """List payment methods for the given customer."""
     try:
@@ -471,44 +877,105 @@ async def list_payments(
     status: Optional[str] = Query(None, description="Filter by payment status"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """List processed payments from the service."""
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        payments = await payment_service.list_payments(
-            customer_id=customer_id, status=status, limit=limit, offset=offset
-        )
-        return [_payment_payload(payment) for payment in payments]
+        if offset:
+            payments = await payment_service.list_payments(
+                customer_id=customer_id, status=status, limit=limit, offset=offset
+            )
+        else:
+            page = await pagination.list_payments(
+                payment_service.db_session,
+                limit=limit,
+                cursor=cursor,
+                customer_id=customer_id,
+                status=status,
+            )
+            payments = page.items
+            next_cursor = page.next_cursor
+        return PAYMENT_LIST.response(payments, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/payments/export")
+async def export_payments(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Export format"),
+    status: Optional[str] = Query(None, description="Filter by payment status"),
+    customer_id: Optional[str] = Query(None, description="Filter by customer"),
+    created_from: Optional[datetime] = Query(None, description="Inclusive lower bound on created_at"),
+    created_to: Optional[datetime] = Query(None, description="Exclusive upper bound on created_at"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    read_primary: bool = Depends(_read_primary),
+):
+    """Stream every matching payment as NDJSON or CSV."""
+    stmt = exports.payments_query(
+        status=status,
+        customer_id=customer_id,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    open_session = functools.partial(replica.session, read_primary)
+    return _export_response(
+        exports.export_payments(stmt, format, open_session), format, "payments"
+    )
+
+
+@app.get("/payments/{payment_id}/events")
+async def payment_events(
+    payment_id: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service_with_db),
+):
+    """Stream status changes for a payment as Server-Sent Events."""
+    return await _event_stream_response(
+        request, payment_service, "payment", Payment, payment_id, "Payment not found"
+    )
+
+
 @app.post("/payments", response_model=PaymentResponse)
 async def create_payment(
     payment: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: Dict[str, Any] = Depends(get_current_user),
     payment_service: PaymentService = Depends(get_payment_service_with_db),
 ):
-    """Create a one-time charge via the payment provider."""
+    """Create a one-time charge via the payment provider.
+
+    Send an ``Idempotency-Key`` header to make retries safe: a repeated key
+    returns the first response without charging again.
+    """
     if not payment.customer_id:
         raise HTTPException(status_code=400, detail="customer_id is required")
-    try:
-        processed = await payment_service.process_payment(
-            customer_id=payment.customer_id,
-            amount=payment.amount,
-            currency=payment.currency,
-            payment_method_id=payment.payment_method_id,
-            mandate_id=getattr(payment, 'mandate_id', None),
-            description=payment.description,
-            meta_info=payment.metadata,
-            provider=payment.provider,
-        )
-        return _payment_payload(processed)
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+
+    async def charge() -> Dict[str, Any]:
+        try:
+            processed = await payment_service.process_payment(
+                customer_id=payment.customer_id,
+                amount=payment.amount,
+                currency=payment.currency,
+                payment_method_id=payment.payment_method_id,
+                mandate_id=getattr(payment, 'mandate_id', None),
+                description=payment.description,
+                meta_info=payment.meta_info,
+                provider=payment.provider,
+            )
+            return PAYMENT_LIST.row(processed)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=str(exc))
+
+    return await idempotency_store.run(idempotency_key, "POST /payments", payment.dict(), charge)
 
 
 # Product routes
@@ -516,13 +983,28 @@ async def create_payment(
 async def list_products(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """List products stored in the payments catalog."""
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        products = await payment_service.list_products(limit=limit, offset=offset)
-        return [_product_payload(product) for product in products]
+        if offset:
+            products = await payment_service.list_products(limit=limit, offset=offset)
+        else:
+            page = await pagination.list_products(
+                payment_service.db_session,
+                default_provider=payment_service.default_provider,
+                limit=limit,
+                cursor=cursor,
+            )
+            products = page.items
+            next_cursor = page.next_cursor
+        return PRODUCT_LIST.response(products, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -535,16 +1017,12 @@ async def create_product(
 ):
     """Create a new product across provider + local DB."""
     try:
-        logger.info("=== CREATE PRODUCT ENDPOINT CALLED ===")
-        logger.info(f"Raw product data: {product.dict()}")
+        log_payload("create_product request", product=product.dict())
         # Extract provider from meta_info if provided
         provider = None
         if product.meta_info:
             provider = product.meta_info.get("provider")
-            logger.info(f"Extracted provider from meta_info: {provider}")
-        
-        logger.info(f"Final provider to use: {provider}")
-        
+
         created = await payment_service.create_product(
             name=product.name,
             description=product.description,
@@ -564,15 +1042,41 @@ async def list_plans(
     product_id: str,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """List plans for a specific product."""
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        plans = await payment_service.list_plans(
-            product_id=product_id, limit=limit, offset=offset
-        )
-        return [_plan_payload(plan) for plan in plans]
+        if offset:
+            plans = await payment_service.list_plans(
+                product_id=product_id, limit=limit, offset=offset
+            )
+        else:
+            session = payment_service.db_session
+            page_key = (PLAN_PAGE, product_id, limit, cursor)
+            page = None if read_replica.requires_primary(session) else catalog_cache.get(page_key)
+            if page is None:
+                metrics.CACHE_LOOKUPS.inc(PLAN_PAGE, "miss")
+                page = await pagination.list_plans(
+                    session,
+                    default_provider=payment_service.default_provider,
+                    product_id=product_id,
+                    limit=limit,
+                    cursor=cursor,
+                )
+                # A lagging replica could cache a page older than the last write.
+                if not read_replica.is_replica(session):
+                    catalog_cache.set(page_key, page)
+            else:
+                metrics.CACHE_LOOKUPS.inc(PLAN_PAGE, "hit")
+            plans = page.items
+            next_cursor = page.next_cursor
+        return PLAN_LIST.response(plans, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -617,19 +1121,58 @@ async def list_subscriptions(
     status: Optional[str] = Query(None, description="Filter by subscription status"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """Return subscriptions from the catalog."""
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        subscriptions = await payment_service.list_subscriptions(
-            customer_id=customer_id, status=status, limit=limit, offset=offset
-        )
-        return [_subscription_payload(subscription) for subscription in subscriptions]
+        if offset:
+            subscriptions = await payment_service.list_subscriptions(
+                customer_id=customer_id, status=status, limit=limit, offset=offset
+            )
+        else:
+            page = await pagination.list_subscriptions(
+                payment_service.db_session,
+                limit=limit,
+                cursor=cursor,
+                customer_id=customer_id,
+                status=status,
+            )
+            subscriptions = page.items
+            next_cursor = page.next_cursor
+        return SUBSCRIPTION_LIST.response(subscriptions, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/subscriptions/export")
+async def export_subscriptions(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Export format"),
+    status: Optional[str] = Query(None, description="Filter by subscription status"),
+    customer_id: Optional[str] = Query(None, description="Filter by customer"),
+    created_from: Optional[datetime] = Query(None, description="Inclusive lower bound on created_at"),
+    created_to: Optional[datetime] = Query(None, description="Exclusive upper bound on created_at"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    read_primary: bool = Depends(_read_primary),
+):
+    """Stream every matching subscription as NDJSON or CSV."""
+    stmt = exports.subscriptions_query(
+        status=status,
+        customer_id=customer_id,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    open_session = functools.partial(replica.session, read_primary)
+    return _export_response(
+        exports.export_subscriptions(stmt, format, open_session), format, "subscriptions"
+    )
+
+
 @app.get(
     "/customers/{customer_id}/subscriptions",
     response_model=List[SubscriptionResponse],
@@ -638,15 +1181,30 @@ async def list_customer_subscriptions(
     customer_id: str,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
     """Return subscriptions for a single customer."""
+    _check_pagination(cursor, offset)
+    next_cursor = None
     try:
-        subscriptions = await payment_service.list_subscriptions(
-            customer_id=customer_id, limit=limit, offset=offset
-        )
-        return [_subscription_payload(subscription) for subscription in subscriptions]
+        if offset:
+            subscriptions = await payment_service.list_subscriptions(
+                customer_id=customer_id, limit=limit, offset=offset
+            )
+        else:
+            page = await pagination.list_subscriptions(
+                payment_service.db_session,
+                limit=limit,
+                cursor=cursor,
+                customer_id=customer_id,
+            )
+            subscriptions = page.items
+            next_cursor = page.next_cursor
+        return SUBSCRIPTION_LIST.response(subscriptions, headers=_cursor_headers(next_cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -655,40 +1213,52 @@ async def list_customer_subscriptions(
 async def create_subscription(
     customer_id: str,
     subscription: SubscriptionCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: Dict[str, Any] = Depends(get_current_user),
     payment_service: PaymentService = Depends(get_payment_service_with_db),
 ):
-    """Create a subscription using an existing plan."""
-    print(f"[BACKEND] create_subscription endpoint called with provider={subscription.provider}")
-    print(f"[BACKEND] meta_info from request: {subscription.meta_info}")
-    
-    try:
-        # Pass provider if specified, otherwise will use plan's default provider
-        meta_info = subscription.meta_info or {}
-        if subscription.provider:
-            meta_info["provider"] = subscription.provider
-        
-        print(f"[BACKEND] Calling payment_service.create_subscription with meta_info: {meta_info}")
-        
-        created = await payment_service.create_subscription(
-            customer_id=customer_id,
-            plan_id=subscription.plan_id,
-            quantity=subscription.quantity,
-            trial_period_days=subscription.trial_period_days,
-            meta_info=meta_info,
-        )
-        
-        print(f"[BACKEND] Received subscription response with meta_info keys: {list((created.get('meta_info') or {}).keys())}")
-        if created.get('meta_info', {}).get('redirect'):
-            print(f"[BACKEND] REDIRECT INFO PRESENT: {created['meta_info']['redirect'].get('action_url')}")
-        else:
-            print(f"[BACKEND] WARNING: NO REDIRECT INFO in response")
-        
-        return _subscription_payload(created)
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+    """Create a subscription using an existing plan.
+
+    Honours ``Idempotency-Key`` like ``POST /payments``.
+    """
+    async def subscribe() -> Dict[str, Any]:
+        try:
+            # Pass provider if specified, otherwise will use plan's default provider
+            meta_info = subscription.meta_info or {}
+            if subscription.provider:
+                meta_info["provider"] = subscription.provider
+            log_payload("create_subscription request", customer_id=customer_id, meta_info=meta_info)
+
+            created = await payment_service.create_subscription(
+                customer_id=customer_id,
+                plan_id=subscription.plan_id,
+                quantity=subscription.quantity,
+                trial_period_days=subscription.trial_period_days,
+                meta_info=meta_info,
+            )
+
+            created_meta = created.get("meta_info") or {}
+            logger.info(
+                "Subscription created",
+                extra={
+                    "subscription_id": created.get("id"),
+                    "provider": created.get("provider"),
+                    "has_redirect": bool(created_meta.get("redirect")),
+                    "has_checkout_config": bool(created_meta.get("checkout_config")),
+                },
+            )
+            return SUBSCRIPTION_LIST.row(created)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=str(exc))
+
+    return await idempotency_store.run(
+        idempotency_key,
+        "POST /customers/{customer_id}/subscriptions",
+        {"customer_id": customer_id, **subscription.dict()},
+        subscribe,
+    )
 
 
 @app.post("/subscriptions/{subscription_id}/cancel", response_model=SubscriptionResponse)
@@ -714,25 +1284,59 @@ async def cancel_subscription(
 @app.get("/subscriptions/{subscription_id}", response_model=SubscriptionResponse)
 async def get_subscription(
     subscription_id: str,
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user),
-    payment_service: PaymentService = Depends(get_payment_service_with_db),
+    payment_service: PaymentService = Depends(get_read_payment_service),
 ):
-    """Return a single subscription by id."""
+    """Return a single subscription by id.
+
+    Honours If-None-Match the same way as ``GET /customers/{customer_id}``.
+    """
     try:
+        version = await row_version(payment_service.db_session, Subscription, subscription_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        etag = weak_etag(subscription_id, version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
         subscription = await payment_service.get_subscription(subscription_id)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
     if not subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
 
+    response.headers["ETag"] = etag
     return _subscription_payload(subscription)
 
 
+@app.get("/subscriptions/{subscription_id}/events")
+async def subscription_events(
+    subscription_id: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service_with_db),
+):
+    """Stream status changes for a subscription as Server-Sent Events.
+
+    The first event is a ``snapshot`` with the current status; each later
+    event is a published payment event (``payment.subscription.updated``,
+    ``payment.subscription.canceled``, ...). Checkout pages should hold
+    this open instead of polling ``GET /subscriptions/{subscription_id}``.
+    """
+    return await _event_stream_response(
+        request, payment_service, "subscription", Subscription, subscription_id,
+        "Subscription not found",
+    )
+
+
 # ---------------------------------------------------------------------------
 # Razorpay-specific routes
 # ---------------------------------------------------------------------------
-from pydantic import BaseModel as _BaseModel
+from pydantic import BaseModel as _BaseModel, Field
 
 
 class RazorpayVerifyPaymentRequest(_BaseModel):
@@ -747,6 +1351,22 @@ class RazorpayVerifyPaymentRequest(_BaseModel):
     payment_id: Optional[str] = None                  # internal DB payment.id
 
 
+class RazorpayVerifyPaymentBatch(_BaseModel):
+    """Checkout payloads re-verified together, e.g. by reconciliation after an outage."""
+
+    items: List[RazorpayVerifyPaymentRequest] = Field(..., min_items=1)
+
+
+def _verified_subscription_payload(subscription: Dict[str, Any]) -> Dict[str, Any]:
+    return _subscription_payload(
+        {
+            **subscription,
+            "quantity": subscription["quantity"] or 1,
+            "cancel_at_period_end": subscription["cancel_at_period_end"] or False,
+        }
+    )
+
+
 @app.post("/razorpay/verify-payment")
 async def razorpay_verify_payment(
     request: RazorpayVerifyPaymentRequest,
@@ -766,41 +1386,26 @@ async def razorpay_verify_payment(
             razorpay_signature=request.razorpay_signature,
         )
 
+        session = payment_service.db_session
         # ── Mark subscription active ────────────────────────────────────────
         if request.subscription_id:
-            sub_repo = SubscriptionRepository(payment_service.db_session)
-            updated = await sub_repo.update(request.subscription_id, status="active")
-            if updated:
-                sub_dict = {
-                    "id": updated.id,
-                    "customer_id": updated.customer_id,
-                    "plan_id": updated.plan_id,
-                    "status": updated.status,
-                    "quantity": updated.quantity or 1,
-                    "current_period_start": updated.current_period_start,
-                    "current_period_end": updated.current_period_end,
-                    "cancel_at_period_end": updated.cancel_at_period_end or False,
-                    "created_at": updated.created_at,
-                    "meta_info": updated.meta_info,
-                }
-                return {"verified": True, "subscription": _subscription_payload(sub_dict)}
+            subscription = await razorpay_checkout.activate_subscription(session, request.subscription_id)
+            if subscription:
+                await payment_service.event_publisher.publish_event(
+                    PaymentEvents.SUBSCRIPTION_UPDATED,
+                    {"subscription_id": subscription["id"], "status": subscription["status"]},
+                )
+                return {"verified": True, "subscription": _verified_subscription_payload(subscription)}
 
         # ── Mark payment completed ──────────────────────────────────────────
         if request.payment_id:
-            pay_repo = PaymentRepository(payment_service.db_session)
-            updated_pay = await pay_repo.update(request.payment_id, status="COMPLETED")
-            if updated_pay:
-                pay_dict = {
-                    "id": updated_pay.id,
-                    "customer_id": updated_pay.customer_id,
-                    "amount": updated_pay.amount,
-                    "currency": updated_pay.currency,
-                    "status": updated_pay.status,
-                    "payment_method": updated_pay.payment_method,
-                    "created_at": updated_pay.created_at,
-                    "meta_info": updated_pay.meta_info,
-                }
-                return {"verified": True, "payment": _payment_payload(pay_dict)}
+            payment = await razorpay_checkout.complete_payment(session, request.payment_id)
+            if payment:
+                await payment_service.event_publisher.publish_event(
+                    PaymentEvents.PAYMENT_SUCCEEDED,
+                    {"payment_id": payment["id"], "status": "completed"},
+                )
+                return {"verified": True, "payment": _payment_payload(payment)}
 
         return {"verified": True}
     except ValueError as exc:
@@ -810,6 +1415,56 @@ async def razorpay_verify_payment(
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/razorpay/verify-payment/batch")
+async def razorpay_verify_payment_batch(
+    batch: RazorpayVerifyPaymentBatch,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service_with_db),
+):
+    """Verify many Checkout signatures, reporting the outcome per item.
+
+    Items whose signature checks out get the same status changes as
+    ``/razorpay/verify-payment``, all in one transaction.
+    """
+    max_items = razorpay_verify_batch_config["max_items"]
+    if len(batch.items) > max_items:
+        raise HTTPException(
+            status_code=413, detail=f"A batch may contain at most {max_items} items"
+        )
+
+    try:
+        provider = payment_service.get_provider("razorpay")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    errors = await asyncio.to_thread(razorpay_checkout.check_signatures, provider, batch.items)
+    verified = [item for item, error in zip(batch.items, errors) if error is None]
+    changes = iter(await razorpay_checkout.record_verified(payment_service.db_session, verified))
+
+    results: List[Dict[str, Any]] = []
+    for index, error in enumerate(errors):
+        if error is not None:
+            results.append({"index": index, "verified": False, "error": error})
+            continue
+        result: Dict[str, Any] = {"index": index, "verified": True}
+        change = next(changes)
+        if "subscription" in change:
+            subscription = change["subscription"]
+            await payment_service.event_publisher.publish_event(
+                PaymentEvents.SUBSCRIPTION_UPDATED,
+                {"subscription_id": subscription["id"], "status": subscription["status"]},
+            )
+            result["subscription"] = _verified_subscription_payload(subscription)
+        elif "payment" in change:
+            payment = change["payment"]
+            await payment_service.event_publisher.publish_event(
+                PaymentEvents.PAYMENT_SUCCEEDED,
+                {"payment_id": payment["id"], "status": "completed"},
+            )
+            result["payment"] = _payment_payload(payment)
+        results.append(result)
+    return {"verified": len(verified), "failed": len(errors) - len(verified), "results": results}
+
+
 # PayU SI-specific routes
 from schemas import SITransactionRequest, PreDebitNotifyRequest
 
@@ -817,25 +1472,33 @@ from schemas import SITransactionRequest, PreDebitNotifyRequest
 @app.post("/payu/si-transaction")
 async def payu_si_transaction(
     request: SITransactionRequest,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: Dict[str, Any] = Depends(get_current_user),
     payment_service: PaymentService = Depends(get_payment_service_with_db),
 ):
-    """Execute a PayU SI (Standing Instruction) recurring payment transaction."""
-    try:
-        provider = payment_service.get_provider("payu")
-        if not hasattr(provider, "si_transaction"):
-            raise HTTPException(status_code=400, detail="SI transactions not supported by provider")
-        
-        result = await provider.si_transaction(
-            mandate_token=request.mandate_token,
-            amount=request.amount,
-            txnid=request.txnid,
-        )
-        return result
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+    """Execute a PayU SI (Standing Instruction) recurring payment transaction.
+
+    Honours ``Idempotency-Key`` like ``POST /payments``.
+    """
+    async def debit() -> Any:
+        try:
+            provider = payment_service.get_provider("payu")
+            if not hasattr(provider, "si_transaction"):
+                raise HTTPException(status_code=400, detail="SI transactions not supported by provider")
+
+            return await provider.si_transaction(
+                mandate_token=request.mandate_token,
+                amount=request.amount,
+                txnid=request.txnid,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=str(exc))
+
+    return await idempotency_store.run(
+        idempotency_key, "POST /payu/si-transaction", request.dict(), debit
+    )
 
 
 @app.post("/payu/pre-debit-notify")
@@ -862,6 +1525,165 @@ async def payu_pre_debit_notify(
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/payu/billing-runs", response_model=BillingRunResponse, status_code=202)
+async def create_billing_run(
+    request: BillingRunCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service),
+):
+    """Start a billing run for every PayU SI mandate due on ``debit_date``.
+
+    Pre-debit notifications are sent in the background; follow progress with
+    ``GET /payu/billing-runs/{run_id}``. There is one run per debit date:
+    posting the same date again returns it, resuming it if it was interrupted.
+    Debits from earlier runs whose outcome is unknown are verified with PayU
+    first, so their periods are not billed twice.
+    """
+    try:
+        provider = payment_service.get_provider(billing_run.PROVIDER)
+        await billing_runner.resolve_unknown(provider)
+        run_id, _created = await billing_runner.create_run(request.debit_date)
+        run = await billing_runner.get_run(run_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    if run["status"] in billing_run.ACTIVE_STATUSES:
+        billing_runner.start(run_id, provider)
+    return run
+
+
+@app.post("/payu/billing-runs/{run_id}/charge", response_model=BillingRunResponse, status_code=202)
+async def charge_billing_run(
+    run_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service),
+):
+    """Debit every notified mandate of a run once the notice period has passed."""
+    if await billing_runner.get_run(run_id) is None:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    try:
+        provider = payment_service.get_provider(billing_run.PROVIDER)
+        await billing_runner.start_charging(run_id, provider)
+        return await billing_runner.get_run(run_id)
+    except billing_run.RunStateError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/payu/billing-runs/{run_id}", response_model=BillingRunResponse)
+async def get_billing_run(
+    run_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Get a billing run's status and its item counts per state."""
+    run = await billing_runner.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    return run
+
+
+@app.get("/payu/billing-runs/{run_id}/items", response_model=List[BillingRunItemResponse])
+async def list_billing_run_items(
+    run_id: str,
+    response: Response,
+    state: Optional[str] = Query(None, description="pending, notified, charged or failed"),
+    after: int = Query(0, ge=0, description="Item ID from the X-Next-Cursor header"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """List per-mandate results of a billing run in item order."""
+    if await billing_runner.get_run(run_id) is None:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    items = await billing_runner.list_items(run_id, state=state, after=after, limit=limit)
+    if len(items) == limit:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = str(items[-1]["id"])
+    return items
+
+
+# Provider webhooks --------------------------------------------------------
+
+
+@app.post("/api/webhooks/{provider}", response_model=Dict[str, Any])
+@app.post("/webhooks/{provider}", response_model=Dict[str, Any])
+async def receive_webhook(
+    provider: str,
+    request: Request,
+    payment_service: PaymentService = Depends(get_payment_service),
+):
+    """Verify a provider webhook, queue it and acknowledge it right away.
+
+    Processing happens in the background (see ``webhook_queue``). A
+    redelivered event is acknowledged again but not processed twice.
+    """
+    if provider not in payment_service.providers:
+        raise HTTPException(status_code=404, detail=f"Payment provider '{provider}' not found")
+    body = await request.body()
+    text = body.decode()
+    try:
+        payload = json.loads(text) if text else {}
+    except json.JSONDecodeError:
+        payload = dict(parse_qsl(text))
+    signature = request.headers.get(
+        webhook_queue.SIGNATURE_HEADERS.get(provider, "signature")
+    ) or request.headers.get("signature")
+    try:
+        verified = await payment_service.get_provider(provider).webhook_handler(
+            text if provider in webhook_queue.RAW_BODY_PROVIDERS else payload, signature
+        )
+    except Exception as exc:
+        logger.warning("Rejected %s webhook: %s", provider, exc)
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    event_id = webhook_queue.event_id(provider, payload, request.headers, body)
+    created = await webhooks.enqueue(provider, event_id, verified)
+    return {"status": "accepted", "event_id": event_id, "duplicate": not created}
+
+
+async def process_webhook(event: Dict[str, Any]) -> None:
+    """Publish a queued webhook as ``webhook.{provider}.{event type}``, as the
+    library's inline handler did.
+
+    The event also carries the local ``subscription_id``/``payment_id`` it
+    is about, so the SSE streams watching those rows receive it.
+    """
+    payment_service = await get_payment_service()
+    event_type = event["standardized_event_type"]
+    async with payment_db._sessionmaker() as session:
+        local_ids = await webhook_queue.local_entity_ids(session, event["provider"], event["data"])
+    await payment_service.event_publisher.publish_event(
+        f"webhook.{event['provider']}.{event_type}",
+        {"provider": event["provider"], "event_type": event_type, "data": event["data"], **local_ids},
+    )
+
+
+# Mount the library's generic routes last, minus any path/method the example
+# defines above: those would never be reached and would replace the example's
+# entries in the OpenAPI schema.
+_example_endpoints = {
+    (route.path, method)
+    for route in app.routes
+    if isinstance(route, APIRoute)
+    for method in route.methods
+}
+_library_router = APIRouter()
+_library_router.routes = [
+    route
+    for route in payment_routes.router.routes
+    if not (
+        isinstance(route, APIRoute)
+        and any((route.path, method) in _example_endpoints for method in route.methods)
+    )
+]
+app.include_router(
+    _library_router,
+    tags=["payments"]
+)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""Latency histograms exposed in the Prometheus text format.
+
+Four histograms split a request's time so a slow checkout can be pinned on
+our code, the database or the provider:
+
+- ``http_request_duration_seconds``: whole request, per route template.
+- ``payment_service_duration_seconds``: each PaymentService method call.
+- ``payment_provider_duration_seconds``: each provider SDK/HTTP call.
+- ``db_query_duration_seconds``: each SQL statement.
+
+``catalog_cache_lookups_total`` counts product and plan cache hits and
+misses next to them, and the ``provider_http_*`` gauges show the state of
+the outbound connection pools when scraped.
+
+Observations are plain list increments on the event loop, with no locks
+and no background thread, so recording costs a ``bisect`` and two
+additions. Each worker process keeps its own registry and serves it at
+``/metrics``.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = self.buckets + (float("inf"),)
+        for labels, series in list(self._series.items()):
+            base = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)
+            )
+            prefix = base + "," if base else ""
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield f'{self.name}_bucket{{{prefix}le="{_format_bound(bound)}"}} {cumulative}'
+            suffix = f"{{{base}}}" if base else ""
+            yield f"{self.name}_sum{suffix} {series[-1]}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in list(self._values.items()):
+            base = ",".join(
+                f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, labels)
+            )
+            suffix = f"{{{base}}}" if base else ""
+            yield f"{self.name}{suffix} {value}"
+
+
+class Gauge:
+    """Gauge whose values are read from ``collect`` at scrape time.
+
+    ``collect`` returns ``(label values, value)`` pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.collect():
+            base = ",".join(
+                f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, labels)
+            )
+            suffix = f"{{{base}}}" if base else ""
+            yield f"{self.name}{suffix} {value}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.collectors: List[Any] = []
+
+    def histogram(self, *args: Any, **kwargs: Any) -> Histogram:
+        histogram = Histogram(*args, **kwargs)
+        self.collectors.append(histogram)
+        return histogram
+
+    def counter(self, *args: Any, **kwargs: Any) -> Counter:
+        counter = Counter(*args, **kwargs)
+        self.collectors.append(counter)
+        return counter
+
+    def gauge(self, *args: Any, **kwargs: Any) -> Gauge:
+        gauge = Gauge(*args, **kwargs)
+        self.collectors.append(gauge)
+        return gauge
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for collector in self.collectors:
+            lines.extend(collector.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+REGISTRY = Registry()
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+SERVICE_LATENCY = REGISTRY.histogram(
+    "payment_service_duration_seconds",
+    "Time spent in PaymentService methods, including provider and DB time.",
+    ("method",),
+)
+PROVIDER_LATENCY = REGISTRY.histogram(
+    "payment_provider_duration_seconds",
+    "Time spent in payment provider calls.",
+    ("provider", "method", "outcome"),
+)
+DB_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements.",
+    ("statement",),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "catalog_cache_lookups_total",
+    "Product and plan cache lookups by result (hit or miss).",
+    ("kind", "result"),
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording ``HTTP_LATENCY`` per matched route template."""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):  # type: ignore[no-untyped-def]
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):  # type: ignore[no-untyped-def]
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+            )
+
+
+def _timed(func: Callable, histogram: Histogram, labels: Tuple[str, ...]) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, *labels)
+
+    return wrapper
+
+
+def instrument_service(service_class: type) -> None:
+    """Time every public coroutine method of ``service_class``."""
+    for name, member in list(vars(service_class).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(member):
+            continue
+        if getattr(member, "__wrapped__", None) is not None:
+            continue
+        setattr(service_class, name, _timed(member, SERVICE_LATENCY, (name,)))
+
+
+class TimedProvider:
+    """Proxy that times a provider's coroutine methods.
+
+    Attribute access is delegated, so ``hasattr`` checks and synchronous
+    helpers such as ``verify_payment_signature`` behave as before.
+    """
+
+    def __init__(self, provider: Any, name: str):
+        self._provider = provider
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._provider, attr)
+        if attr.startswith("_") or not inspect.iscoroutinefunction(value):
+            return value
+        provider_name = self._name
+
+        @functools.wraps(value)
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await value(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                PROVIDER_LATENCY.observe(
+                    time.perf_counter() - started, provider_name, attr, outcome
+                )
+
+        return call
+
+
+def instrument_providers(service_class: type) -> None:
+    """Make ``service_class.get_provider`` hand out ``TimedProvider`` proxies."""
+    original = service_class.get_provider
+    if getattr(original, "__wrapped__", None) is not None:
+        return
+
+    @functools.wraps(original)
+    def get_provider(self, provider_name=None):  # type: ignore[no-untyped-def]
+        provider = original(self, provider_name)
+        return TimedProvider(provider, provider_name or self.default_provider)
+
+    service_class.get_provider = get_provider
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Record ``DB_LATENCY`` for every statement ``engine`` executes."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        started = conn.info["query_started"].pop()
+        DB_LATENCY.observe(time.perf_counter() - started, _statement_kind(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):  # type: ignore[no-untyped-def]
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def instrument_http_clients(clients: Any) -> None:
+    """Export the connection pools of ``clients`` (``ProviderHTTPClients``) as gauges."""
+
+    def connections() -> Iterable[Tuple[Tuple[str, ...], float]]:
+        for provider, stats in clients.pool_stats().items():
+            yield (provider, "active"), stats["active"]
+            yield (provider, "idle"), stats["idle"]
+
+    def waiting() -> Iterable[Tuple[Tuple[str, ...], float]]:
+        for provider, stats in clients.pool_stats().items():
+            yield (provider,), stats["waiting"]
+
+    REGISTRY.gauge(
+        "provider_http_connections",
+        "Open connections to payment provider APIs, in use (active) or kept alive (idle).",
+        ("provider", "state"),
+        collect=connections,
+    )
+    REGISTRY.gauge(
+        "provider_http_requests_waiting",
+        "Provider API requests waiting for a free connection.",
+        ("provider",),
+        collect=waiting,
+    )
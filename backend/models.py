@@ -0,0 +1,274 @@
+"""Database additions owned by the example backend.
+
+Tables and indexes declared here are attached to the fastapi-payments
+``Base.metadata`` so the library's lazy ``create_all`` picks them up for new
+databases. ``ensure_schema`` covers databases created before they existed.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    JSON,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+    event,
+    inspect,
+    text,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from fastapi_payments.db.models import (
+    Base,
+    Customer,
+    Invoice,
+    Payment,
+    PaymentMethod,
+    Plan,
+    Product,
+    ProviderCustomer,
+    Subscription,
+    SyncJob,
+    generate_uuid,
+)
+
+from customer_search import create_search_index
+
+# Composite indexes backing keyset pagination. Every list route orders by
+# (created_at DESC, id DESC), optionally after an equality filter, so each
+# index lists the filter column first and the sort key after it.
+KEYSET_INDEXES = (
+    Index("ix_customers_created_at_id", Customer.created_at, Customer.id),
+    Index("ix_products_created_at_id", Product.created_at, Product.id),
+    Index(
+        "ix_plans_product_id_created_at_id",
+        Plan.product_id,
+        Plan.created_at,
+        Plan.id,
+    ),
+    Index("ix_payments_created_at_id", Payment.created_at, Payment.id),
+    Index(
+        "ix_payments_customer_id_created_at_id",
+        Payment.customer_id,
+        Payment.created_at,
+        Payment.id,
+    ),
+    Index(
+        "ix_payments_status_created_at_id",
+        Payment.status,
+        Payment.created_at,
+        Payment.id,
+    ),
+    Index("ix_subscriptions_created_at_id", Subscription.created_at, Subscription.id),
+    Index(
+        "ix_subscriptions_customer_id_created_at_id",
+        Subscription.customer_id,
+        Subscription.created_at,
+        Subscription.id,
+    ),
+    Index(
+        "ix_subscriptions_status_created_at_id",
+        Subscription.status,
+        Subscription.created_at,
+        Subscription.id,
+    ),
+)
+
+# Reconciliation streams a provider's payments in provider_payment_id order.
+RECONCILIATION_INDEX = Index(
+    "ix_payments_provider_provider_payment_id", Payment.provider, Payment.provider_payment_id
+)
+
+
+class IdempotencyRecord(Base):
+    """Outcome of a request sent with an Idempotency-Key header.
+
+    ``key`` is the route scope plus the client's key. The row is written as
+    ``in_progress`` when the first request claims the key, and the
+    serialized response is stored when it finishes. While it runs, the
+    claiming request (``locked_by``) keeps renewing ``locked_until``; a
+    claim whose lock has lapsed belongs to a request that died.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False, default="in_progress")
+    status_code = Column(Integer)
+    response_body = Column(LargeBinary)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    locked_by = Column(String(32))
+    locked_until = Column(DateTime)
+
+
+class BillingRun(Base):
+    """A PayU Standing Instruction billing run for one debit date.
+
+    ``status`` moves notifying -> notified -> charging -> completed. The
+    worker executing a phase holds a lease (``lease_owner`` until
+    ``lease_expires_at``), so an interrupted run is picked up again once its
+    lease lapses and never by two workers at once.
+    """
+
+    __tablename__ = "billing_runs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    debit_date = Column(Date, nullable=False, unique=True)
+    status = Column(String(16), nullable=False)
+    lease_owner = Column(String(64))
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False)
+    notified_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+
+class BillingRunItem(Base):
+    """One mandate debited by a billing run.
+
+    ``state`` moves pending -> notified -> charged, or to failed with
+    ``error`` set. A debit PayU may or may not have taken is ``unknown``
+    until it is verified. ``txnid`` is fixed when the item is created, so a
+    charge retried after a crash reuses it. The item bills the subscription period
+    ending at ``period_end``; a successful charge moves the subscription on
+    to the period ending at ``next_period_end``.
+    """
+
+    __tablename__ = "billing_run_items"
+    __table_args__ = (
+        UniqueConstraint("run_id", "subscription_id"),
+        Index("ix_billing_run_items_run_id_state_id", "run_id", "state", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, ForeignKey("billing_runs.id"), nullable=False)
+    subscription_id = Column(String, nullable=False)
+    customer_id = Column(String, nullable=False)
+    mandate_token = Column(String, nullable=False)
+    amount = Column(Float, nullable=False)
+    currency = Column(String(3), nullable=False)
+    txnid = Column(String(25), nullable=False, unique=True)
+    state = Column(String(16), nullable=False, default="pending")
+    error = Column(String)
+    payment_id = Column(String)
+    notified_at = Column(DateTime)
+    charged_at = Column(DateTime)
+    period_end = Column(DateTime)
+    next_period_end = Column(DateTime)
+
+
+class WebhookEvent(Base):
+    """A verified provider webhook, queued for processing.
+
+    ``(provider, event_id)`` is unique, so a redelivered webhook is stored
+    once. ``state`` moves pending -> processing -> done. A failed attempt
+    puts the event back to pending until ``available_at`` and, once
+    ``attempts`` run out, to failed with ``error`` set. Events with the same
+    ``entity_key`` are processed one at a time, in ``id`` order.
+    """
+
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        UniqueConstraint("provider", "event_id"),
+        Index("ix_webhook_events_state_id", "state", "id"),
+        Index("ix_webhook_events_entity_key_id", "entity_key", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String(32), nullable=False)
+    event_id = Column(String(255), nullable=False)
+    entity_key = Column(String(255), nullable=False)
+    event_type = Column(String(100))
+    standardized_event_type = Column(String(100))
+    data = Column(JSON)
+    state = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String)
+    available_at = Column(DateTime, nullable=False)
+    lease_owner = Column(String(64))
+    lease_expires_at = Column(DateTime)
+    received_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime)
+
+
+# Columns added to the backend's own tables after they first shipped;
+# create_all does not alter existing tables.
+ADDED_COLUMNS = (
+    BillingRunItem.period_end,
+    BillingRunItem.next_period_end,
+    IdempotencyRecord.locked_by,
+    IdempotencyRecord.locked_until,
+)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# The library declares ``onupdate=datetime.now(...)``, which is evaluated once
+# at import, so updated_at never moves. Row versions (ETags) depend on it, so
+# stamp it on every ORM update instead. Core UPDATE statements must set
+# updated_at themselves.
+def _touch_updated_at(mapper, connection, target) -> None:  # type: ignore[no-untyped-def]
+    target.updated_at = utcnow()
+
+
+for _model in (Customer, Payment, Plan, Product, Subscription):
+    event.listen(_model, "before_update", _touch_updated_at)
+
+
+# Likewise ``default=datetime.now(...)``: every row a process inserts would get
+# the process's start time, and keyset pagination, exports and reconciliation
+# all order or filter on created_at. Stamp rows that were not given one.
+def _stamp_created_at(mapper, connection, target) -> None:  # type: ignore[no-untyped-def]
+    now = utcnow()
+    if target.created_at is None:
+        target.created_at = now
+    if target.updated_at is None:
+        target.updated_at = now
+
+
+for _model in (Customer, Invoice, Payment, PaymentMethod, Plan, Product, Subscription, SyncJob):
+    event.listen(_model, "before_insert", _stamp_created_at)
+
+
+@event.listens_for(ProviderCustomer, "after_insert")
+def _touch_customer_on_link(mapper, connection, target) -> None:  # type: ignore[no-untyped-def]
+    # Provider links are part of the customer payload, so a new link is a new
+    # customer version.
+    connection.execute(
+        update(Customer.__table__)
+        .where(Customer.__table__.c.id == target.customer_id)
+        .values(updated_at=utcnow())
+    )
+
+
+def _create_all(connection) -> None:  # type: ignore[no-untyped-def]
+    Base.metadata.create_all(connection)
+    # create_all only emits indexes together with a new table, so add any
+    # that are missing from tables that already existed.
+    for index in (*KEYSET_INDEXES, RECONCILIATION_INDEX):
+        index.create(connection, checkfirst=True)
+    inspector = inspect(connection)
+    for column in ADDED_COLUMNS:
+        table = column.table
+        if column.name not in {c["name"] for c in inspector.get_columns(table.name)}:
+            column_type = column.type.compile(connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    create_search_index(connection)
+
+
+async def ensure_schema(engine: AsyncEngine) -> None:
+    """Create missing tables and indexes used by the example backend."""
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_all)
@@ -0,0 +1,266 @@
+"""Keyset (cursor) pagination for the list endpoints.
+
+``limit``/``offset`` paging makes the database walk and discard every skipped
+row, so deep pages get slower as the tables grow. The helpers here page on
+the ``(created_at, id)`` sort key instead: each page continues strictly after
+the last row of the previous one and is served from the composite indexes in
+``models.KEYSET_INDEXES`` no matter how deep it is.
+
+Cursors are opaque to clients: a URL-safe base64 encoding of the last row's
+sort key.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import Select
+
+from fastapi_payments.db.models import Customer, Payment, Plan, Product, Subscription
+from fastapi_payments.db.repositories.payment_repository import _normalize_status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple):
+    """A page of service-shaped dicts plus the cursor for the next page."""
+
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode a row's sort key as an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except Exception as exc:  # noqa: BLE001 - any decoding failure is a bad cursor
+        raise ValueError("Invalid cursor") from exc
+
+
+async def _fetch_page(
+    session: AsyncSession,
+    stmt: Select,
+    model: Any,
+    *,
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[Any], Optional[str]]:
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < (created_at, row_id))
+
+    # Fetch one extra row to learn whether another page exists without a COUNT.
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    result = await session.execute(stmt)
+    rows = list(result.scalars().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+# Row conversion ---------------------------------------------------------------
+#
+# These mirror the dicts PaymentService.list_* builds so the route payload
+# helpers in main.py work unchanged on either pagination path.
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def customer_to_dict(customer: Customer, default_provider: str) -> Dict[str, Any]:
+    default_link = next(
+        (pc for pc in customer.provider_customers if pc.provider == default_provider),
+        None,
+    )
+    return {
+        "id": customer.id,
+        "email": customer.email,
+        "name": customer.name,
+        "meta_info": customer.meta_info,
+        "address": customer.address,
+        "created_at": _isoformat(customer.created_at),
+        "updated_at": _isoformat(customer.updated_at),
+        "provider_customer_id": (
+            default_link.provider_customer_id if default_link else None
+        ),
+        "provider_customers": [
+            {"provider": pc.provider, "provider_customer_id": pc.provider_customer_id}
+            for pc in customer.provider_customers
+        ],
+    }
+
+
+def product_to_dict(product: Product, default_provider: str) -> Dict[str, Any]:
+    meta_info = product.meta_info or {}
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "active": product.active,
+        "provider_product_id": meta_info.get("provider_product_id", ""),
+        "provider": meta_info.get("provider", default_provider),
+        "created_at": _isoformat(product.created_at),
+        "meta_info": meta_info or None,
+    }
+
+
+def plan_to_dict(plan: Plan, default_provider: str) -> Dict[str, Any]:
+    meta_info = plan.meta_info or {}
+    return {
+        "id": plan.id,
+        "product_id": plan.product_id,
+        "name": plan.name,
+        "description": plan.description,
+        "pricing_model": getattr(plan.pricing_model, "value", plan.pricing_model),
+        "amount": plan.amount,
+        "currency": plan.currency,
+        "billing_interval": plan.billing_interval,
+        "billing_interval_count": plan.billing_interval_count,
+        "trial_period_days": plan.trial_period_days,
+        "provider": meta_info.get("provider", default_provider),
+        "provider_price_id": meta_info.get("provider_price_id", ""),
+        "created_at": _isoformat(plan.created_at),
+        "meta_info": meta_info or None,
+    }
+
+
+def subscription_to_dict(subscription: Subscription) -> Dict[str, Any]:
+    provider_data = None
+    if subscription.meta_info:
+        provider_data = subscription.meta_info.get("provider_data")
+    return {
+        "id": subscription.id,
+        "customer_id": subscription.customer_id,
+        "plan_id": subscription.plan_id,
+        "provider": subscription.provider,
+        "provider_subscription_id": subscription.provider_subscription_id,
+        "status": subscription.status,
+        "quantity": subscription.quantity,
+        "current_period_start": _isoformat(subscription.current_period_start),
+        "current_period_end": _isoformat(subscription.current_period_end),
+        "cancel_at_period_end": subscription.cancel_at_period_end,
+        "created_at": _isoformat(subscription.created_at),
+        "provider_data": provider_data,
+    }
+
+
+def payment_to_dict(payment: Payment) -> Dict[str, Any]:
+    return {
+        "id": payment.id,
+        "customer_id": payment.customer_id,
+        "amount": payment.amount,
+        "refunded_amount": payment.refunded_amount,
+        "currency": payment.currency,
+        "status": getattr(payment.status, "value", payment.status),
+        "payment_method": payment.payment_method,
+        "error_message": payment.error_message,
+        "provider": payment.provider,
+        "provider_payment_id": payment.provider_payment_id,
+        "created_at": _isoformat(payment.created_at),
+        "meta_info": payment.meta_info,
+    }
+
+
+# Keyset queries ---------------------------------------------------------------
+
+
+async def list_customers(
+    session: AsyncSession,
+    *,
+    default_provider: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Page:
+    # selectinload keeps LIMIT applying to customers rather than to the
+    # customer x provider_customers join rows.
+    stmt = select(Customer).options(selectinload(Customer.provider_customers))
+    rows, next_cursor = await _fetch_page(
+        session, stmt, Customer, limit=limit, cursor=cursor
+    )
+    return Page([customer_to_dict(row, default_provider) for row in rows], next_cursor)
+
+
+async def list_products(
+    session: AsyncSession,
+    *,
+    default_provider: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Page:
+    rows, next_cursor = await _fetch_page(
+        session, select(Product), Product, limit=limit, cursor=cursor
+    )
+    return Page([product_to_dict(row, default_provider) for row in rows], next_cursor)
+
+
+async def list_plans(
+    session: AsyncSession,
+    *,
+    default_provider: str,
+    product_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Page:
+    stmt = select(Plan).where(Plan.product_id == product_id)
+    rows, next_cursor = await _fetch_page(session, stmt, Plan, limit=limit, cursor=cursor)
+    return Page([plan_to_dict(row, default_provider) for row in rows], next_cursor)
+
+
+async def list_subscriptions(
+    session: AsyncSession,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Page:
+    stmt = select(Subscription)
+    if customer_id:
+        stmt = stmt.where(Subscription.customer_id == customer_id)
+    if status:
+        stmt = stmt.where(Subscription.status == status)
+    rows, next_cursor = await _fetch_page(
+        session, stmt, Subscription, limit=limit, cursor=cursor
+    )
+    return Page([subscription_to_dict(row) for row in rows], next_cursor)
+
+
+async def list_payments(
+    session: AsyncSession,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Page:
+    stmt = select(Payment)
+    if customer_id:
+        stmt = stmt.where(Payment.customer_id == customer_id)
+    if status:
+        stmt = stmt.where(Payment.status == _normalize_status(status))
+    rows, next_cursor = await _fetch_page(
+        session, stmt, Payment, limit=limit, cursor=cursor
+    )
+    return Page([payment_to_dict(row) for row in rows], next_cursor)
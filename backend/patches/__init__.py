@@ -1,2 +1,7 @@
 """Patch helpers for the example backend."""
-from .messaging import ensure_memory_broker_support  # noqa: F401
+from .messaging import add_event_listener  # noqa: F401
+from .database import configure_database_engine  # noqa: F401
+from .catalog import PLAN_PAGE, install_catalog_cache  # noqa: F401
+from .providers import enable_lazy_providers  # noqa: F401
+from .payu import add_transaction_verification, use_shared_http_client  # noqa: F401
+from .razorpay import offload_blocking_sdk_calls  # noqa: F401
@@ -0,0 +1,79 @@
+"""Read-through caching for the library's product and plan repositories.
+
+Rows read on a read replica are not cached, and requests that asked for the
+primary skip the cache (see ``read_replica``).
+"""
+from __future__ import annotations
+
+import functools
+from typing import Any, Callable, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from fastapi_payments.db.repositories.plan_repository import PlanRepository
+from fastapi_payments.db.repositories.product_repository import ProductRepository
+
+import metrics
+import read_replica
+from catalog_cache import TTLCache
+
+PLAN_PAGE = "plan_page"
+
+
+def _detached_copy(row: Any) -> Any:
+    """Column-only copy of ``row`` that can be merged into any session."""
+    mapper = inspect(row).mapper
+    copy = mapper.class_()
+    for attr in mapper.column_attrs:
+        setattr(copy, attr.key, getattr(row, attr.key))
+    make_transient_to_detached(copy)
+    return copy
+
+
+def invalidate_plan_pages(cache: TTLCache, product_id: Optional[str]) -> None:
+    cache.invalidate_where(lambda key: key[0] == PLAN_PAGE and key[1] == product_id)
+
+
+def _read_through(original: Callable, cache: TTLCache, kind: str) -> Callable:
+    @functools.wraps(original)
+    async def get_by_id(self, row_id: str):  # type: ignore[no-untyped-def]
+        cached = None if read_replica.requires_primary(self.session) else cache.get((kind, row_id))
+        if cached is not None:
+            metrics.CACHE_LOOKUPS.inc(kind, "hit")
+            # A persistent instance in this session, built without a query.
+            return await self.session.merge(cached, load=False)
+        metrics.CACHE_LOOKUPS.inc(kind, "miss")
+        row = await original(self, row_id)
+        if row is not None and not read_replica.is_replica(self.session):
+            cache.set((kind, row_id), _detached_copy(row))
+        return row
+
+    return get_by_id
+
+
+def _invalidating(original: Callable, cache: TTLCache, kind: str) -> Callable:
+    @functools.wraps(original)
+    async def write(self, *args: Any, **kwargs: Any):  # type: ignore[no-untyped-def]
+        row = await original(self, *args, **kwargs)
+        if row is not None:
+            cache.invalidate((kind, row.id))
+            if kind == "plan":
+                invalidate_plan_pages(cache, row.product_id)
+        return row
+
+    return write
+
+
+def install_catalog_cache(cache: TTLCache) -> None:
+    """Serve ``get_by_id`` for products and plans from ``cache``.
+
+    ``create`` and ``update`` drop the entries they make stale, including
+    the cached plan pages of the plan's product.
+    """
+    for repository, kind in ((ProductRepository, "product"), (PlanRepository, "plan")):
+        if getattr(repository.get_by_id, "__wrapped__", None) is not None:
+            continue
+        repository.get_by_id = _read_through(repository.get_by_id, cache, kind)
+        repository.create = _invalidating(repository.create, cache, kind)
+        repository.update = _invalidating(repository.update, cache, kind)
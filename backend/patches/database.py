@@ -0,0 +1,94 @@
+"""Database engine tuning for the example backend.
+
+``fastapi_payments.db.repositories.initialize_db`` only honours ``url`` and
+``echo`` for SQLite and ``pool_size``/``max_overflow`` elsewhere, and
+``DatabaseConfig`` drops any other keys. ``configure_database_engine``
+rebuilds the library's engine from the full ``database`` settings produced
+by ``config.get_payment_config``, and applies SQLite pragmas to every new
+connection so concurrent webhook and checkout writes wait for the lock
+instead of failing with "database is locked".
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_payments.db import repositories as payment_db
+
+logger = logging.getLogger("fastapi_payments_example.patches")
+
+_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_recycle", "pool_pre_ping")
+
+
+def _is_memory_sqlite(url) -> bool:  # type: ignore[no-untyped-def]
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _sqlite_pragma_listener(pragmas: Mapping[str, Any]):  # type: ignore[no-untyped-def]
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items() if value is not None]
+
+    def _apply(dbapi_connection, connection_record) -> None:  # type: ignore[no-untyped-def]
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return _apply
+
+
+def create_tuned_engine(settings: Mapping[str, Any]) -> AsyncEngine:
+    """Create an async engine from the ``database`` settings mapping."""
+    url = make_url(settings["url"])
+    kwargs: Dict[str, Any] = {"echo": settings.get("echo", False)}
+    connect_args: Dict[str, Any] = {}
+
+    statement_cache_size = settings.get("statement_cache_size")
+    if statement_cache_size is not None:
+        # SQLAlchemy's compiled-statement cache, plus the driver's own
+        # prepared-statement cache where the driver has one.
+        kwargs["query_cache_size"] = statement_cache_size
+        if url.get_backend_name() == "sqlite":
+            connect_args["cached_statements"] = statement_cache_size
+        elif url.get_driver_name() == "asyncpg":
+            connect_args["prepared_statement_cache_size"] = statement_cache_size
+
+    # In-memory SQLite runs on a single static connection; pool options
+    # do not apply to it.
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            (name, settings[name]) for name in _POOL_OPTIONS if settings.get(name) is not None
+        )
+
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    engine = create_async_engine(url, **kwargs)
+
+    if url.get_backend_name() == "sqlite" and settings.get("sqlite_pragmas"):
+        event.listen(
+            engine.sync_engine, "connect", _sqlite_pragma_listener(settings["sqlite_pragmas"])
+        )
+    return engine
+
+
+def configure_database_engine(settings: Mapping[str, Any]) -> AsyncEngine:
+    """Replace the library's engine and sessionmaker with a tuned engine.
+
+    Call it right after ``FastAPIPayments(...)`` and before the first request.
+    """
+    previous = payment_db._engine
+    engine = create_tuned_engine(settings)
+    payment_db._engine = engine
+    payment_db._sessionmaker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    if previous is not None:
+        # The library's engine has not connected yet, so this only drops
+        # its empty pool.
+        previous.sync_engine.dispose(close=False)
+    logger.info("Configured database engine for %s", engine.url.render_as_string(hide_password=True))
+    return engine
@@ -2,33 +2,37 @@
 from __future__ import annotations
 
 import logging
-from typing import Callable
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
 
 from fastapi_payments.messaging import publishers as payment_publishers
 
 logger = logging.getLogger("fastapi_payments_example.patches")
 
-_patch_applied: bool = False
-
-
-def ensure_memory_broker_support() -> None:
-    """Force PaymentEventPublisher to honor the in-memory broker setting."""
-    global _patch_applied
-    if _patch_applied:
-        return
-
-    original_initialize: Callable = (
-        payment_publishers.PaymentEventPublisher._initialize_broker  # type: ignore[attr-defined]
-    )
-
-    def _patched_initialize(self):  # type: ignore[no-untyped-def]
-        broker_type = str(getattr(self.config, "broker_type", "redis")).lower()
-        if broker_type == "memory":
-            logger.info(
-                "Patched PaymentEventPublisher to use the in-memory broker as requested."
-            )
-            return payment_publishers.InMemoryBroker()
-        return original_initialize(self)
-
-    payment_publishers.PaymentEventPublisher._initialize_broker = _patched_initialize  # type: ignore[assignment]
-    _patch_applied = True
+_event_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_event_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """Call ``listener`` with every message PaymentEventPublisher publishes.
+
+    Listeners run in-process right after the broker accepted the message,
+    whatever the broker type, and must not block.
+    """
+    if not _event_listeners:
+        original_publish: Callable = payment_publishers.PaymentEventPublisher.publish_event
+
+        async def _publish_and_notify(self, event_type, data, routing_key=None):  # type: ignore[no-untyped-def]
+            await original_publish(self, event_type, data, routing_key)
+            message = {
+                "event_type": str(getattr(event_type, "value", event_type)),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "data": data,
+            }
+            for notify in _event_listeners:
+                try:
+                    notify(message)
+                except Exception:
+                    logger.exception("Event listener failed for %s", message["event_type"])
+
+        payment_publishers.PaymentEventPublisher.publish_event = _publish_and_notify  # type: ignore[assignment]
+    _event_listeners.append(listener)
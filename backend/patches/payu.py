@@ -0,0 +1,61 @@
+"""PayU postservice calls over a shared, pooled HTTP client.
+
+``PayUProvider._make_si_api_request`` opens and closes an
+``httpx.AsyncClient`` per call, so every SI debit, pre-debit notice and
+mandate change pays for a new connection and TLS handshake.
+``use_shared_http_client`` sends them through the worker's
+``ProviderHTTPClients`` instead.
+
+``add_transaction_verification`` gives the provider a ``verify_transaction``
+call, PayU's ``verify_payment`` command, which the library does not wrap.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+
+from fastapi_payments.providers.payu import PayUProvider
+
+from http_clients import ProviderHTTPClients
+
+_original_si_request: Optional[Callable[..., Any]] = None
+# PayU's status for a txnid it has no record of.
+NOT_FOUND = "not found"
+
+
+def use_shared_http_client(clients: ProviderHTTPClients) -> None:
+    """Make PayU SI API requests reuse ``clients.get("payu")``."""
+    global _original_si_request
+    if _original_si_request is not None:
+        return
+    _original_si_request = PayUProvider._make_si_api_request
+
+    async def _make_si_api_request(self, command: str, params: Dict[str, Any]) -> Dict[str, Any]:  # type: ignore[no-untyped-def]
+        payload = {"key": self.merchant_key, "command": command, **params}
+        payload["hash"] = self._sign_si_request(command, params.get("var1", ""), params.get("var2"))
+        response = await clients.get("payu").post(self.si_transaction_url, data=payload)
+        response.raise_for_status()
+        return response.json()
+
+    PayUProvider._make_si_api_request = _make_si_api_request
+
+
+def add_transaction_verification() -> None:
+    """Add ``PayUProvider.verify_transaction(txnid)``.
+
+    It returns ``{"txnid", "status", "provider_payment_id"}`` with PayU's
+    status lowercased: "success", "failure", "pending", ``NOT_FOUND``, ...
+    """
+    if hasattr(PayUProvider, "verify_transaction"):
+        return
+
+    async def verify_transaction(self, txnid: str) -> Dict[str, Any]:  # type: ignore[no-untyped-def]
+        response = await self._make_si_api_request("verify_payment", {"var1": txnid})
+        details = (response.get("transaction_details") or {}).get(txnid) or {}
+        status = str(details.get("status") or NOT_FOUND).lower()
+        return {
+            "txnid": txnid,
+            "status": status,
+            "provider_payment_id": details.get("mihpayid") if status != NOT_FOUND else None,
+        }
+
+    PayUProvider.verify_transaction = verify_transaction
@@ -0,0 +1,80 @@
+"""Deferred construction of payment providers.
+
+``PaymentService.__init__`` builds every configured provider, and each
+provider's ``initialize`` imports its SDK (stripe, razorpay, cashfree_pg)
+and sets up clients, so every worker pays for all of them before it can
+serve a request. ``enable_lazy_providers`` makes the service hold a
+``LazyProvider`` per name instead. The real provider is built on first
+attribute access, so a worker that only ever talks to Razorpay never
+imports Stripe.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from fastapi_payments.services import payment_service as payment_service_module
+
+logger = logging.getLogger("fastapi_payments_example.patches")
+
+_original_factory: Optional[Callable[[str, Any], Any]] = None
+
+
+class LazyProvider:
+    """Stand-in that builds its provider the first time it is used.
+
+    Configuration errors and missing SDKs surface on that first use
+    instead of at startup.
+    """
+
+    def __init__(self, name: str, config: Any, factory: Callable[[str, Any], Any]):
+        self._name = name
+        self._config = config
+        self._factory = factory
+        self._instance: Any = None
+        # Providers are also used from worker threads (customer_batch).
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def _load(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory(self._name, self._config)
+                    logger.info(
+                        "Loaded payment provider",
+                        extra={
+                            "provider": self._name,
+                            "load_ms": round((time.perf_counter() - started) * 1000, 1),
+                        },
+                    )
+        return self._instance
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyProvider {self._name} ({state})>"
+
+
+def enable_lazy_providers() -> None:
+    """Make PaymentService instances build their providers on first use.
+
+    Call before ``initialize_dependencies`` creates the service.
+    """
+    global _original_factory
+    if _original_factory is not None:
+        return
+    _original_factory = payment_service_module.get_provider
+
+    def lazy_factory(provider_name: str, provider_config: Any) -> LazyProvider:
+        return LazyProvider(provider_name, provider_config, _original_factory)
+
+    payment_service_module.get_provider = lazy_factory
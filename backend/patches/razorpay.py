@@ -0,0 +1,47 @@
+"""Razorpay SDK calls off the event loop.
+
+The Razorpay SDK client is synchronous, and ``RazorpayProvider`` calls it
+straight from its ``async`` methods, so every round-trip stalls the event
+loop and concurrent calls (``POST /customers/batch``) run one after another.
+``offload_blocking_sdk_calls`` makes the listed methods run on a worker
+thread. Their bodies never await anything, so the thread steps the
+coroutine to completion without an event loop of its own.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Any, Callable, Coroutine, Dict
+
+from fastapi_payments.providers.razorpay import RazorpayProvider
+
+# Provider methods whose only I/O is a synchronous SDK call.
+BLOCKING_METHODS = ("create_customer",)
+
+_originals: Dict[str, Callable[..., Any]] = {}
+
+
+def _run_to_completion(coro: Coroutine[Any, Any, Any]) -> Any:
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError(f"{coro.__qualname__} awaited a pending operation; it needs an event loop")
+
+
+def _offloaded(original: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(original)
+    async def offloaded(self, *args: Any, **kwargs: Any) -> Any:  # type: ignore[no-untyped-def]
+        return await asyncio.to_thread(_run_to_completion, original(self, *args, **kwargs))
+
+    return offloaded
+
+
+def offload_blocking_sdk_calls() -> None:
+    """Run ``BLOCKING_METHODS`` of ``RazorpayProvider`` on worker threads."""
+    if _originals:
+        return
+    for name in BLOCKING_METHODS:
+        _originals[name] = getattr(RazorpayProvider, name)
+        setattr(RazorpayProvider, name, _offloaded(_originals[name]))
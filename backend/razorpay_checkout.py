@@ -0,0 +1,180 @@
+"""Status changes confirmed by Razorpay Checkout.
+
+After a successful checkout the frontend posts Razorpay's signature to
+``POST /razorpay/verify-payment`` while the customer waits on the Checkout
+JS handler. The library's repositories would load the row, set the status,
+commit and load it again. The helpers here flip the status with a single
+``UPDATE ... RETURNING`` that also stamps ``updated_at`` and hands back the
+columns the response is built from, then commit.
+
+On SQLite the write lock is taken by the ``UPDATE`` and held until the
+commit. Writers that find it taken sleep in SQLite's busy handler, which
+backs off up to 100 ms per retry and lets late arrivals overtake, so under
+a burst of verifications some wait for seconds. Within a process the
+update and commit therefore run one at a time, in arrival order, behind an
+``asyncio.Lock``; other databases lock rows and need no such queue.
+
+The signature check itself is one HMAC-SHA256 over a few dozen bytes, a
+few microseconds. hashlib keeps the GIL for inputs that short, so handing
+it to a thread would add a hop (about 70 µs) without freeing the loop.
+``POST /razorpay/verify-payment/batch`` checks thousands at once, enough to
+hold the loop for milliseconds, so ``check_signatures`` runs the whole
+batch in one thread hop, and ``record_verified`` applies every resulting
+change with one ``UPDATE`` per table in a single transaction.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import weakref
+from typing import Any, AsyncContextManager, Collection, Dict, List, Optional, Sequence
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement, Update
+
+from fastapi_payments.db.models import Payment, PaymentStatus, Subscription
+
+from models import utcnow
+
+SUBSCRIPTION_COLUMNS = (
+    Subscription.id,
+    Subscription.customer_id,
+    Subscription.plan_id,
+    Subscription.status,
+    Subscription.quantity,
+    Subscription.current_period_start,
+    Subscription.current_period_end,
+    Subscription.cancel_at_period_end,
+    Subscription.created_at,
+    Subscription.meta_info,
+)
+PAYMENT_COLUMNS = (
+    Payment.id,
+    Payment.customer_id,
+    Payment.amount,
+    Payment.currency,
+    Payment.status,
+    Payment.payment_method,
+    Payment.created_at,
+    Payment.meta_info,
+)
+
+# asyncio locks belong to the loop they are first used on, so one per loop.
+_write_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _write_lock(session: AsyncSession) -> AsyncContextManager[Any]:
+    if session.bind.dialect.name != "sqlite":
+        return contextlib.nullcontext()
+    loop = asyncio.get_running_loop()
+    lock = _write_locks.get(loop)
+    if lock is None:
+        lock = _write_locks[loop] = asyncio.Lock()
+    return lock
+
+
+def _activate_subscriptions() -> Update:
+    return (
+        update(Subscription)
+        .values(status="active", updated_at=utcnow())
+        .returning(*SUBSCRIPTION_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _complete_payments() -> Update:
+    return (
+        update(Payment)
+        .values(status=PaymentStatus.COMPLETED, updated_at=utcnow())
+        .returning(*PAYMENT_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _commit_update(session: AsyncSession, stmt: Update) -> Optional[Dict[str, Any]]:
+    async with _write_lock(session):
+        row = (await session.execute(stmt)).first()
+        await session.commit()
+    return dict(row._mapping) if row else None
+
+
+async def activate_subscription(session: AsyncSession, subscription_id: str) -> Optional[Dict[str, Any]]:
+    """Mark the subscription active; returns its columns, or None if it does not exist."""
+    return await _commit_update(session, _activate_subscriptions().where(Subscription.id == subscription_id))
+
+
+async def complete_payment(session: AsyncSession, payment_id: str) -> Optional[Dict[str, Any]]:
+    """Mark the payment completed; returns its columns, or None if it does not exist."""
+    return await _commit_update(session, _complete_payments().where(Payment.id == payment_id))
+
+
+def check_signatures(provider: Any, items: Sequence[Any]) -> List[Optional[str]]:
+    """Check each item's Checkout signature; returns None or the error, per item.
+
+    Blocking; call it through ``asyncio.to_thread``. ``items`` carry the
+    fields of ``RazorpayVerifyPaymentRequest``.
+    """
+    errors: List[Optional[str]] = []
+    for item in items:
+        try:
+            provider.verify_payment_signature(
+                razorpay_payment_id=item.razorpay_payment_id,
+                razorpay_order_id=item.razorpay_order_id,
+                razorpay_subscription_id=item.razorpay_subscription_id,
+                razorpay_signature=item.razorpay_signature,
+            )
+        except ValueError as exc:
+            errors.append(str(exc))
+        else:
+            errors.append(None)
+    return errors
+
+
+async def _update_many(
+    session: AsyncSession, stmt: Update, key: ColumnElement, ids: Collection[str]
+) -> Dict[str, Dict[str, Any]]:
+    if not ids:
+        return {}
+    result = await session.execute(stmt.where(key.in_(ids)))
+    return {row.id: dict(row._mapping) for row in result}
+
+
+async def record_verified(session: AsyncSession, items: Sequence[Any]) -> List[Dict[str, Dict[str, Any]]]:
+    """Apply the status changes of verified items in one transaction.
+
+    As in the single endpoint, an item's subscription comes first and its
+    payment is completed only when no subscription of that id exists.
+    Returns, per item, ``{"subscription": columns}``, ``{"payment": columns}``
+    or ``{}`` when neither row exists.
+    """
+    async with _write_lock(session):
+        subscriptions = await _update_many(
+            session,
+            _activate_subscriptions(),
+            Subscription.id,
+            {item.subscription_id for item in items if item.subscription_id},
+        )
+        payments = await _update_many(
+            session,
+            _complete_payments(),
+            Payment.id,
+            {
+                item.payment_id
+                for item in items
+                if item.payment_id and item.subscription_id not in subscriptions
+            },
+        )
+        await session.commit()
+
+    results: List[Dict[str, Dict[str, Any]]] = []
+    for item in items:
+        if item.subscription_id in subscriptions:
+            results.append({"subscription": subscriptions[item.subscription_id]})
+        elif item.payment_id in payments:
+            results.append({"payment": payments[item.payment_id]})
+        else:
+            results.append({})
+    return results
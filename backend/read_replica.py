@@ -0,0 +1,116 @@
+"""Sessions on a read replica for list and detail routes.
+
+With ``DATABASE_REPLICA_URL`` set, routes that only read (``GET
+/payments``, ``/subscriptions``, ``/customers`` and their detail and
+export routes) query the replica, so long listings and exports stop
+competing with checkout writes for the primary's connections and locks.
+The replica engine is built with the same pool, statement-cache and
+SQLite settings as the primary.
+
+When the replica cannot be reached, the request reads the primary instead,
+and the replica is not tried again for ``replica_retry_after`` seconds, so
+an outage does not add a connect timeout to every request. Only the
+connection is covered: a query that fails once connected still fails the
+request.
+
+A replica trails the primary, so a page shown right after a write may not
+see it yet. Requests carrying ``X-Read-Primary: 1`` read the primary; the
+frontend sends it for a short while after a provider redirects the
+customer back to its success, failure or cancel page.
+
+The catalog cache must not undo either: ``is_replica`` sessions never fill
+it, since a lagging replica could cache a row or plan page older than a
+write that just invalidated it, and ``requires_primary`` sessions do not
+read from it.
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Mapping, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_payments.db import repositories as payment_db
+
+from patches.database import create_tuned_engine
+
+logger = logging.getLogger("fastapi_payments_example.read_replica")
+
+READ_PRIMARY_HEADER = "X-Read-Primary"
+# ``session.info`` key: "replica", or "primary" when the request asked for it.
+READ_FROM = "read_from"
+
+
+def wants_primary(value: Optional[str]) -> bool:
+    """Whether an ``X-Read-Primary`` header value asks for the primary."""
+    return (value or "").strip().lower() in ("1", "true", "yes")
+
+
+def is_replica(session: AsyncSession) -> bool:
+    return session.info.get(READ_FROM) == "replica"
+
+
+def requires_primary(session: AsyncSession) -> bool:
+    """Whether the session's request asked to see the primary's current rows."""
+    return session.info.get(READ_FROM) == "primary"
+
+
+class ReadReplica:
+    """Hands out read-only sessions, on the replica when there is one."""
+
+    def __init__(self, settings: Mapping[str, Any]) -> None:
+        url = settings.get("replica_url")
+        self.engine: Optional[AsyncEngine] = (
+            create_tuned_engine({**settings, "url": url}) if url else None
+        )
+        self._sessionmaker = (
+            sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+            if self.engine is not None
+            else None
+        )
+        self._retry_after = settings.get("replica_retry_after", 30.0)
+        self._down_until = 0.0
+
+    async def _replica_session(self) -> Optional[AsyncSession]:
+        if self._sessionmaker is None or time.monotonic() < self._down_until:
+            return None
+        session = self._sessionmaker()
+        try:
+            # Check out a connection now, while the primary can still stand in.
+            await session.connection()
+        except (SQLAlchemyError, OSError):
+            await session.close()
+            self._down_until = time.monotonic() + self._retry_after
+            logger.warning(
+                "Read replica unavailable; reading the primary for %s s",
+                self._retry_after,
+                exc_info=True,
+            )
+            return None
+        session.info[READ_FROM] = "replica"
+        return session
+
+    @contextlib.asynccontextmanager
+    async def session(self, read_primary: bool = False) -> AsyncIterator[AsyncSession]:
+        """Yield a session on the replica, or on the primary when there is no
+        replica, it is unavailable, or ``read_primary`` is set."""
+        session = None if read_primary else await self._replica_session()
+        if session is None:
+            session = payment_db._sessionmaker()
+            if read_primary:
+                session.info[READ_FROM] = "primary"
+        async with session:
+            yield session
+
+    def reset_after_fork(self) -> None:
+        """Drop the parent's pooled connections without closing them."""
+        if self.engine is not None:
+            self.engine.sync_engine.dispose(close=False)
+
+    async def dispose(self) -> None:
+        if self.engine is not None:
+            await self.engine.dispose()
@@ -0,0 +1,456 @@
+"""Reconcile local payments against a provider's settlement report.
+
+A payment's local status is whatever ``process_payment``, a webhook or the
+Razorpay verify routes last wrote, and it can drift from what the provider
+actually settled: a verification that never arrived, a webhook lost in an
+outage, a capture for a different amount. ``reconcile`` compares the two
+sides for one provider:
+
+1. The settlement export (CSV) is read row by row and sorted by payment id
+   with an external merge sort: runs of ``sort_run_rows`` rows are sorted in
+   memory and spilled to temporary files, and the runs are then merged.
+2. The provider's local payments are streamed from the database in the same
+   order, from the ``(provider, provider_payment_id)`` index.
+3. The two sorted streams are merge-joined, and every disagreement is
+   written to an NDJSON report as soon as it is found.
+
+Memory holds one sort run and one database fetch batch whatever the size of
+either side, and the time grows linearly with the number of rows.
+
+Usage (from backend/)::
+
+    python -m reconciliation razorpay settlement.csv [--output mismatches.ndjson]
+                             [--created-from 2024-05-01] [--created-to 2024-06-01]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import heapq
+import json
+import os
+import pickle
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import ColumnElement
+
+from fastapi_payments.db.models import Payment, PaymentStatus
+
+from config import get_payment_config, get_reconciliation_config
+
+# Mismatch kinds written to the report.
+MISSING_LOCALLY = "missing_locally"  # settled, but no local payment has the id
+MISSING_IN_SETTLEMENT = "missing_in_settlement"  # settled locally, absent from the report
+STATUS_MISMATCH = "status_mismatch"  # settled, but not completed locally
+AMOUNT_MISMATCH = "amount_mismatch"
+CURRENCY_MISMATCH = "currency_mismatch"
+DUPLICATE = "duplicate"  # the id appears more than once on a side, so rows cannot be paired
+INVALID_ROW = "invalid_row"  # a settlement row without an id or a readable amount
+
+# Counters in the summary that are not mismatch kinds.
+TOTALS = ("settlement_rows", "local_payments", "matched")
+
+# Local statuses that mean the provider should have settled the money.
+SETTLED_STATUSES = frozenset({PaymentStatus.COMPLETED, PaymentStatus.PARTIALLY_REFUNDED})
+
+# Rows fetched from the database cursor per round-trip.
+FETCH_BATCH_SIZE = 5000
+# Rows per pickle in a spilled run; merging holds one chunk per run.
+SPILL_CHUNK_ROWS = 1000
+
+
+class SettlementFormat(NamedTuple):
+    """Columns of a provider's settlement export that reconciliation reads."""
+
+    id_column: str  # matches the local provider_payment_id
+    amount_column: str
+    currency_column: Optional[str] = None
+    # When set, only rows whose type is one of payment_types are read;
+    # refunds, fees and adjustments are skipped.
+    type_column: Optional[str] = None
+    payment_types: Tuple[str, ...] = ()
+    minor_units: bool = False  # amounts in paise/cents rather than rupees/dollars
+
+
+# Defaults for each dashboard's settlement export; the CLI can override any
+# column for exports laid out differently.
+SETTLEMENT_FORMATS: Dict[str, SettlementFormat] = {
+    # "Balance change from activity" itemized report
+    "stripe": SettlementFormat("payment_intent_id", "gross", "currency", "reporting_category", ("charge",)),
+    # Settlement reconciliation report; local Razorpay payments hold the order id
+    "razorpay": SettlementFormat("order_id", "amount", "currency", "type", ("payment",)),
+    "payu": SettlementFormat("txnid", "amount"),
+    "cashfree": SettlementFormat("order_id", "order_amount", "event_currency", "event_type", ("payment",)),
+}
+
+# (provider_payment_id, amount in minor units, currency or None, line number)
+SettlementRow = Tuple[str, int, Optional[str], int]
+# (provider_payment_id, payment id, amount, currency, status)
+LocalRow = Tuple[str, str, float, Optional[str], PaymentStatus]
+
+Row = TypeVar("Row", bound=tuple)
+
+
+def _minor_units(value: str, already_minor: bool) -> int:
+    amount = Decimal(value.replace(",", "").strip())
+    return int(amount if already_minor else (amount * 100).to_integral_value())
+
+
+def read_settlement(
+    lines: Iterable[str],
+    fmt: SettlementFormat,
+    on_invalid: Callable[[int, str], None],
+) -> Iterator[SettlementRow]:
+    """Yield the payment rows of a settlement CSV, in file order.
+
+    Rows that cannot be read are passed to ``on_invalid`` with their line
+    number and the reason, and skipped.
+
+    Raises:
+        ValueError: If the header lacks a column ``fmt`` needs.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip() for name in next(reader, [])]
+    wanted = [fmt.id_column, fmt.amount_column, fmt.currency_column, fmt.type_column]
+    missing = [name for name in wanted if name and name not in header]
+    if missing:
+        raise ValueError(f"Settlement file has no {', '.join(repr(name) for name in missing)} column")
+    id_at, amount_at = header.index(fmt.id_column), header.index(fmt.amount_column)
+    currency_at = header.index(fmt.currency_column) if fmt.currency_column else None
+    type_at = header.index(fmt.type_column) if fmt.type_column else None
+    payment_types = {value.lower() for value in fmt.payment_types}
+
+    columns = len(header)
+    for record in reader:
+        line = reader.line_num
+        if not record:
+            continue
+        if len(record) < columns:
+            on_invalid(line, f"{len(record)} of {columns} columns")
+            continue
+        if type_at is not None and record[type_at].strip().lower() not in payment_types:
+            continue
+        key = record[id_at].strip()
+        if not key:
+            on_invalid(line, f"empty {fmt.id_column}")
+            continue
+        try:
+            amount = _minor_units(record[amount_at], fmt.minor_units)
+        except (InvalidOperation, ValueError):
+            on_invalid(line, f"unreadable {fmt.amount_column} {record[amount_at]!r}")
+            continue
+        currency = None
+        if currency_at is not None:
+            currency = record[currency_at].strip().upper() or None
+        yield key, amount, currency, line
+
+
+def _spill(rows: List[tuple], path: str) -> str:
+    with open(path, "wb") as fh:
+        for start in range(0, len(rows), SPILL_CHUNK_ROWS):
+            pickle.dump(rows[start : start + SPILL_CHUNK_ROWS], fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[tuple]:
+    with open(path, "rb") as fh:
+        while True:
+            try:
+                chunk = pickle.load(fh)
+            except EOFError:
+                return
+            yield from chunk
+
+
+def external_sort(rows: Iterable[Row], run_rows: int, tmp_dir: Optional[str] = None) -> Iterator[Row]:
+    """Yield ``rows`` ordered by their first field, holding at most ``run_rows`` at a time.
+
+    Every full run is sorted and spilled to a file in a temporary directory,
+    which is removed once the generator finishes or is closed.
+    """
+    by_key = itemgetter(0)
+    run: List[Row] = []
+    with tempfile.TemporaryDirectory(prefix="reconcile-", dir=tmp_dir) as directory:
+        runs: List[str] = []
+        for row in rows:
+            run.append(row)
+            if len(run) >= run_rows:
+                run.sort(key=by_key)
+                runs.append(_spill(run, os.path.join(directory, f"run-{len(runs):05d}")))
+                run = []
+        run.sort(key=by_key)
+        if not runs:
+            yield from run
+            return
+        runs.append(_spill(run, os.path.join(directory, f"run-{len(runs):05d}")))
+        del run
+        yield from heapq.merge(*(_read_run(path) for path in runs), key=by_key)
+
+
+def _local_key(provider: str) -> ColumnElement:
+    if provider == "cashfree":
+        # The library stores a generated id for Cashfree payments; the order
+        # id Cashfree reports on is kept in meta_info.
+        return Payment.meta_info["cashfree_order_id"].as_string()
+    return Payment.provider_payment_id
+
+
+def _local_rows(
+    session: Session,
+    provider: str,
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+) -> Iterator[LocalRow]:
+    key = _local_key(provider)
+    stmt = select(key, Payment.id, Payment.amount, Payment.currency, Payment.status).where(
+        Payment.provider == provider, key.is_not(None)
+    )
+    if created_from:
+        stmt = stmt.where(Payment.created_at >= created_from)
+    if created_to:
+        stmt = stmt.where(Payment.created_at < created_to)
+    # The merge compares ids as Python strings, i.e. by code point, which is
+    # SQLite's binary order; PostgreSQL needs the "C" collation for it.
+    order = key.collate("C") if session.bind.dialect.name == "postgresql" else key
+    result = session.execute(stmt.order_by(order).execution_options(yield_per=FETCH_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from map(tuple, partition)
+
+
+def _check_order(previous: Optional[str], key: str, side: str) -> None:
+    if previous is not None and key < previous:
+        raise RuntimeError(f"{side} rows are not sorted by payment id ({key!r} after {previous!r})")
+
+
+def _groups(rows: Iterator[Row], side: str) -> Iterator[Tuple[str, List[Row]]]:
+    group: List[Row] = []
+    for row in rows:
+        if group and row[0] != group[0][0]:
+            _check_order(group[0][0], row[0], side)
+            yield group[0][0], group
+            group = []
+        group.append(row)
+    if group:
+        yield group[0][0], group
+
+
+class _Report:
+    def __init__(self, provider: str, out: TextIO) -> None:
+        self.provider = provider
+        self.out = out
+        self.counts: Dict[str, int] = dict.fromkeys(TOTALS, 0)
+
+    def write(
+        self,
+        kind: str,
+        key: Optional[str],
+        local: Optional[LocalRow] = None,
+        settled: Optional[SettlementRow] = None,
+        **extra: Any,
+    ) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        record: Dict[str, Any] = {"kind": kind, "provider": self.provider, "provider_payment_id": key}
+        if local is not None:
+            _, payment_id, amount, currency, status = local
+            record.update(
+                payment_id=payment_id,
+                local_status=getattr(status, "value", status),
+                local_amount=amount,
+                local_currency=currency,
+            )
+        if settled is not None:
+            _, amount_minor, currency, line = settled
+            record.update(
+                settled_amount=amount_minor / 100,
+                settled_currency=currency,
+                settlement_line=line,
+            )
+        record.update(extra)
+        self.out.write(json.dumps(record) + "\n")
+
+    def compare(self, local: LocalRow, settled: SettlementRow) -> None:
+        key, _, amount, currency, status = local
+        mismatched = False
+        if status not in SETTLED_STATUSES:
+            self.write(STATUS_MISMATCH, key, local, settled)
+            mismatched = True
+        if round(amount * 100) != settled[1]:
+            self.write(AMOUNT_MISMATCH, key, local, settled)
+            mismatched = True
+        if settled[2] is not None and (currency or "").upper() != settled[2]:
+            self.write(CURRENCY_MISMATCH, key, local, settled)
+            mismatched = True
+        if not mismatched:
+            self.counts["matched"] += 1
+
+
+def _merge(
+    session: Session,
+    provider: str,
+    settlement: Iterable[str],
+    report: TextIO,
+    fmt: SettlementFormat,
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+    sort_run_rows: int,
+    tmp_dir: Optional[str],
+) -> Dict[str, int]:
+    out = _Report(provider, report)
+    settled_rows = read_settlement(
+        settlement,
+        fmt,
+        lambda line, reason: out.write(INVALID_ROW, None, settlement_line=line, reason=reason),
+    )
+    settled_groups = _groups(external_sort(settled_rows, sort_run_rows, tmp_dir), "Settlement")
+    local_groups = _groups(_local_rows(session, provider, created_from, created_to), "Local")
+
+    settled = next(settled_groups, None)
+    local = next(local_groups, None)
+    while settled is not None or local is not None:
+        if settled is None or (local is not None and local[0] < settled[0]):
+            out.counts["local_payments"] += len(local[1])
+            for row in local[1]:
+                if row[4] in SETTLED_STATUSES:
+                    out.write(MISSING_IN_SETTLEMENT, local[0], row)
+            local = next(local_groups, None)
+        elif local is None or settled[0] < local[0]:
+            out.counts["settlement_rows"] += len(settled[1])
+            for row in settled[1]:
+                out.write(MISSING_LOCALLY, settled[0], settled=row)
+            settled = next(settled_groups, None)
+        else:
+            out.counts["local_payments"] += len(local[1])
+            out.counts["settlement_rows"] += len(settled[1])
+            if len(local[1]) == 1 and len(settled[1]) == 1:
+                out.compare(local[1][0], settled[1][0])
+            else:
+                out.write(
+                    DUPLICATE,
+                    local[0],
+                    local_rows=len(local[1]),
+                    settlement_rows=len(settled[1]),
+                    settlement_lines=[row[3] for row in settled[1]],
+                )
+            settled = next(settled_groups, None)
+            local = next(local_groups, None)
+    return out.counts
+
+
+async def reconcile(
+    session: AsyncSession,
+    provider: str,
+    settlement: Iterable[str],
+    report: TextIO,
+    *,
+    fmt: Optional[SettlementFormat] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort_run_rows: int = 500_000,
+    tmp_dir: Optional[str] = None,
+) -> Dict[str, int]:
+    """Write every disagreement between ``settlement`` and local payments to ``report``.
+
+    ``settlement`` is the provider's CSV export (an open file or any
+    iterable of lines) and ``report`` receives one JSON object per
+    mismatch. ``created_from``/``created_to`` restrict local payments to the
+    period the export covers, so older payments are not reported missing.
+    The merge runs synchronously inside the session's greenlet and reads
+    the files on the event loop's thread; run it from the CLI or a
+    background job rather than a request handler.
+
+    Returns the number of rows on each side, of matched payments and of
+    each mismatch kind found.
+    """
+    return await session.run_sync(
+        _merge,
+        provider,
+        settlement,
+        report,
+        fmt or SETTLEMENT_FORMATS[provider],
+        created_from,
+        created_to,
+        sort_run_rows,
+        tmp_dir,
+    )
+
+
+async def _run(args: argparse.Namespace, fmt: SettlementFormat, report: TextIO) -> Dict[str, int]:
+    from patches.database import create_tuned_engine
+
+    from models import ensure_schema
+
+    settings = get_reconciliation_config()
+    engine = create_tuned_engine(get_payment_config()["database"])
+    try:
+        # Creates the reconciliation index on databases that predate it.
+        await ensure_schema(engine)
+        async with sessionmaker(engine, class_=AsyncSession)() as session:
+            with open(args.settlement, newline="", encoding="utf-8-sig") as settlement:
+                return await reconcile(
+                    session,
+                    args.provider,
+                    settlement,
+                    report,
+                    fmt=fmt,
+                    created_from=args.created_from,
+                    created_to=args.created_to,
+                    sort_run_rows=args.sort_run_rows or settings["sort_run_rows"],
+                    tmp_dir=settings["tmp_dir"],
+                )
+    finally:
+        await engine.dispose()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("provider", choices=sorted(SETTLEMENT_FORMATS))
+    parser.add_argument("settlement", help="settlement export (CSV)")
+    parser.add_argument("--output", help="mismatch report (NDJSON); standard output when omitted")
+    parser.add_argument("--created-from", type=datetime.fromisoformat, help="first local created_at to compare")
+    parser.add_argument("--created-to", type=datetime.fromisoformat, help="local created_at to stop before")
+    parser.add_argument("--sort-run-rows", type=int, help="overrides RECONCILIATION_SORT_RUN_ROWS")
+    for field in SettlementFormat._fields[:4]:
+        parser.add_argument(f"--{field.replace('_', '-')}", help="export column, if not the default")
+    parser.add_argument("--minor-units", action="store_true", help="amounts are in paise/cents")
+    args = parser.parse_args(argv)
+
+    overrides = {field: getattr(args, field) for field in SettlementFormat._fields[:4] if getattr(args, field)}
+    if args.minor_units:
+        overrides["minor_units"] = True
+    fmt = SETTLEMENT_FORMATS[args.provider]._replace(**overrides)
+
+    try:
+        if args.output:
+            with open(args.output, "w") as report:
+                counts = asyncio.run(_run(args, fmt, report))
+        else:
+            counts = asyncio.run(_run(args, fmt, sys.stdout))
+    except (OSError, ValueError) as exc:
+        parser.exit(2, f"reconciliation: {exc}\n")
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if any(kind not in TOTALS for kind in counts) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
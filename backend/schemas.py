@@ -1,4 +1,5 @@
 """Pydantic schemas for the API."""
+from datetime import date
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
 
@@ -38,6 +39,28 @@ class CustomerResponse(BaseModel):
     provider_customers: Optional[List[ProviderCustomer]] = None
 
 
+class CustomerBatchCreate(BaseModel):
+    """Schema for bulk customer creation."""
+    customers: List[CustomerCreate] = Field(..., min_items=1)
+
+
+class CustomerBatchResult(BaseModel):
+    """Outcome of one item in a bulk customer creation request."""
+
+    index: int
+    status: str  # created, failed
+    customer: Optional[CustomerResponse] = None
+    error: Optional[str] = None
+
+
+class CustomerBatchResponse(BaseModel):
+    """Schema for bulk customer creation response."""
+
+    created: int
+    failed: int
+    results: List[CustomerBatchResult]
+
+
 class ProviderLinkResponse(BaseModel):
     provider: str
     provider_customer_id: str
@@ -207,6 +230,39 @@ class PreDebitNotifyRequest(BaseModel):
     debit_date: str  # Format: dd-MM-yyyy
 
 
+class BillingRunCreate(BaseModel):
+    """Schema for starting a PayU SI billing run."""
+    debit_date: date
+
+
+class BillingRunResponse(BaseModel):
+    """Schema for a billing run and its item counts per state."""
+    id: str
+    debit_date: str
+    status: str  # notifying, notified, charging or completed
+    created_at: str
+    notified_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    total: int
+    counts: Dict[str, int]
+
+
+class BillingRunItemResponse(BaseModel):
+    """Schema for the outcome of one mandate in a billing run."""
+    id: int
+    subscription_id: str
+    customer_id: str
+    mandate_token: str
+    amount: float
+    currency: str
+    txnid: str
+    state: str  # pending, notified, charged, failed or unknown
+    error: Optional[str] = None
+    payment_id: Optional[str] = None
+    notified_at: Optional[str] = None
+    charged_at: Optional[str] = None
+
+
 # Webhook schemas
 class WebhookEvent(BaseModel):
     """Schema for webhook events."""
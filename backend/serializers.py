@@ -0,0 +1,77 @@
+"""Single-pass JSON serialization for the hot list endpoints.
+
+When a route returns plain dicts, FastAPI validates them against the
+``response_model`` again and then runs ``jsonable_encoder`` over the result,
+so every row is serialized twice. Routes that return ``FastJSONResponse``
+skip that step entirely. ``response_model`` stays on the route so OpenAPI
+still documents the schema, and ``ResponseSerializer`` projects each payload
+onto exactly the model's fields so the wire format does not change.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:  # orjson is optional; fall back to the stdlib encoder when missing.
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encode ``content`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=str
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with ``dumps`` and no model validation."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _model_fields(model: Type[BaseModel]) -> List[Tuple[str, Any]]:
+    # pydantic v2 exposes ``model_fields``; v1 exposes ``__fields__``.
+    fields = getattr(model, "model_fields", None)
+    if fields is None:
+        return [(f.alias, None if f.required else f.default) for f in model.__fields__.values()]
+    return [
+        (info.alias or name, None if info.is_required() else info.default)
+        for name, info in fields.items()
+    ]
+
+
+class ResponseSerializer:
+    """Turns service dicts into ``response_model``-shaped JSON in one pass.
+
+    The field list is read from the model once, at construction, so
+    serializing a row is a single dict comprehension.
+    """
+
+    def __init__(
+        self,
+        model: Type[BaseModel],
+        payload: Callable[[Dict[str, Any]], Mapping[str, Any]],
+    ):
+        self.model = model
+        self._payload = payload
+        self._fields = _model_fields(model)
+
+    def row(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        data = self._payload(item)
+        return {name: data.get(name, default) for name, default in self._fields}
+
+    def response(
+        self,
+        items: Iterable[Dict[str, Any]],
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> FastJSONResponse:
+        row = self.row
+        return FastJSONResponse([row(item) for item in items], headers=headers)
@@ -0,0 +1,209 @@
+"""In-process stand-ins for provider SDKs, for tests and benchmarks.
+
+``StubProvider`` answers the provider calls the example backend makes with
+canned data after an optional simulated network latency, so flows that
+normally cost a Stripe/PayU/Cashfree/Razorpay round-trip can run offline.
+It also records how many calls were in flight at once, which lets tests
+check concurrency limits.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+STUBBED_PROVIDERS = ("stripe", "payu", "cashfree", "razorpay")
+
+
+class StubProvider:
+    """Minimal provider double with configurable latency and failures."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        latency: float = 0.0,
+        fail_emails: Iterable[str] = (),
+        fail_mandates: Iterable[str] = (),
+        timeout_mandates: Iterable[str] = (),
+    ):
+        self.name = name
+        self.latency = latency
+        self.fail_emails = set(fail_emails)
+        self.fail_mandates = set(fail_mandates)
+        # Debits taken but answered with a read timeout, as a lost response.
+        self.timeout_mandates = set(timeout_mandates)
+        self.debited: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+    def _id(self, prefix: str) -> str:
+        return f"{prefix}_{self.name}_{uuid.uuid4().hex[:12]}"
+
+    async def create_customer(
+        self,
+        email: str,
+        name: Optional[str] = None,
+        meta_info: Optional[Dict[str, Any]] = None,
+        address: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        await self._call("create_customer")
+        if email in self.fail_emails:
+            raise ValueError(f"{self.name} rejected customer {email}")
+        return {
+            "provider_customer_id": self._id("cus"),
+            "email": email,
+            "name": name,
+            "meta_info": meta_info or {},
+        }
+
+    async def retrieve_customer(self, provider_customer_id: str) -> Dict[str, Any]:
+        await self._call("retrieve_customer")
+        return {"provider_customer_id": provider_customer_id}
+
+    async def retrieve_subscription(self, provider_subscription_id: str) -> Dict[str, Any]:
+        await self._call("retrieve_subscription")
+        return {"provider_subscription_id": provider_subscription_id, "status": "active"}
+
+    def verify_payment_signature(
+        self,
+        razorpay_payment_id: str,
+        razorpay_order_id: Optional[str] = None,
+        razorpay_subscription_id: Optional[str] = None,
+        razorpay_signature: str = "",
+    ) -> bool:
+        self.calls["verify_payment_signature"] = self.calls.get("verify_payment_signature", 0) + 1
+        if razorpay_signature != "valid":
+            raise ValueError("Razorpay signature verification failed")
+        return True
+
+    async def create_product(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        meta_info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        await self._call("create_product")
+        return {"provider_product_id": self._id("prod"), "name": name}
+
+    async def create_price(
+        self,
+        product_id: str,
+        amount: float,
+        currency: str,
+        interval: Optional[str] = None,
+        interval_count: Optional[int] = None,
+        meta_info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        await self._call("create_price")
+        return {"provider_price_id": self._id("price"), "amount": amount, "currency": currency}
+
+    async def create_subscription(
+        self,
+        provider_customer_id: str,
+        price_id: Optional[str] = None,
+        quantity: int = 1,
+        trial_period_days: Optional[int] = None,
+        meta_info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        await self._call("create_subscription")
+        now = datetime.now(timezone.utc)
+        return {
+            "provider_subscription_id": self._id("sub"),
+            "status": "pending",
+            "current_period_start": now.isoformat(),
+            "current_period_end": (now + timedelta(days=30)).isoformat(),
+            "cancel_at_period_end": False,
+            "meta_info": {},
+        }
+
+    async def process_payment(
+        self,
+        amount: float,
+        currency: str,
+        provider_customer_id: Optional[str] = None,
+        payment_method_id: Optional[str] = None,
+        description: Optional[str] = None,
+        mandate_id: Optional[str] = None,
+        meta_info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        await self._call("process_payment")
+        return {
+            "provider_payment_id": self._id("pay"),
+            "amount": amount,
+            "currency": currency,
+            "status": "pending",
+        }
+
+    async def pre_debit_notify(
+        self, mandate_token: str, amount: float, debit_date: str
+    ) -> Dict[str, Any]:
+        await self._call("pre_debit_notify")
+        if mandate_token in self.fail_mandates:
+            raise ValueError(f"{self.name} rejected mandate {mandate_token}")
+        return {
+            "mandate_token": mandate_token,
+            "notification_sent": True,
+            "amount": amount,
+            "debit_date": debit_date,
+        }
+
+    async def si_transaction(self, mandate_token: str, amount: float, txnid: str) -> Dict[str, Any]:
+        await self._call("si_transaction")
+        if mandate_token in self.fail_mandates:
+            raise ValueError(f"{self.name} rejected mandate {mandate_token}")
+        payment_id = self.debited.setdefault(txnid, self._id("si"))
+        if mandate_token in self.timeout_mandates:
+            raise httpx.ReadTimeout(f"{self.name} did not answer for {txnid}")
+        return {
+            "status": "success",
+            "txnid": txnid,
+            "mandate_token": mandate_token,
+            "amount": amount,
+            "provider_payment_id": payment_id,
+        }
+
+    async def verify_transaction(self, txnid: str) -> Dict[str, Any]:
+        await self._call("verify_transaction")
+        if txnid in self.debited:
+            return {"txnid": txnid, "status": "success", "provider_payment_id": self.debited[txnid]}
+        return {"txnid": txnid, "status": "not found", "provider_payment_id": None}
+
+    async def webhook_handler(self, payload: Any, signature: Optional[str] = None) -> Dict[str, Any]:
+        await self._call("webhook_handler")
+        if signature == "invalid":
+            raise ValueError("Invalid webhook signature")
+        event = json.loads(payload) if isinstance(payload, str) else payload
+        return {
+            "event_type": event.get("event"),
+            "standardized_event_type": event.get("event"),
+            "data": event.get("payload", {}),
+            "provider": self.name,
+        }
+
+
+def install_stub_providers(
+    payment_service: Any,
+    *,
+    latency: float = 0.0,
+    names: Iterable[str] = STUBBED_PROVIDERS,
+) -> Dict[str, StubProvider]:
+    """Replace ``payment_service``'s providers with stubs and return them."""
+    stubs = {name: StubProvider(name, latency=latency) for name in names}
+    payment_service.providers.update(stubs)
+    return stubs
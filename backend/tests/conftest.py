@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before main.py reads the config so
+# test runs never touch the checked-in payments.db.
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/payments_test.db",
+)
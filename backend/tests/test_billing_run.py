@@ -0,0 +1,291 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, Plan, PricingModel, Subscription
+
+import main
+from models import BillingRun
+from stub_providers import StubProvider
+
+
+def _seed_mandates(client, prefix, period_end, count):
+    """Make ``count`` PayU subscriptions with mandates the only ones due."""
+
+    async def seed():
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                update(Subscription)
+                .where(Subscription.provider == "payu")
+                .values(status="canceled")
+            )
+            session.add(
+                Plan(
+                    id=f"plan_{prefix}",
+                    product_id="prod_billing",
+                    name="Monthly",
+                    pricing_model=PricingModel.SUBSCRIPTION,
+                    amount=499.0,
+                    currency="INR",
+                )
+            )
+            for i in range(count):
+                session.add(
+                    Subscription(
+                        id=f"{prefix}_{i}",
+                        customer_id=f"cust_{prefix}",
+                        plan_id=f"plan_{prefix}",
+                        provider="payu",
+                        status="active",
+                        quantity=2,
+                        current_period_end=period_end,
+                        meta_info={"mandate_token": f"mandate_{prefix}_{i}"},
+                    )
+                )
+            # Not due yet, and due but without a mandate: both left out.
+            session.add(
+                Subscription(
+                    id=f"{prefix}_later",
+                    customer_id=f"cust_{prefix}",
+                    plan_id=f"plan_{prefix}",
+                    provider="payu",
+                    status="active",
+                    current_period_end=period_end + timedelta(days=5),
+                    meta_info={"mandate_token": f"mandate_{prefix}_later"},
+                )
+            )
+            session.add(
+                Subscription(
+                    id=f"{prefix}_no_mandate",
+                    customer_id=f"cust_{prefix}",
+                    plan_id=f"plan_{prefix}",
+                    provider="payu",
+                    status="active",
+                    current_period_end=period_end,
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def test_billing_run_notifies_then_charges_each_mandate(monkeypatch):
+    stub = StubProvider("payu", latency=0.01, fail_mandates={"mandate_run_3"})
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    monkeypatch.setattr(main.billing_runner, "concurrency", 3)
+    monkeypatch.setattr(main.billing_runner, "rate_per_second", 0)
+    with TestClient(main.app) as client:
+        _seed_mandates(client, "run", datetime(2030, 1, 10, 9, 30), 8)
+
+        created = client.post("/payu/billing-runs", json={"debit_date": "2030-01-10"})
+        assert created.status_code == 202
+        run_id = created.json()["id"]
+        client.portal.call(main.billing_runner.wait, run_id)
+
+        run = client.get(f"/payu/billing-runs/{run_id}").json()
+        assert run["status"] == "notified"
+        assert run["counts"] == {"notified": 7, "failed": 1}
+        assert stub.calls["pre_debit_notify"] == 8
+        assert stub.max_in_flight == 3
+        # Same date again: the existing run, not a second one.
+        assert client.post("/payu/billing-runs", json={"debit_date": "2030-01-10"}).json()["id"] == run_id
+
+        # RBI notice period has not passed yet.
+        assert client.post(f"/payu/billing-runs/{run_id}/charge").status_code == 409
+        monkeypatch.setattr(main.billing_runner, "min_notice", timedelta(0))
+        assert client.post(f"/payu/billing-runs/{run_id}/charge").status_code == 202
+        client.portal.call(main.billing_runner.wait, run_id)
+
+        run = client.get(f"/payu/billing-runs/{run_id}").json()
+        assert run["status"] == "completed"
+        assert run["counts"] == {"charged": 7, "failed": 1}
+        assert stub.calls["si_transaction"] == 7
+
+        first = client.get(f"/payu/billing-runs/{run_id}/items", params={"limit": 5})
+        rest = client.get(
+            f"/payu/billing-runs/{run_id}/items", params={"after": first.headers["x-next-cursor"]}
+        )
+        items = first.json() + rest.json()
+        assert len(items) == 8
+        failed = [item for item in items if item["state"] == "failed"]
+        assert [item["mandate_token"] for item in failed] == ["mandate_run_3"]
+        assert "rejected mandate" in failed[0]["error"]
+        assert all(item["amount"] == 998.0 for item in items)
+
+        async def recorded_payment():
+            async with payment_db._sessionmaker() as session:
+                return await session.get(Payment, items[0]["payment_id"])
+
+        payment = client.portal.call(recorded_payment)
+        assert payment.status.value == "processing"
+        assert payment.amount == 998.0
+        assert payment.meta_info["txnid"] == items[0]["txnid"]
+
+
+def test_interrupted_charge_phase_resumes_where_it_stopped(monkeypatch):
+    stub = StubProvider("payu", latency=0.02)
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    monkeypatch.setattr(main.billing_runner, "concurrency", 2)
+    monkeypatch.setattr(main.billing_runner, "min_notice", timedelta(0))
+    runner = main.billing_runner
+    with TestClient(main.app) as client:
+        _seed_mandates(client, "resume", datetime(2031, 1, 10), 10)
+
+        async def interrupt_charging():
+            run_id, _ = await runner.create_run(date(2031, 1, 10))
+            runner.start(run_id, stub)
+            await runner.wait(run_id)
+            await runner.start_charging(run_id, stub)
+            while stub.calls.get("si_transaction", 0) < 4:
+                await asyncio.sleep(0.005)
+            await runner.shutdown()
+            return run_id
+
+        run_id = client.portal.call(interrupt_charging)
+        run = client.get(f"/payu/billing-runs/{run_id}").json()
+        assert run["status"] == "charging"
+        assert 0 < run["counts"]["charged"] < 10
+
+        async def resume():
+            assert await runner.resume_interrupted(stub) == [run_id]
+            await runner.wait(run_id)
+
+        client.portal.call(resume)
+        run = client.get(f"/payu/billing-runs/{run_id}").json()
+        assert run["status"] == "completed"
+        assert run["counts"] == {"charged": 10}
+
+        async def payments_per_subscription():
+            async with payment_db._sessionmaker() as session:
+                rows = await session.execute(
+                    select(Payment.meta_info["subscription_id"].as_string(), func.count())
+                    .where(Payment.provider == "payu")
+                    .group_by(Payment.meta_info["subscription_id"].as_string())
+                )
+                lease = await session.get(BillingRun, run_id)
+                return dict(rows.all()), lease.lease_owner
+
+        counts, lease_owner = client.portal.call(payments_per_subscription)
+        assert {k: v for k, v in counts.items() if k.startswith("resume_")} == {
+            f"resume_{i}": 1 for i in range(10)
+        }
+        assert lease_owner is None
+
+
+def test_each_period_is_charged_once_across_runs(monkeypatch):
+    stub = StubProvider("payu")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    monkeypatch.setattr(main.billing_runner, "rate_per_second", 0)
+    monkeypatch.setattr(main.billing_runner, "min_notice", timedelta(0))
+    runner = main.billing_runner
+    with TestClient(main.app) as client:
+        _seed_mandates(client, "period", datetime(2032, 3, 10), 3)
+
+        async def notified_run(debit_date):
+            run_id, _ = await runner.create_run(debit_date)
+            runner.start(run_id, stub)
+            await runner.wait(run_id)
+            return run_id
+
+        async def charge(run_id):
+            await runner.start_charging(run_id, stub)
+            await runner.wait(run_id)
+
+        march = client.portal.call(notified_run, date(2032, 3, 10))
+        # A later run while March is still being billed leaves those mandates out.
+        overlapping = client.portal.call(notified_run, date(2032, 3, 20))
+        client.portal.call(charge, march)
+        # So does one after March was charged: their next period ends in April.
+        after_charge = client.portal.call(notified_run, date(2032, 3, 25))
+        april = client.portal.call(notified_run, date(2032, 4, 10))
+        client.portal.call(charge, april)
+
+        def items(run_id):
+            listed = client.get(f"/payu/billing-runs/{run_id}/items").json()
+            return {item["subscription_id"]: item["state"] for item in listed}
+
+        charged = {f"period_{i}": "charged" for i in range(3)}
+        assert items(march) == charged
+        # Only the subscription whose period ends on the 15th is new.
+        assert items(overlapping) == {"period_later": "notified"}
+        assert items(after_charge) == {}
+        assert items(april) == charged
+
+        async def billed():
+            async with payment_db._sessionmaker() as session:
+                payments = await session.execute(
+                    select(Payment.meta_info["subscription_id"].as_string(), func.count())
+                    .where(Payment.provider == "payu")
+                    .group_by(Payment.meta_info["subscription_id"].as_string())
+                )
+                periods = await session.execute(
+                    select(Subscription.id, Subscription.current_period_end).where(
+                        Subscription.id.like("period_%")
+                    )
+                )
+                return dict(payments.all()), dict(periods.all())
+
+        payments, periods = client.portal.call(billed)
+        assert {k: v for k, v in payments.items() if k.startswith("period_")} == {
+            f"period_{i}": 2 for i in range(3)
+        }
+        assert {periods[f"period_{i}"] for i in range(3)} == {datetime(2032, 5, 10)}
+
+
+def test_debits_with_an_unknown_outcome_are_verified_before_rebilling(monkeypatch):
+    stub = StubProvider("payu", timeout_mandates={"mandate_ambig_0", "mandate_ambig_1"})
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    monkeypatch.setattr(main.billing_runner, "rate_per_second", 0)
+    monkeypatch.setattr(main.billing_runner, "min_notice", timedelta(0))
+    with TestClient(main.app) as client:
+        _seed_mandates(client, "ambig", datetime(2033, 3, 10), 3)
+
+        def billed(debit_date):
+            run_id = client.post("/payu/billing-runs", json={"debit_date": debit_date}).json()["id"]
+            client.portal.call(main.billing_runner.wait, run_id)
+            assert client.post(f"/payu/billing-runs/{run_id}/charge").status_code == 202
+            client.portal.call(main.billing_runner.wait, run_id)
+            return run_id
+
+        def items(run_id):
+            listed = client.get(f"/payu/billing-runs/{run_id}/items").json()
+            return {item["subscription_id"]: item for item in listed}
+
+        march = billed("2033-03-10")
+        first = items(march)
+        assert {sub: item["state"] for sub, item in first.items()} == {
+            "ambig_0": "unknown",
+            "ambig_1": "unknown",
+            "ambig_2": "charged",
+        }
+
+        # PayU took ambig_0's debit but never received ambig_1's.
+        del stub.debited[first["ambig_1"]["txnid"]]
+        stub.timeout_mandates.clear()
+        retry = billed("2033-03-12")
+
+        assert {sub: item["state"] for sub, item in items(march).items()} == {
+            "ambig_0": "charged",
+            "ambig_1": "failed",
+            "ambig_2": "charged",
+        }
+        assert {sub: item["state"] for sub, item in items(retry).items()} == {"ambig_1": "charged"}
+        assert stub.calls["verify_transaction"] == 2
+
+        async def payments_per_subscription():
+            async with payment_db._sessionmaker() as session:
+                rows = await session.execute(
+                    select(Payment.meta_info["subscription_id"].as_string(), func.count())
+                    .where(Payment.provider == "payu")
+                    .group_by(Payment.meta_info["subscription_id"].as_string())
+                )
+                return dict(rows.all())
+
+        counts = client.portal.call(payments_per_subscription)
+        assert {k: v for k, v in counts.items() if k.startswith("ambig_")} == {
+            f"ambig_{i}": 1 for i in range(3)
+        }
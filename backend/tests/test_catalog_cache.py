@@ -0,0 +1,74 @@
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+
+import main
+import metrics
+from catalog_cache import TTLCache
+from stub_providers import StubProvider
+
+
+class _Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_and_least_recently_used_is_evicted():
+    clock = _Clock()
+    cache = TTLCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+    cache.set("plan_page:x", 1)
+    cache.invalidate_where(lambda key: key.startswith("plan_page"))
+    assert cache.get("plan_page:x") is None
+
+
+def _lookups(kind, result):
+    return metrics.CACHE_LOOKUPS.value(kind, result)
+
+
+def test_subscriptions_and_plan_listing_read_the_catalog_from_cache(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    with TestClient(main.app) as client:
+        product_id = client.post(
+            "/products", json={"name": "Cached", "meta_info": {"provider": "stripe"}}
+        ).json()["id"]
+        plan = {"name": "Monthly", "amount": 10.0, "billing_interval": "month"}
+        plan_id = client.post(f"/products/{product_id}/plans", json=plan).json()["id"]
+        customer_id = client.post("/customers", json={"email": "cached@example.com"}).json()["id"]
+
+        misses = _lookups("plan", "miss")
+        hits = _lookups("plan", "hit")
+        for _ in range(3):
+            created = client.post(
+                f"/customers/{customer_id}/subscriptions", json={"plan_id": plan_id}
+            )
+            assert created.status_code == 200
+        assert _lookups("plan", "miss") - misses == 1
+        assert _lookups("plan", "hit") - hits == 2
+
+        listed = client.get(f"/products/{product_id}/plans").json()
+        assert [p["id"] for p in listed] == [plan_id]
+        page_hits = _lookups("plan_page", "hit")
+        assert client.get(f"/products/{product_id}/plans").json() == listed
+        assert _lookups("plan_page", "hit") - page_hits == 1
+
+        # Creating a plan drops the product's cached pages.
+        second = client.post(f"/products/{product_id}/plans", json=dict(plan, name="Yearly"))
+        listed = client.get(f"/products/{product_id}/plans").json()
+        assert {p["id"] for p in listed} == {plan_id, second.json()["id"]}
+
+        body = client.get("/metrics").text
+    assert 'catalog_cache_lookups_total{kind="plan",result="hit"}' in body
@@ -0,0 +1,44 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+
+import dependencies
+import main
+
+
+def test_payment_config_is_built_once_and_frozen():
+    config = dependencies.get_payment_config()
+    assert dependencies.get_payment_config() is config
+    with pytest.raises(TypeError):
+        config.default_provider = "payu"
+
+
+def test_admin_reload_swaps_config_and_payment_service(monkeypatch):
+    monkeypatch.setitem(main.admin_config, "token", "secret")
+    before_config = dependencies.get_payment_config()
+    before_service = payment_deps._payment_service
+    try:
+        with TestClient(main.app) as client:
+            monkeypatch.setenv("PAYU_API_KEY", "reload_key")
+            monkeypatch.setenv("PAYU_API_SECRET", "reload_secret")
+            monkeypatch.setenv("DEFAULT_PAYMENT_PROVIDER", "payu")
+
+            assert client.post("/admin/config/reload").status_code == 403
+            resp = client.post("/admin/config/reload", headers={"X-Admin-Token": "secret"})
+            assert resp.status_code == 200
+            assert resp.json()["default_provider"] == "payu"
+
+            assert dependencies.get_payment_config() is not before_config
+            assert dependencies.get_payment_config().default_provider == "payu"
+            assert payment_deps._payment_service is not before_service
+            assert payment_deps._payment_service.default_provider == "payu"
+            assert client.get("/providers").json()["default_provider"] == "payu"
+    finally:
+        monkeypatch.undo()
+        main.reload_settings()
+
+
+def test_admin_reload_is_disabled_without_a_token():
+    with TestClient(main.app) as client:
+        assert client.post("/admin/config/reload").status_code == 404
@@ -0,0 +1,75 @@
+import threading
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.providers.razorpay import RazorpayProvider
+
+import main
+from stub_providers import StubProvider
+
+
+def test_batch_creates_customers_with_bounded_fan_out(monkeypatch):
+    stub = StubProvider("stripe", latency=0.01, fail_emails={"bad@example.com"})
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    monkeypatch.setitem(main.customer_batch_config, "provider_concurrency", 3)
+
+    customers = [{"email": f"batch{i}@example.com", "name": f"Batch {i}"} for i in range(8)]
+    customers.insert(4, {"email": "bad@example.com"})
+    customers.append({"email": "nope@example.com", "meta_info": {"provider": "unknown"}})
+
+    with TestClient(main.app) as client:
+        resp = client.post("/customers/batch", json={"customers": customers})
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["created"] == 8
+        assert body["failed"] == 2
+        assert [r["status"] for r in body["results"]][3:6] == ["created", "failed", "created"]
+        assert "rejected" in body["results"][4]["error"]
+        assert "not found" in body["results"][9]["error"]
+        assert stub.max_in_flight == 3
+
+        created = body["results"][0]["customer"]
+        assert created["provider_customer_id"].startswith("cus_stripe_")
+        fetched = client.get("/customers", params={"search": "batch0@"}).json()
+        assert [c["id"] for c in fetched] == [created["id"]]
+
+
+def test_batch_size_is_capped(monkeypatch):
+    monkeypatch.setitem(main.customer_batch_config, "max_items", 2)
+    with TestClient(main.app) as client:
+        resp = client.post(
+            "/customers/batch",
+            json={"customers": [{"email": f"cap{i}@example.com"} for i in range(3)]},
+        )
+        assert resp.status_code == 413
+
+
+def test_razorpay_sdk_calls_run_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def create(data):
+        threads.append(threading.get_ident())
+        return {"id": f"cust_rzp_{data['email']}", "email": data["email"], "name": data["name"]}
+
+    provider = RazorpayProvider.__new__(RazorpayProvider)
+    provider.client = SimpleNamespace(customer=SimpleNamespace(create=create))
+    monkeypatch.setitem(payment_deps._payment_service.providers, "razorpay", provider)
+
+    customers = [
+        {"email": f"rzp{i}@example.com", "meta_info": {"provider": "razorpay", "phone": "99"}}
+        for i in range(2)
+    ]
+    with TestClient(main.app) as client:
+        loop_thread = client.portal.call(threading.get_ident)
+        resp = client.post("/customers/batch", json={"customers": customers})
+
+    assert resp.status_code == 200
+    assert resp.json()["created"] == 2
+    assert [r["customer"]["provider_customer_id"] for r in resp.json()["results"]] == [
+        "cust_rzp_rzp0@example.com",
+        "cust_rzp_rzp1@example.com",
+    ]
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Customer
+
+import customer_search
+from main import app
+from pagination import NEXT_CURSOR_HEADER
+
+# (name, email) in creation order; every row contains "zarqa" somewhere.
+CUSTOMERS = [
+    ("Kumar Bizarqan", "kb@other.test"),  # substring in the middle of a word
+    ("Priya Nair", "priya@zarqa.org"),  # email domain
+    ("Zarqa Rao", "zarqa.rao@mail.test"),  # email and name prefix
+    ("Dev Zarqa", "dev@mail.test"),  # prefix of a later word in the name
+    ("Exact Match", "zarqa"),
+]
+
+
+def _seed(client):
+    async def seed():
+        base = datetime(2024, 3, 1)
+        async with payment_db._sessionmaker() as session:
+            rows = [
+                Customer(name=name, email=email, created_at=base + timedelta(minutes=i))
+                for i, (name, email) in enumerate(CUSTOMERS)
+            ]
+            session.add_all(rows)
+            await session.commit()
+            return {row.email: row.id for row in rows}
+
+    return client.portal.call(seed)
+
+
+def _names(response):
+    assert response.status_code == 200, response.text
+    return [customer["name"] for customer in response.json()]
+
+
+def test_search_ranks_exact_prefix_and_domain_matches_first():
+    with TestClient(app) as client:
+        _seed(client)
+        assert customer_search._indexed
+
+        ranked = _names(client.get("/customers", params={"search": "ZARQA"}))
+        assert ranked == ["Exact Match", "Dev Zarqa", "Zarqa Rao", "Priya Nair", "Kumar Bizarqan"]
+
+        # Cursor pages walk the same ranking without gaps or repeats.
+        paged, params = [], {"search": "zarqa", "limit": 2}
+        while True:
+            response = client.get("/customers", params=params)
+            paged.extend(_names(response))
+            if not response.headers.get(NEXT_CURSOR_HEADER):
+                break
+            params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+        assert paged == ranked
+
+        domain = _names(client.get("/customers", params={"search": "@zarqa.org"}))
+        assert domain == ["Priya Nair"]
+        # Below the trigram length the scan still answers.
+        assert "Priya Nair" in _names(client.get("/customers", params={"search": "ya"}))
+        assert client.get("/customers", params={"search": "zarqa", "cursor": "bogus"}).status_code == 400
+
+
+def test_search_index_follows_updates_and_deletes():
+    with TestClient(app) as client:
+
+        async def change():
+            async with payment_db._sessionmaker() as session:
+                renamed = Customer(name="Kumar Vexlo", email="kumar@vexlo.test")
+                deleted = Customer(name="Dev Vexlo", email="dev@vexlo.test")
+                session.add_all([renamed, deleted])
+                await session.commit()
+                renamed.name = "Kumar Quillon"
+                renamed.email = "kumar@quillon.test"
+                await session.delete(deleted)
+                await session.commit()
+
+        client.portal.call(change)
+        assert _names(client.get("/customers", params={"search": "quillon"})) == ["Kumar Quillon"]
+        assert _names(client.get("/customers", params={"search": "vexlo"})) == []
@@ -0,0 +1,45 @@
+import os
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from fastapi_payments.db import repositories as payment_db
+
+import main
+from config import get_payment_config
+from patches.database import create_tuned_engine
+
+
+def test_sqlite_pragmas_are_applied_on_connect():
+    settings = get_payment_config()["database"]
+    assert payment_db._engine.url.render_as_string() == settings["url"]
+
+    async def pragmas():
+        async with payment_db._engine.connect() as conn:
+            return {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout")
+            }
+
+    with TestClient(main.app) as client:
+        values = client.portal.call(pragmas)
+    # synchronous=NORMAL is reported as 1.
+    assert values == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000}
+
+
+def test_pool_options_follow_settings(tmp_path):
+    settings = dict(
+        get_payment_config()["database"],
+        url=f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'pool.db')}",
+        pool_size=3,
+        max_overflow=2,
+        pool_recycle=60,
+    )
+    engine = create_tuned_engine(settings)
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+    assert engine.pool._recycle == 60
+    assert engine.pool._pre_ping is True
+
+    memory = create_tuned_engine(dict(settings, url="sqlite+aiosqlite:///:memory:"))
+    assert type(memory.pool).__name__ == "StaticPool"
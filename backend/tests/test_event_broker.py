@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from fastapi_payments.config.config_schema import MessagingConfig
+from fastapi_payments.messaging.publishers import InMemoryBroker, PaymentEvents
+
+import event_broker
+from event_broker import EventPublisher, RedisStreamBroker
+
+fakeredis = pytest.importorskip("fakeredis")
+
+SETTINGS = {"stream": "test:events", "stream_maxlen": 1000, "batch_size": 10, "max_pending": 5}
+
+
+def _broker(server, **overrides):
+    return RedisStreamBroker(client=fakeredis.FakeAsyncRedis(server=server), **dict(SETTINGS, **overrides))
+
+
+def test_concurrent_publishes_are_batched_and_acknowledged(monkeypatch):
+    broker = _broker(fakeredis.FakeServer())
+    batch_sizes = []
+    write = broker._write
+
+    async def recording_write(batch):
+        batch_sizes.append(len(batch))
+        await write(batch)
+
+    monkeypatch.setattr(broker, "_write", recording_write)
+
+    async def publish_all():
+        entry_ids = await asyncio.gather(
+            *(broker.publish({"event_type": "payment.test", "data": {"i": i}}) for i in range(40))
+        )
+        length = await broker.client.xlen("test:events")
+        await broker.close()
+        return entry_ids, length
+
+    entry_ids, length = asyncio.run(publish_all())
+    assert len(set(entry_ids)) == 40 and length == 40
+    # max_pending=5 holds publishers back, and no pipeline exceeds batch_size.
+    assert max(batch_sizes) <= 10
+    assert len(batch_sizes) < 40
+
+
+def test_publish_raises_when_redis_rejects_the_write():
+    server = fakeredis.FakeServer()
+    broker = _broker(server)
+    server.connected = False
+
+    async def publish():
+        try:
+            with pytest.raises(ConnectionError):
+                await broker.publish({"event_type": "payment.test", "data": {}})
+        finally:
+            server.connected = True
+            await broker.close()
+
+    asyncio.run(publish())
+
+
+def test_consumer_acknowledges_handled_entries_and_retries_failures():
+    broker = _broker(fakeredis.FakeServer())
+    consumer = broker.consumer("billing", "worker-1", block_ms=10, claim_idle_ms=0)
+    handled = []
+    failed_once = set()
+
+    async def handler(message):
+        i = message["data"]["i"]
+        if i == 2 and i not in failed_once:
+            failed_once.add(i)
+            raise RuntimeError("transient")
+        handled.append(i)
+
+    async def consume():
+        await consumer.ensure_group()
+        await consumer.ensure_group()  # idempotent
+        for i in range(5):
+            await broker.publish({"event_type": "payment.test", "data": {"i": i}})
+        acked = [await consumer.poll(handler), await consumer.poll(handler)]
+        pending = await broker.client.xpending("test:events", "billing")
+        await broker.close()
+        return acked, pending
+
+    acked, pending = asyncio.run(consume())
+    assert acked == [4, 1]
+    assert sorted(handled) == [0, 1, 2, 3, 4]
+    assert pending["pending"] == 0
+
+
+def test_broker_is_selected_from_config(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setitem(
+        event_broker.BROKERS, "redis", lambda url, settings: _broker(server, **settings)
+    )
+    memory = EventPublisher(MessagingConfig(broker_type="memory"), SETTINGS)
+    assert isinstance(memory.broker, InMemoryBroker)
+
+    publisher = EventPublisher(MessagingConfig(broker_type="redis", url="redis://unused"), SETTINGS)
+    assert isinstance(publisher.broker, RedisStreamBroker)
+
+    async def publish():
+        await publisher.publish_event(PaymentEvents.PAYMENT_CREATED, {"payment_id": "pay_1"})
+        entries = await publisher.broker.client.xrange("test:events")
+        await publisher.stop()
+        return entries
+
+    [(_, fields)] = asyncio.run(publish())
+    assert fields[b"event_type"] == b"payment.transaction.created"
+    assert b'"payment_id":"pay_1"' in fields[b"body"]
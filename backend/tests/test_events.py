@@ -0,0 +1,120 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Subscription
+from fastapi_payments.messaging.publishers import PaymentEvents
+
+import event_stream
+import main
+from stub_providers import StubProvider
+
+
+class _Request:
+    disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def _seed_subscription(client, subscription_id):
+    async def seed():
+        async with payment_db._sessionmaker() as session:
+            session.add(
+                Subscription(
+                    id=subscription_id,
+                    customer_id="cust_events",
+                    plan_id="plan_events",
+                    provider="razorpay",
+                    provider_subscription_id=f"rzp_{subscription_id}",
+                    status="pending",
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def test_subscription_stream_delivers_published_events():
+    with TestClient(main.app) as client:
+        _seed_subscription(client, "sub_stream")
+
+        async def watch():
+            request = _Request()
+            frames = event_stream.stream(
+                main.event_hub, "subscription", Subscription, "sub_stream", request, heartbeat=0.05
+            )
+            snapshot = await frames.__anext__()
+            assert b"event: snapshot" in snapshot
+            assert b'"status":"pending"' in snapshot
+
+            await payment_deps._payment_service.event_publisher.publish_event(
+                PaymentEvents.SUBSCRIPTION_UPDATED,
+                {"subscription_id": "sub_stream", "status": "active"},
+            )
+            event = await asyncio.wait_for(frames.__anext__(), 1)
+            assert event.startswith(b"id: 1\nevent: payment.subscription.updated\n")
+            assert b'"status":"active"' in event
+
+            assert await frames.__anext__() == b": keep-alive\n\n"
+            request.disconnected = True
+            assert [frame async for frame in frames] == []
+            assert main.event_hub.subscriber_count("subscription:sub_stream") == 0
+
+        client.portal.call(watch)
+        assert client.get("/subscriptions/missing/events").status_code == 404
+
+
+def test_idle_stream_picks_up_changes_made_by_other_workers():
+    with TestClient(main.app) as client:
+        _seed_subscription(client, "sub_elsewhere")
+
+        async def watch():
+            request = _Request()
+            frames = event_stream.stream(
+                main.event_hub, "subscription", Subscription, "sub_elsewhere", request, heartbeat=0.05
+            )
+            await frames.__anext__()
+            assert await frames.__anext__() == b": keep-alive\n\n"
+
+            # Another worker activates it; nothing is published in this one.
+            async with payment_db._sessionmaker() as session:
+                await session.execute(
+                    update(Subscription)
+                    .where(Subscription.id == "sub_elsewhere")
+                    .values(status="active")
+                )
+                await session.commit()
+            event = await frames.__anext__()
+            assert event.startswith(b"id: 1\nevent: status\n")
+            assert b'"status":"active"' in event
+            assert await frames.__anext__() == b": keep-alive\n\n"
+            await frames.aclose()
+
+        client.portal.call(watch)
+
+
+def test_razorpay_verification_publishes_status_change(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    with TestClient(main.app) as client:
+        _seed_subscription(client, "sub_verify")
+
+        with main.event_hub.subscribe("subscription:sub_verify") as queue:
+            resp = client.post(
+                "/razorpay/verify-payment",
+                json={
+                    "razorpay_payment_id": "pay_1",
+                    "razorpay_subscription_id": "rzp_sub_verify",
+                    "razorpay_signature": "valid",
+                    "subscription_id": "sub_verify",
+                },
+            )
+            assert resp.status_code == 200
+            message = queue.get_nowait()
+        assert message["event_type"] == "payment.subscription.updated"
+        assert message["data"] == {"subscription_id": "sub_verify", "status": "active"}
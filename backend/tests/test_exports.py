@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, PaymentStatus, Subscription
+
+from main import app
+
+
+def _seed_payments(client):
+    async def seed():
+        base = datetime(2023, 3, 1)
+        async with payment_db._sessionmaker() as session:
+            for i in range(5):
+                session.add(
+                    Payment(
+                        customer_id="cust_export",
+                        provider="stripe",
+                        provider_payment_id=f"pi_export_{i}",
+                        amount=10.0 + i,
+                        currency="USD",
+                        status=PaymentStatus.COMPLETED if i % 2 == 0 else PaymentStatus.FAILED,
+                        meta_info={"description": f"export {i}"},
+                        created_at=base + timedelta(days=i),
+                    )
+                )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def _seed_subscriptions(client):
+    async def seed():
+        base = datetime(2023, 4, 1)
+        async with payment_db._sessionmaker() as session:
+            for i in range(4):
+                session.add(
+                    Subscription(
+                        customer_id="cust_sub_export",
+                        plan_id="plan_export",
+                        provider="payu",
+                        provider_subscription_id=f"sub_export_{i}",
+                        status="active",
+                        quantity=1,
+                        meta_info={"provider_data": {"mandate": f"m{i}"}},
+                        created_at=base + timedelta(days=i),
+                    )
+                )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def test_payment_exports_stream_filtered_rows():
+    with TestClient(app) as client:
+        _seed_payments(client)
+        params = {"customer_id": "cust_export"}
+
+        resp = client.get("/payments/export", params=params)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [row["provider_payment_id"] for row in rows] == [f"pi_export_{i}" for i in range(5)]
+
+        resp = client.get(
+            "/payments/export",
+            params={
+                **params,
+                "format": "csv",
+                "status": "completed",
+                "created_from": "2023-03-02T00:00:00",
+            },
+        )
+        assert resp.status_code == 200
+        records = list(csv.DictReader(io.StringIO(resp.text)))
+        assert [r["provider_payment_id"] for r in records] == ["pi_export_2", "pi_export_4"]
+        assert json.loads(records[0]["meta_info"]) == {"description": "export 2"}
+
+
+def test_subscription_exports_stream_rows_within_the_created_bounds():
+    with TestClient(app) as client:
+        _seed_subscriptions(client)
+        params = {"customer_id": "cust_sub_export"}
+
+        resp = client.get("/subscriptions/export", params=params)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [row["provider_subscription_id"] for row in rows] == [
+            f"sub_export_{i}" for i in range(4)
+        ]
+
+        bounds = {"created_from": "2023-04-02T00:00:00", "created_to": "2023-04-04T00:00:00"}
+        resp = client.get("/subscriptions/export", params={**params, **bounds})
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [row["provider_subscription_id"] for row in rows] == ["sub_export_1", "sub_export_2"]
+
+        resp = client.get("/subscriptions/export", params={**params, **bounds, "format": "csv"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert resp.headers["content-disposition"] == 'attachment; filename="subscriptions.csv"'
+        records = list(csv.DictReader(io.StringIO(resp.text)))
+        assert [r["provider_subscription_id"] for r in records] == ["sub_export_1", "sub_export_2"]
+        assert json.loads(records[0]["provider_data"]) == {"mandate": "m1"}
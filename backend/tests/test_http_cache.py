@@ -0,0 +1,84 @@
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Customer, Subscription
+
+import main
+from http_cache import etag_matches
+from stub_providers import StubProvider
+
+
+def test_etag_matching_uses_weak_comparison():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_provider_catalog_is_served_from_cache_with_etag():
+    client = TestClient(main.app)
+    first = client.get("/providers")
+    assert first.status_code == 200
+    assert first.json() == main._provider_catalog()
+    etag = first.headers["etag"]
+
+    cached = client.get("/providers", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    main.invalidate_provider_catalog()
+    again = client.get("/providers", headers={"If-None-Match": etag})
+    # Same config, so the rebuilt catalog has the same ETag.
+    assert again.status_code == 304
+
+
+def test_single_resource_gets_revalidate_with_weak_etags(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+
+    async def seed():
+        async with payment_db._sessionmaker() as session:
+            session.add(Customer(id="cust_etag", email="etag@example.com"))
+            session.add(
+                Subscription(
+                    id="sub_etag",
+                    customer_id="cust_etag",
+                    plan_id="plan_etag",
+                    provider="stripe",
+                    provider_subscription_id="sub_stripe_etag",
+                    status="pending",
+                )
+            )
+            await session.commit()
+
+    async def rename():
+        async with payment_db._sessionmaker() as session:
+            customer = await session.get(Customer, "cust_etag")
+            customer.name = "Renamed"
+            await session.commit()
+
+    with TestClient(main.app) as client:
+        client.portal.call(seed)
+        for path in ("/customers/cust_etag", "/subscriptions/sub_etag"):
+            first = client.get(path)
+            assert first.status_code == 200
+            etag = first.headers["etag"]
+            assert etag.startswith('W/"')
+
+            calls = dict(stub.calls)
+            cached = client.get(path, headers={"If-None-Match": etag})
+            assert cached.status_code == 304
+            assert cached.headers["etag"] == etag
+            # The 304 is answered from the version lookup alone.
+            assert stub.calls == calls
+
+        etag = client.get("/customers/cust_etag").headers["etag"]
+        client.portal.call(rename)
+        changed = client.get("/customers/cust_etag", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.json()["name"] == "Renamed"
+        assert changed.headers["etag"] != etag
+
+        assert client.get("/subscriptions/missing").status_code == 404
@@ -0,0 +1,109 @@
+import asyncio
+import socket
+from urllib.parse import parse_qsl
+
+import httpx
+import uvicorn
+
+from fastapi_payments.providers.payu import PayUProvider
+
+import main
+from http_clients import ProviderHTTPClients
+
+SETTINGS = {
+    "max_connections": 1,
+    "max_keepalive_connections": 1,
+    "keepalive_expiry": 60,
+    "http2": False,
+    "timeout": 5,
+    "connect_timeout": 5,
+    "pool_timeout": 5,
+}
+
+
+def test_payu_si_requests_go_through_the_shared_client(monkeypatch):
+    sent = []
+
+    def handler(request):
+        sent.append(dict(parse_qsl(request.content.decode())))
+        return httpx.Response(200, json={"status": 1})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(main.http_clients._clients, "payu", client)
+    provider = PayUProvider({"api_key": "key", "api_secret": "salt", "sandbox_mode": True})
+
+    async def call_twice():
+        first = await provider._make_si_api_request("pre_debit_SI", {"var1": "mandate_1"})
+        second = await provider._make_si_api_request("si_transaction", {"var1": "mandate_1"})
+        return first, second
+
+    assert asyncio.run(call_twice()) == ({"status": 1}, {"status": 1})
+    assert main.http_clients.get("payu") is client
+    assert [payload["command"] for payload in sent] == ["pre_debit_SI", "si_transaction"]
+    assert sent[0]["hash"] == provider._sign_si_request("pre_debit_SI", "mandate_1")
+
+
+def test_payu_transactions_are_verified_by_txnid(monkeypatch):
+    sent = []
+
+    def handler(request):
+        payload = dict(parse_qsl(request.content.decode()))
+        sent.append(payload)
+        details = {"mihpayid": "403993715", "status": "success"}
+        if payload["var1"] == "txn_missing":
+            details = {"mihpayid": "Not Found", "status": "Not Found"}
+        return httpx.Response(200, json={"status": 1, "transaction_details": {payload["var1"]: details}})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(main.http_clients._clients, "payu", client)
+    provider = PayUProvider({"api_key": "key", "api_secret": "salt", "sandbox_mode": True})
+
+    async def verify_both():
+        return [await provider.verify_transaction(t) for t in ("txn_taken", "txn_missing")]
+
+    taken, missing = asyncio.run(verify_both())
+    assert taken == {"txnid": "txn_taken", "status": "success", "provider_payment_id": "403993715"}
+    assert missing == {"txnid": "txn_missing", "status": "not found", "provider_payment_id": None}
+    assert sent[0]["command"] == "verify_payment"
+    assert sent[0]["hash"] == provider._sign_si_request("verify_payment", "txn_taken")
+
+
+def test_pool_stats_report_active_idle_and_waiting_connections():
+    release = asyncio.Event()
+    entered = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        entered.set()
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def run():
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        url = "http://%s:%d/" % sock.getsockname()
+        server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        clients = ProviderHTTPClients(**SETTINGS)
+        try:
+            while not server.started:
+                await asyncio.sleep(0.01)
+            client = clients.get("payu")
+            calls = [asyncio.create_task(client.get(url)) for _ in range(2)]
+            await entered.wait()
+            await asyncio.sleep(0.05)
+            busy = clients.pool_stats()
+            release.set()
+            await asyncio.gather(*calls)
+            return busy, clients.pool_stats()
+        finally:
+            await clients.aclose()
+            server.should_exit = True
+            await serving
+
+    busy, settled = asyncio.run(run())
+    assert busy == {"payu": {"active": 1, "idle": 0, "waiting": 1}}
+    # Both calls used the one kept-alive connection.
+    assert settled == {"payu": {"active": 0, "idle": 1, "waiting": 0}}
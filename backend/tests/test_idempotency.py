@@ -0,0 +1,231 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+
+import main
+from idempotency import IdempotencyStore, fingerprint
+from models import IdempotencyRecord
+from stub_providers import StubProvider
+
+
+def _customer(client):
+    resp = client.post("/customers", json={"email": "idempotent@example.com"})
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+def test_retried_payment_replays_stored_response(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    with TestClient(main.app) as client:
+        body = {"amount": 25.0, "currency": "USD", "customer_id": _customer(client)}
+        headers = {"Idempotency-Key": "retry-1"}
+
+        first = client.post("/payments", json=body, headers=headers)
+        retry = client.post("/payments", json=body, headers=headers)
+        assert first.status_code == retry.status_code == 200
+        assert retry.content == first.content
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert stub.calls["process_payment"] == 1
+
+        conflict = client.post("/payments", json=dict(body, amount=26.0), headers=headers)
+        assert conflict.status_code == 422
+
+        assert client.post("/payments", json=body).json()["id"] != first.json()["id"]
+        assert stub.calls["process_payment"] == 2
+
+
+def test_concurrent_duplicates_wait_for_the_first_request(monkeypatch):
+    stub = StubProvider("payu", latency=0.1)
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    body = {"mandate_token": "mandate_1", "amount": 499.0, "txnid": "txn_concurrent"}
+
+    async def burst():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(
+                *(
+                    http.post("/payu/si-transaction", json=body, headers={"Idempotency-Key": "si-1"})
+                    for _ in range(5)
+                )
+            )
+
+    with TestClient(main.app) as client:
+        responses = client.portal.call(burst)
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert len({r.json()["provider_payment_id"] for r in responses}) == 1
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+    assert stub.calls["si_transaction"] == 1
+    assert stub.max_in_flight == 1
+
+
+def test_failed_request_releases_key(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    with TestClient(main.app) as client:
+        body = {"amount": 5.0, "currency": "USD", "customer_id": "missing-customer"}
+        headers = {"Idempotency-Key": "fails-1"}
+        assert client.post("/payments", json=body, headers=headers).status_code == 400
+
+        body["customer_id"] = _customer(client)
+        # The failed attempt was not stored, so the key is free for a retry
+        # with a corrected body.
+        assert client.post("/payments", json=body, headers=headers).status_code == 200
+
+
+def test_retry_takes_over_the_key_of_a_request_that_died(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    with TestClient(main.app) as client:
+        body = {"amount": 15.0, "currency": "USD", "customer_id": _customer(client)}
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        async def orphaned_claim():
+            # What a worker killed mid-request leaves behind.
+            async with payment_db._sessionmaker() as session:
+                session.add(
+                    IdempotencyRecord(
+                        key="POST /payments:crashed-1",
+                        fingerprint=fingerprint(body),
+                        status="in_progress",
+                        created_at=now - timedelta(minutes=5),
+                        expires_at=now + timedelta(hours=23),
+                        locked_by="dead-worker",
+                        locked_until=now - timedelta(minutes=4),
+                    )
+                )
+                await session.commit()
+
+        client.portal.call(orphaned_claim)
+        resp = client.post("/payments", json=body, headers={"Idempotency-Key": "crashed-1"})
+        assert resp.status_code == 200
+        assert "idempotent-replayed" not in resp.headers
+        assert stub.calls["process_payment"] == 1
+        replay = client.post("/payments", json=body, headers={"Idempotency-Key": "crashed-1"})
+        assert replay.headers["idempotent-replayed"] == "true"
+
+
+def test_running_request_keeps_its_claim_past_the_lock_period(monkeypatch):
+    stub = StubProvider("payu", latency=0.5)
+    monkeypatch.setitem(payment_deps._payment_service.providers, "payu", stub)
+    monkeypatch.setattr(main.idempotency_store, "lock", timedelta(seconds=0.15))
+    body = {"mandate_token": "mandate_1", "amount": 499.0, "txnid": "txn_renewed"}
+
+    async def slow_then_duplicate():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            first = asyncio.create_task(
+                http.post("/payu/si-transaction", json=body, headers={"Idempotency-Key": "si-renew"})
+            )
+            await asyncio.sleep(0.3)
+            duplicate = await http.post(
+                "/payu/si-transaction", json=body, headers={"Idempotency-Key": "si-renew"}
+            )
+            return await first, duplicate
+
+    with TestClient(main.app) as client:
+        first, duplicate = client.portal.call(slow_then_duplicate)
+
+    assert first.status_code == duplicate.status_code == 200
+    assert duplicate.headers["idempotent-replayed"] == "true"
+    assert stub.calls["si_transaction"] == 1
+
+
+def _store(lock_seconds=30.0):
+    return IdempotencyStore(
+        ttl_seconds=3600, wait_timeout=1.0, lock_seconds=lock_seconds, purge_interval=3600
+    )
+
+
+async def _record(key):
+    async with payment_db._sessionmaker() as session:
+        return await session.get(IdempotencyRecord, key)
+
+
+def test_claim_renewal_survives_a_failed_renewal(monkeypatch):
+    store = _store(lock_seconds=0.15)
+    sessions = payment_db._sessionmaker
+    fail_next = []
+
+    def flaky_sessions():
+        if fail_next:
+            fail_next.pop()
+            raise OperationalError("UPDATE idempotency_keys", {}, Exception("database is locked"))
+        return sessions()
+
+    monkeypatch.setattr(payment_db, "_sessionmaker", flaky_sessions)
+
+    async def handler():
+        fail_next.append(True)
+        # Long enough for the failed renewal and a claim period after it.
+        await asyncio.sleep(0.4)
+        record = await _record("test:renew-flaky")
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return {"renewed": not fail_next and record.locked_until > now}
+
+    with TestClient(main.app) as client:
+        resp = client.portal.call(store.run, "renew-flaky", "test", {}, handler)
+    assert resp.body == b'{"renewed":true}'
+
+
+def test_unencodable_response_is_replayed_as_an_error_not_rerun():
+    store = _store()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"charge": object()}
+
+    with TestClient(main.app) as client:
+        with pytest.raises(TypeError):
+            client.portal.call(store.run, "unencodable", "test", {}, handler)
+        replay = client.portal.call(store.run, "unencodable", "test", {}, handler)
+    assert replay.status_code == 500
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert calls == [1]
+
+
+def test_finishing_request_leaves_the_takeover_request_in_flight():
+    store = _store()
+    takeover_running = asyncio.Event()
+    release_takeover = asyncio.Event()
+    takeovers = []
+
+    async def takeover():
+        takeover_running.set()
+        await release_takeover.wait()
+        return {"by": "takeover"}
+
+    async def stalled():
+        # This request's claim lapses, as if its renewals had stopped, and a
+        # retry in the same worker takes the key over.
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.key == "test:overlap")
+                .values(locked_until=datetime(2000, 1, 1))
+            )
+            await session.commit()
+        takeovers.append(asyncio.create_task(store.run("overlap", "test", {}, takeover)))
+        await takeover_running.wait()
+        return {"by": "stalled"}
+
+    async def overlap():
+        first = await store.run("overlap", "test", {}, stalled)
+        release_takeover.set()
+        return first, await takeovers[0]
+
+    with TestClient(main.app) as client:
+        first, second = client.portal.call(overlap)
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert second.body == b'{"by":"takeover"}'
+    assert store._inflight == {}
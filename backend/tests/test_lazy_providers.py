@@ -0,0 +1,58 @@
+import threading
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.messaging.publishers import PaymentEventPublisher
+from fastapi_payments.services.payment_service import PaymentService
+
+import main
+from patches.providers import LazyProvider
+
+
+class _Provider:
+    def __init__(self, config):
+        self.config = config
+
+    def verify_payment_signature(self, **kwargs):
+        return True
+
+
+def test_provider_is_built_once_on_first_use():
+    builds = []
+    gate = threading.Event()
+
+    def factory(name, config):
+        gate.wait()
+        builds.append(name)
+        return _Provider(config)
+
+    provider = LazyProvider("razorpay", {"api_key": "k"}, factory)
+    assert not provider.loaded and builds == []
+
+    threads = [
+        threading.Thread(target=lambda: provider.verify_payment_signature()) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert builds == ["razorpay"]
+    assert provider.loaded
+    assert provider.config == {"api_key": "k"}
+
+
+def test_payment_service_defers_provider_construction():
+    service = PaymentService(
+        main.payments_config, PaymentEventPublisher(main.payments_config.messaging)
+    )
+    providers = list(service.providers.values())
+    assert providers and all(isinstance(p, LazyProvider) for p in providers)
+    assert not any(p.loaded for p in providers)
+
+    # Only the provider that is used gets built.
+    service.get_provider("stripe").initialize
+    assert service.providers["stripe"].loaded
+    assert not any(p.loaded for name, p in service.providers.items() if name != "stripe")
+
+    assert isinstance(payment_deps._payment_service.providers["stripe"], LazyProvider)
@@ -0,0 +1,64 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+import logging_setup
+import main
+
+
+def test_json_records_carry_request_id_and_extra_fields():
+    record = logging.makeLogRecord(
+        {"name": "demo", "levelno": logging.INFO, "levelname": "INFO", "msg": "hello %s", "args": ("x",)}
+    )
+    record.request_id = "req-1"
+    record.subscription_id = "sub_1"
+    entry = json.loads(logging_setup.JsonFormatter().format(record))
+    assert entry["message"] == "hello x"
+    assert entry["request_id"] == "req-1"
+    assert entry["subscription_id"] == "sub_1"
+
+
+def test_request_id_is_echoed_and_bound_to_log_records():
+    seen = []
+
+    @main.app.get("/_test/log-request-id", include_in_schema=False)
+    async def _emit():
+        seen.append(logging_setup.request_id_var.get())
+        return {}
+
+    try:
+        with TestClient(main.app) as client:
+            given = client.get("/_test/log-request-id", headers={"X-Request-ID": "abc123"})
+            generated = client.get("/_test/log-request-id")
+    finally:
+        main.app.router.routes.pop()
+
+    assert given.headers["x-request-id"] == "abc123"
+    assert len(generated.headers["x-request-id"]) == 32
+    assert seen == ["abc123", generated.headers["x-request-id"]]
+    assert logging_setup.request_id_var.get() == "-"
+
+
+def test_payload_logs_are_sampled(monkeypatch, caplog):
+    caplog.set_level(logging.INFO, logger=logging_setup.PAYLOAD_LOGGER)
+    monkeypatch.setattr(logging_setup, "_payload_sample_rate", 0.0)
+    logging_setup.log_payload("dropped", meta_info={"a": 1})
+    monkeypatch.setattr(logging_setup, "_payload_sample_rate", 1.0)
+    logging_setup.log_payload("kept", meta_info={"a": 1})
+    assert [r.getMessage() for r in caplog.records] == ["kept"]
+    assert caplog.records[0].payload == {"meta_info": {"a": 1}}
+
+
+def test_only_library_payload_dumps_are_sampled():
+    sampler = logging_setup.SamplingFilter(0.0, ("Plan meta_info: ",))
+
+    def record(level, msg):
+        return logging.makeLogRecord(
+            {"name": "fastapi_payments.services.payment_service", "levelno": level, "msg": msg}
+        )
+
+    assert not sampler.filter(record(logging.INFO, "Plan meta_info: {'a': 1}"))
+    assert sampler.filter(record(logging.INFO, "Creating product with provider_name=stripe"))
+    assert sampler.filter(record(logging.WARNING, "Plan meta_info: {'a': 1}"))
+    assert sampler.filter(record(logging.ERROR, "Provider call failed"))
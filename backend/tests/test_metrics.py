@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+
+import main
+import metrics
+from stub_providers import StubProvider
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "/x")
+    lines = list(histogram.render())
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_sum{route="/x"} 4.05' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+
+
+def test_metrics_split_route_service_provider_and_db_time(monkeypatch):
+    stub = StubProvider("stripe")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "stripe", stub)
+    with TestClient(main.app) as client:
+        created = client.post("/customers", json={"email": "metrics@example.com"})
+        assert created.status_code == 200
+        assert client.get(f"/customers/{created.json()['id']}").status_code == 200
+
+        resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/customers/{customer_id}",status="200"}'
+        in body
+    )
+    assert 'payment_service_duration_seconds_count{method="create_customer"}' in body
+    assert (
+        'payment_provider_duration_seconds_count{provider="stripe",method="create_customer",outcome="ok"}'
+        in body
+    )
+    assert 'db_query_duration_seconds_count{statement="INSERT"}' in body
+    assert stub.calls["create_customer"] == 1
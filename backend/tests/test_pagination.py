@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Customer
+from fastapi_payments.db.repositories.customer_repository import CustomerRepository
+
+from main import app
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, list_customers
+
+
+def _seed_customers(client, count):
+    async def seed():
+        base = datetime(2024, 1, 1)
+        async with payment_db._sessionmaker() as session:
+            for i in range(count):
+                # Pairs share a timestamp so the id tie-breaker is exercised.
+                session.add(
+                    Customer(
+                        email=f"pagetest-{i}@example.com",
+                        name=f"Page Test {i}",
+                        created_at=base + timedelta(minutes=i // 2),
+                    )
+                )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created_at, "abc")) == (created_at, "abc")
+
+
+def test_cursor_pages_cover_every_row_once():
+    with TestClient(app) as client:
+        _seed_customers(client, 7)
+
+        seen = []
+        params = {"limit": 3, "search": "pagetest"}
+        while True:
+            resp = client.get("/customers", params=params)
+            assert resp.status_code == 200
+            seen.extend(customer["id"] for customer in resp.json())
+            next_cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+            if not next_cursor:
+                break
+            params["cursor"] = next_cursor
+
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+
+        # Offset paging is still served for existing clients.
+        legacy = client.get("/customers", params={"limit": 3, "offset": 3, "search": "pagetest"})
+        assert legacy.status_code == 200
+        assert len(legacy.json()) == 3
+        assert {c["id"] for c in legacy.json()} <= set(seen)
+
+
+def test_invalid_cursor_requests_are_rejected():
+    with TestClient(app) as client:
+        assert client.get("/payments", params={"cursor": "not-a-cursor"}).status_code == 400
+        cursor = encode_cursor(datetime(2024, 1, 1), "x")
+        assert client.get("/payments", params={"cursor": cursor, "offset": 5}).status_code == 400
+
+
+def test_rows_inserted_by_one_process_keep_their_insertion_order():
+    with TestClient(app) as client:
+
+        async def create_two():
+            async with payment_db._sessionmaker() as session:
+                repo = CustomerRepository(session)
+                first = await repo.create(email="order-first@example.com")
+                second = await repo.create(email="order-second@example.com")
+                page = await list_customers(session, default_provider="stripe", limit=100)
+                return first, second, [customer["id"] for customer in page.items]
+
+        first, second, listed = client.portal.call(create_two)
+
+    assert first.created_at < second.created_at
+    # Newest first.
+    assert listed.index(second.id) < listed.index(first.id)
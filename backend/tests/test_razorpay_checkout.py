@@ -0,0 +1,140 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, PaymentStatus, Subscription
+
+import main
+from stub_providers import StubProvider
+
+
+def _seed_payment(client, payment_id):
+    async def seed():
+        async with payment_db._sessionmaker() as session:
+            session.add(
+                Payment(
+                    id=payment_id,
+                    customer_id="cust_checkout",
+                    amount=499.0,
+                    currency="INR",
+                    status=PaymentStatus.PENDING,
+                    provider="razorpay",
+                    meta_info={"description": "Checkout test"},
+                    updated_at=datetime(2024, 1, 1),
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def _seed_subscription(client, subscription_id):
+    async def seed():
+        async with payment_db._sessionmaker() as session:
+            session.add(
+                Subscription(
+                    id=subscription_id,
+                    customer_id="cust_checkout",
+                    plan_id="plan_checkout",
+                    provider="razorpay",
+                    provider_subscription_id=f"rzp_{subscription_id}",
+                    status="pending",
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def _load_payment(client, payment_id):
+    async def load():
+        async with payment_db._sessionmaker() as session:
+            return await session.get(Payment, payment_id)
+
+    return client.portal.call(load)
+
+
+def _verify(client, signature, **ids):
+    return client.post(
+        "/razorpay/verify-payment",
+        json={
+            "razorpay_payment_id": "pay_checkout",
+            "razorpay_order_id": "order_checkout",
+            "razorpay_signature": signature,
+            **ids,
+        },
+    )
+
+
+def test_verified_payment_is_completed_in_one_update(monkeypatch):
+    monkeypatch.setitem(payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay"))
+    with TestClient(main.app) as client:
+        _seed_payment(client, "pay_verify_ok")
+
+        resp = _verify(client, "valid", payment_id="pay_verify_ok")
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["verified"] is True
+        assert body["payment"]["id"] == "pay_verify_ok"
+        assert body["payment"]["status"] == "completed"
+        assert body["payment"]["description"] == "Checkout test"
+        stored = _load_payment(client, "pay_verify_ok")
+        assert stored.status == PaymentStatus.COMPLETED
+        # ETags depend on updated_at, so the Core UPDATE has to move it too.
+        assert stored.updated_at > datetime(2024, 1, 1)
+
+        assert _verify(client, "valid", payment_id="pay_missing").json() == {"verified": True}
+
+
+def test_rejected_signature_leaves_the_payment_pending(monkeypatch):
+    monkeypatch.setitem(payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay"))
+    with TestClient(main.app) as client:
+        _seed_payment(client, "pay_verify_bad")
+
+        assert _verify(client, "forged", payment_id="pay_verify_bad").status_code == 400
+        assert _load_payment(client, "pay_verify_bad").status == PaymentStatus.PENDING
+
+
+def test_batch_verifies_each_item_and_applies_changes_together(monkeypatch):
+    stub = StubProvider("razorpay")
+    monkeypatch.setitem(payment_deps._payment_service.providers, "razorpay", stub)
+    with TestClient(main.app) as client:
+        _seed_payment(client, "pay_batch_ok")
+        _seed_payment(client, "pay_batch_forged")
+        _seed_subscription(client, "sub_batch_ok")
+        item = {"razorpay_payment_id": "pay_rzp", "razorpay_order_id": "order_rzp"}
+        items = [
+            {**item, "razorpay_signature": "valid", "payment_id": "pay_batch_ok"},
+            {**item, "razorpay_signature": "forged", "payment_id": "pay_batch_forged"},
+            {**item, "razorpay_signature": "valid", "subscription_id": "sub_batch_ok", "payment_id": "pay_batch_forged"},
+            {**item, "razorpay_signature": "valid", "payment_id": "pay_batch_missing"},
+        ]
+
+        resp = client.post("/razorpay/verify-payment/batch", json={"items": items})
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert (body["verified"], body["failed"]) == (3, 1)
+        results = body["results"]
+        assert [r["index"] for r in results] == [0, 1, 2, 3]
+        assert results[0]["payment"]["status"] == "completed"
+        assert results[1] == {"index": 1, "verified": False, "error": "Razorpay signature verification failed"}
+        assert results[2]["subscription"]["status"] == "active"
+        assert "payment" not in results[2]
+        assert results[3] == {"index": 3, "verified": True}
+        assert stub.calls["verify_payment_signature"] == 4
+
+        assert _load_payment(client, "pay_batch_ok").status == PaymentStatus.COMPLETED
+        # Neither the forged item nor the subscription item touch this payment.
+        assert _load_payment(client, "pay_batch_forged").status == PaymentStatus.PENDING
+
+
+def test_verify_batch_size_is_capped(monkeypatch):
+    monkeypatch.setitem(main.razorpay_verify_batch_config, "max_items", 2)
+    with TestClient(main.app) as client:
+        item = {"razorpay_payment_id": "pay_rzp", "razorpay_order_id": "order_rzp", "razorpay_signature": "valid"}
+        resp = client.post("/razorpay/verify-payment/batch", json={"items": [item] * 3})
+        assert resp.status_code == 413
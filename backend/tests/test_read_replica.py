@@ -0,0 +1,113 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, PaymentStatus, Plan, PricingModel
+
+import main
+import pagination
+import read_replica
+from models import ensure_schema
+from patches import PLAN_PAGE
+
+
+def _replica(monkeypatch, url):
+    replica = read_replica.ReadReplica({**main.payment_settings["database"], "replica_url": url})
+    monkeypatch.setattr(main, "replica", replica)
+    return replica
+
+
+def _seed_payment(client, sessions, payment_id, customer_id):
+    async def seed():
+        async with sessions() as session:
+            session.add(
+                Payment(
+                    id=payment_id,
+                    customer_id=customer_id,
+                    amount=25.0,
+                    currency="USD",
+                    status=PaymentStatus.COMPLETED,
+                    provider="stripe",
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def _seed_plan(client, sessions, plan_id):
+    async def seed():
+        async with sessions() as session:
+            session.add(
+                Plan(
+                    id=plan_id,
+                    product_id="prod_replica",
+                    name=plan_id,
+                    pricing_model=PricingModel.SUBSCRIPTION,
+                    amount=99.0,
+                    currency="INR",
+                )
+            )
+            await session.commit()
+
+    client.portal.call(seed)
+
+
+def _listed(client, customer_id, **headers):
+    resp = client.get("/payments", params={"customer_id": customer_id}, headers=headers)
+    assert resp.status_code == 200
+    return [payment["id"] for payment in resp.json()]
+
+
+def test_reads_go_to_the_replica_unless_the_primary_is_asked_for(tmp_path, monkeypatch):
+    replica = _replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    with TestClient(main.app) as client:
+        client.portal.call(ensure_schema, replica.engine)
+        # The two files stand in for a primary and a replica that has not
+        # caught up yet, so each holds a row the other lacks.
+        _seed_payment(client, payment_db._sessionmaker, "pay_on_primary", "cust_replica")
+        _seed_payment(client, replica._sessionmaker, "pay_on_replica", "cust_replica")
+
+        assert _listed(client, "cust_replica") == ["pay_on_replica"]
+        assert _listed(client, "cust_replica", **{"X-Read-Primary": "1"}) == ["pay_on_primary"]
+        exported = client.get("/payments/export", params={"customer_id": "cust_replica"})
+        assert [json.loads(line)["id"] for line in exported.text.splitlines()] == ["pay_on_replica"]
+
+
+def test_unreachable_replica_falls_back_to_the_primary(tmp_path, monkeypatch):
+    # SQLite cannot create a file in a directory that does not exist.
+    replica = _replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    sessions = replica._sessionmaker
+    opened = []
+    monkeypatch.setattr(replica, "_sessionmaker", lambda: opened.append(1) or sessions())
+    with TestClient(main.app) as client:
+        _seed_payment(client, payment_db._sessionmaker, "pay_fallback", "cust_fallback")
+
+        assert _listed(client, "cust_fallback") == ["pay_fallback"]
+        assert _listed(client, "cust_fallback") == ["pay_fallback"]
+        # The second request did not try the replica again.
+        assert len(opened) == 1
+
+
+def test_replica_reads_do_not_fill_the_catalog_cache(tmp_path, monkeypatch):
+    replica = _replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    with TestClient(main.app) as client:
+        client.portal.call(ensure_schema, replica.engine)
+        _seed_plan(client, payment_db._sessionmaker, "plan_on_primary")
+        _seed_plan(client, replica._sessionmaker, "plan_on_replica")
+        page_key = (PLAN_PAGE, "prod_replica", 50, None)
+
+        def plans(**headers):
+            resp = client.get("/products/prod_replica/plans", headers=headers)
+            assert resp.status_code == 200
+            return [plan["id"] for plan in resp.json()]
+
+        assert plans() == ["plan_on_replica"]
+        assert main.catalog_cache.get(page_key) is None
+
+        # A request that asked for the primary skips whatever is cached.
+        main.catalog_cache.set(page_key, pagination.Page(items=[], next_cursor=None))
+        assert plans(**{"X-Read-Primary": "1"}) == ["plan_on_primary"]
+        # Primary reads may fill the cache, which later replica reads serve.
+        assert plans() == ["plan_on_primary"]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import random
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_payments.db.models import Payment, PaymentStatus
+
+import reconciliation
+from models import ensure_schema
+
+# (provider_payment_id, status, amount, currency, created_at day in May 2024)
+LOCAL = [
+    ("order_match", PaymentStatus.COMPLETED, 499.0, "INR", 3),
+    ("order_amount", PaymentStatus.COMPLETED, 100.0, "INR", 4),
+    ("order_pending", PaymentStatus.PENDING, 250.0, "INR", 5),
+    ("order_unsettled", PaymentStatus.COMPLETED, 75.0, "INR", 6),
+    ("order_failed", PaymentStatus.FAILED, 30.0, "INR", 7),
+    ("order_before_period", PaymentStatus.COMPLETED, 45.0, "INR", 1),
+    ("order_twice", PaymentStatus.COMPLETED, 10.0, "INR", 8),
+    ("order_usd", PaymentStatus.COMPLETED, 20.0, "USD", 9),
+]
+
+SETTLEMENT = [
+    "entity_id,type,order_id,amount,currency,settlement_id",
+    "pay_1,payment,order_match,499.00,INR,setl_1",
+    "rfnd_1,refund,order_match,499.00,INR,setl_1",
+    "pay_2,payment,order_amount,90.00,INR,setl_1",
+    "pay_3,payment,order_pending,250,INR,setl_1",
+    "pay_4,payment,order_twice,10.00,INR,setl_1",
+    "pay_5,payment,order_twice,10.00,INR,setl_2",
+    "pay_6,payment,order_unknown,60.00,INR,setl_2",
+    "pay_7,payment,order_usd,20.00,INR,setl_2",
+    "pay_8,payment,order_garbled,n/a,INR,setl_2",
+]
+
+
+def _seed(url):
+    async def seed():
+        engine = create_async_engine(url)
+        await ensure_schema(engine)
+        async with sessionmaker(engine, class_=AsyncSession)() as session:
+            session.add_all(
+                Payment(
+                    customer_id="cust_recon",
+                    provider="razorpay",
+                    provider_payment_id=key,
+                    status=status,
+                    amount=amount,
+                    currency=currency,
+                    created_at=datetime(2024, 5, day),
+                )
+                for key, status, amount, currency, day in LOCAL
+            )
+            # Same id at another provider; never compared with Razorpay's report.
+            session.add(
+                Payment(
+                    customer_id="cust_recon",
+                    provider="stripe",
+                    provider_payment_id="order_unknown",
+                    status=PaymentStatus.COMPLETED,
+                    amount=60.0,
+                    currency="INR",
+                    created_at=datetime(2024, 5, 10),
+                )
+            )
+            await session.commit()
+        await engine.dispose()
+
+    asyncio.run(seed())
+
+
+def test_external_sort_merges_spilled_runs(tmp_path):
+    rng = random.Random(7)
+    rows = [(f"order_{rng.randrange(10**6):06d}", i) for i in range(1000)]
+
+    merged = list(reconciliation.external_sort(iter(rows), run_rows=64, tmp_dir=str(tmp_path)))
+
+    assert [row[0] for row in merged] == sorted(row[0] for row in rows)
+    assert sorted(merged) == sorted(rows)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reconciliation_reports_drift_between_settlement_and_payments(tmp_path, monkeypatch):
+    url = f"sqlite+aiosqlite:///{tmp_path}/recon.db"
+    _seed(url)
+    settlement = tmp_path / "settlement.csv"
+    # Out of order, as exports usually are.
+    settlement.write_text("\n".join([SETTLEMENT[0], *reversed(SETTLEMENT[1:])]) + "\n")
+    report = tmp_path / "mismatches.ndjson"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("RECONCILIATION_TMP_DIR", str(tmp_path))
+
+    status = reconciliation.main(
+        [
+            "razorpay",
+            str(settlement),
+            "--output",
+            str(report),
+            "--created-from",
+            "2024-05-02",
+            "--sort-run-rows",
+            "2",
+        ]
+    )
+
+    assert status == 1
+    mismatches = [json.loads(line) for line in report.read_text().splitlines()]
+    by_kind = {}
+    for mismatch in mismatches:
+        by_kind.setdefault(mismatch["kind"], []).append(mismatch)
+    assert {kind: [m["provider_payment_id"] for m in found] for kind, found in by_kind.items()} == {
+        "invalid_row": [None],
+        "amount_mismatch": ["order_amount"],
+        "status_mismatch": ["order_pending"],
+        "duplicate": ["order_twice"],
+        "missing_locally": ["order_unknown"],
+        "missing_in_settlement": ["order_unsettled"],
+        "currency_mismatch": ["order_usd"],
+    }
+    amount = by_kind["amount_mismatch"][0]
+    assert (amount["local_amount"], amount["settled_amount"], amount["local_status"]) == (100.0, 90.0, "completed")
+    assert by_kind["invalid_row"][0]["settlement_line"] == 2
+    assert by_kind["duplicate"][0]["settlement_rows"] == 2
+    # Only the spilled runs' directory was created, and it is gone.
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["mismatches.ndjson", "recon.db", "settlement.csv"]
@@ -0,0 +1,51 @@
+import json
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+
+import main
+from schemas import CustomerResponse, SubscriptionResponse
+
+
+def _validated(model, payloads):
+    return jsonable_encoder(parse_obj_as(List[model], payloads))
+
+
+def test_serializer_matches_response_model_output():
+    customers = [
+        {
+            "id": "cust_1",
+            "email": "a@example.com",
+            "name": "A",
+            "meta_info": {"tier": "gold"},
+            "created_at": "2024-01-01T00:00:00",
+            "provider_customers": [{"provider": "stripe", "provider_customer_id": "cus_1"}],
+        }
+    ]
+    subscriptions = [
+        {
+            "id": "sub_local",
+            "customer_id": "cust_1",
+            "plan_id": "plan_1",
+            "status": "active",
+            "quantity": 2,
+            "created_at": "2024-01-01T00:00:00",
+            "meta_info": {"redirect": {"action_url": "https://pay.example/redirect"}},
+        }
+    ]
+
+    for serializer, model, items in (
+        (main.CUSTOMER_LIST, CustomerResponse, customers),
+        (main.SUBSCRIPTION_LIST, SubscriptionResponse, subscriptions),
+    ):
+        expected = _validated(model, [serializer._payload(item) for item in items])
+        assert json.loads(serializer.response(items).body) == expected
+
+
+def test_list_routes_keep_documented_schemas():
+    schema = main.app.openapi()["paths"]["/customers"]["get"]["responses"]["200"]
+    items = schema["content"]["application/json"]["schema"]["items"]
+    # The example's CustomerResponse, not the library's model of the same name.
+    assert items["$ref"].endswith("CustomerResponse")
+    assert "fastapi_payments" not in items["$ref"]
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from fastapi_payments.api import dependencies as payment_deps
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Subscription
+
+import event_stream
+import main
+from models import WebhookEvent
+from stub_providers import StubProvider
+
+
+def _razorpay_event(event_id, subscription_id, event="subscription.charged"):
+    body = json.dumps(
+        {"event": event, "payload": {"subscription": {"entity": {"id": subscription_id}}}}
+    )
+    return {"content": body, "headers": {"X-Razorpay-Event-Id": event_id}}
+
+
+def _events(client, event_ids):
+    async def load():
+        async with payment_db._sessionmaker() as session:
+            rows = await session.execute(
+                select(WebhookEvent).where(WebhookEvent.event_id.in_(event_ids))
+            )
+            return {row.event_id: row for row in rows.scalars()}
+
+    return client.portal.call(load)
+
+
+def _wait_until_finished(client, event_ids, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        events = _events(client, event_ids)
+        if len(events) == len(event_ids) and all(
+            event.state in ("done", "failed") for event in events.values()
+        ):
+            return events
+        assert time.monotonic() < deadline, {k: e.state for k, e in events.items()}
+        time.sleep(0.02)
+
+
+def test_webhooks_are_acknowledged_then_processed_once_in_entity_order(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    log = []
+
+    async def process(event):
+        log.append(("start", event["event_id"]))
+        if event["event_id"] == "evt_a1":
+            await asyncio.sleep(0.2)
+        log.append(("end", event["event_id"]))
+
+    monkeypatch.setattr(main, "process_webhook", process)
+    with TestClient(main.app) as client:
+        first = client.post("/api/webhooks/razorpay", **_razorpay_event("evt_a1", "sub_a"))
+        assert first.status_code == 200
+        assert first.json() == {"status": "accepted", "event_id": "evt_a1", "duplicate": False}
+        client.post("/api/webhooks/razorpay", **_razorpay_event("evt_a2", "sub_a"))
+        client.post("/api/webhooks/razorpay", **_razorpay_event("evt_b1", "sub_b"))
+        retry = client.post("/api/webhooks/razorpay", **_razorpay_event("evt_a1", "sub_a"))
+        assert retry.json()["duplicate"] is True
+
+        events = _wait_until_finished(client, ["evt_a1", "evt_a2", "evt_b1"])
+
+    assert {event.state for event in events.values()} == {"done"}
+    assert events["evt_a1"].entity_key == "razorpay:sub_a"
+    # Processed once each; sub_b did not wait for sub_a, and evt_a2 waited for evt_a1.
+    assert sorted(event_id for step, event_id in log if step == "start") == [
+        "evt_a1", "evt_a2", "evt_b1"
+    ]
+    assert log.index(("end", "evt_b1")) < log.index(("end", "evt_a1"))
+    assert log.index(("end", "evt_a1")) < log.index(("start", "evt_a2"))
+
+
+def test_failed_webhooks_are_retried(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    monkeypatch.setattr(main.webhooks, "retry_seconds", 0)
+    attempts = []
+
+    async def process(event):
+        attempts.append(event["attempts"])
+        if len(attempts) == 1:
+            raise RuntimeError("broker unavailable")
+
+    monkeypatch.setattr(main, "process_webhook", process)
+    with TestClient(main.app) as client:
+        client.post("/api/webhooks/razorpay", **_razorpay_event("evt_retry", "sub_retry"))
+        event = _wait_until_finished(client, ["evt_retry"])["evt_retry"]
+
+    assert attempts == [0, 1]
+    assert (event.state, event.attempts) == ("done", 1)
+
+
+def test_slow_handlers_keep_their_lease(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    monkeypatch.setattr(main.webhooks, "lease", timedelta(seconds=0.15))
+    monkeypatch.setattr(main.webhooks, "poll_seconds", 0.02)
+    runs = []
+
+    async def process(event):
+        runs.append(event["event_id"])
+        await asyncio.sleep(0.5)
+
+    monkeypatch.setattr(main, "process_webhook", process)
+    with TestClient(main.app) as client:
+        client.post("/api/webhooks/razorpay", **_razorpay_event("evt_slow", "sub_slow"))
+        event = _wait_until_finished(client, ["evt_slow"])["evt_slow"]
+
+    # The dispatcher kept claiming while the handler ran, but never took the
+    # event again.
+    assert runs == ["evt_slow"]
+    assert event.state == "done"
+
+
+def test_unverified_webhooks_are_rejected_and_not_queued(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    with TestClient(main.app) as client:
+        event = _razorpay_event("evt_forged", "sub_forged")
+        event["headers"]["X-Razorpay-Signature"] = "invalid"
+        assert client.post("/api/webhooks/razorpay", **event).status_code == 400
+        assert client.post("/api/webhooks/unknown", json={}).status_code == 404
+        assert _events(client, ["evt_forged"]) == {}
+
+
+def test_processed_webhooks_reach_the_local_subscription_stream(monkeypatch):
+    monkeypatch.setitem(
+        payment_deps._payment_service.providers, "razorpay", StubProvider("razorpay")
+    )
+    with TestClient(main.app) as client:
+
+        async def seed():
+            async with payment_db._sessionmaker() as session:
+                session.add(
+                    Subscription(
+                        id="sub_local_stream",
+                        customer_id="cust_webhook",
+                        plan_id="plan_webhook",
+                        provider="razorpay",
+                        provider_subscription_id="sub_rzp_stream",
+                        status="active",
+                    )
+                )
+                await session.commit()
+
+        client.portal.call(seed)
+        name = event_stream.topic("subscription", "sub_local_stream")
+
+        async def deliver():
+            with main.event_hub.subscribe(name) as queue:
+                await main.webhooks.enqueue(
+                    "razorpay",
+                    "evt_stream",
+                    {
+                        "event_type": "subscription.charged",
+                        "standardized_event_type": "subscription.charged",
+                        "data": {"subscription": {"entity": {"id": "sub_rzp_stream"}}},
+                    },
+                )
+                return await asyncio.wait_for(queue.get(), 5)
+
+        message = client.portal.call(deliver)
+
+    assert message["data"]["subscription_id"] == "sub_local_stream"
+    assert message["data"]["data"]["subscription"]["entity"]["id"] == "sub_rzp_stream"
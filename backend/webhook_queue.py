@@ -0,0 +1,353 @@
+"""Durable queue between provider webhooks and their processing.
+
+The webhook route only verifies the signature and stores the event in
+``webhook_events``, then answers 200 at once. Providers time out and retry
+when the answer is slow, and during bursts such as month-end renewals the
+retries multiply the load. Processing happens afterwards on a pool of
+``workers`` tasks in every app worker:
+
+- Deduplication: the provider's event ID is unique per provider, so a
+  retried delivery is acknowledged again but stored and processed once.
+- Per-entity ordering: an event is only claimed once every earlier event for
+  the same subscription or payment (its ``entity_key``) has finished.
+  Events for different entities run in parallel.
+- Durability: a claim is a lease, renewed while the handler runs. If a
+  worker dies mid-event, the lease lapses and any worker claims the event
+  again, so a handler may see an
+  event twice but never loses one. A failing handler is retried with
+  exponential backoff up to ``max_attempts`` and the event is then marked
+  failed, so later events for the entity can proceed.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Set
+
+from sqlalchemy import and_, delete, exists, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from fastapi_payments.db import repositories as payment_db
+from fastapi_payments.db.models import Payment, Subscription
+
+from leases import naive_utcnow, worker_id
+from models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATES = ("pending", "processing")
+
+# Header each provider sends its webhook signature in; ``signature`` otherwise.
+SIGNATURE_HEADERS = {
+    "stripe": "stripe-signature",
+    "razorpay": "x-razorpay-signature",
+    "cashfree": "x-webhook-signature",
+}
+# Providers whose signature covers the raw body, which must reach them unparsed.
+RAW_BODY_PROVIDERS = {"stripe", "razorpay"}
+EVENT_ID_HEADERS = {"razorpay": "x-razorpay-event-id"}
+# Where the subscription or payment an event is about sits in the verified
+# event's ``data``, most specific first.
+ENTITY_PATHS: Dict[str, Sequence[Sequence[str]]] = {
+    "stripe": (("object", "subscription"), ("object", "payment_intent"), ("object", "id")),
+    "razorpay": (
+        ("subscription", "entity", "id"),
+        ("payment", "entity", "subscription_id"),
+        ("payment", "entity", "order_id"),
+        ("payment", "entity", "id"),
+    ),
+    "payu": (("txnid",),),
+    "cashfree": (("subscription_details", "subscription_id"), ("order", "order_id")),
+}
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _leasable(event, now: datetime):
+    return or_(
+        and_(event.state == "pending", event.available_at <= now),
+        and_(event.state == "processing", event.lease_expires_at < now),
+    )
+
+
+def event_id(provider: str, payload: Mapping[str, Any], headers: Mapping[str, str], body: bytes) -> str:
+    """The provider's ID for this delivery, or a digest of the body.
+
+    Retries resend the same body, so the digest still deduplicates them.
+    """
+    header = EVENT_ID_HEADERS.get(provider)
+    if header and headers.get(header):
+        return headers[header]
+    if provider == "stripe" and payload.get("id"):
+        return str(payload["id"])
+    if provider == "payu" and payload.get("mihpayid"):
+        # PayU posts again for the same payment when its status changes.
+        return f"{payload['mihpayid']}:{payload.get('status', '')}"
+    if payload.get("event_id"):
+        return str(payload["event_id"])
+    return hashlib.sha256(body).hexdigest()
+
+
+def provider_entity_ids(provider: str, data: Any) -> List[str]:
+    """The provider's IDs found at ``ENTITY_PATHS`` in ``data``, most specific first."""
+    ids = []
+    for path in ENTITY_PATHS.get(provider, ()):
+        value: Any = data
+        for key in path:
+            value = value.get(key) if isinstance(value, Mapping) else None
+        if value:
+            ids.append(str(value))
+    return ids
+
+
+def entity_key(provider: str, data: Any, fallback: str) -> str:
+    """Key of the subscription or payment the event is about.
+
+    Events without a recognisable entity get ``fallback`` (their own event
+    ID), so they are ordered against nothing.
+    """
+    ids = provider_entity_ids(provider, data)
+    return f"{provider}:{ids[0]}" if ids else f"{provider}:event:{fallback}"
+
+
+async def local_entity_ids(session: AsyncSession, provider: str, data: Any) -> Dict[str, str]:
+    """``subscription_id`` and ``payment_id`` of the local rows the event is about.
+
+    Webhooks carry the provider's IDs; each is looked up as a
+    ``provider_subscription_id`` and a ``provider_payment_id``. Keys with no
+    matching row are left out.
+    """
+    ids = provider_entity_ids(provider, data)
+    if not ids:
+        return {}
+    found = {}
+    for key, model, column in (
+        ("subscription_id", Subscription, Subscription.provider_subscription_id),
+        ("payment_id", Payment, Payment.provider_payment_id),
+    ):
+        local_id = (
+            await session.execute(
+                select(model.id).where(model.provider == provider, column.in_(ids)).limit(1)
+            )
+        ).scalar()
+        if local_id is not None:
+            found[key] = local_id
+    return found
+
+
+def event_to_dict(event: WebhookEvent) -> Dict[str, Any]:
+    return {
+        "id": event.id,
+        "provider": event.provider,
+        "event_id": event.event_id,
+        "entity_key": event.entity_key,
+        "event_type": event.event_type,
+        "standardized_event_type": event.standardized_event_type,
+        "data": event.data,
+        "attempts": event.attempts,
+    }
+
+
+class WebhookQueue:
+    """Stores verified webhooks and processes them on a pool of worker tasks."""
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        lease_seconds: int,
+        max_attempts: int,
+        retry_seconds: float,
+        poll_seconds: float,
+        retention_days: int,
+    ):
+        self.workers = workers
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+        self.retention = timedelta(days=retention_days)
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    # Ingestion -------------------------------------------------------------
+
+    async def enqueue(
+        self,
+        provider: str,
+        provider_event_id: str,
+        verified: Mapping[str, Any],
+    ) -> bool:
+        """Store a verified event; returns False if it was already stored."""
+        now = naive_utcnow()
+        data = verified.get("data")
+        async with payment_db._sessionmaker() as session:
+            session.add(
+                WebhookEvent(
+                    provider=provider,
+                    event_id=provider_event_id,
+                    entity_key=entity_key(provider, data, provider_event_id),
+                    event_type=verified.get("event_type"),
+                    standardized_event_type=verified.get("standardized_event_type"),
+                    data=data,
+                    state="pending",
+                    attempts=0,
+                    available_at=now,
+                    received_at=now,
+                )
+            )
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return False
+        if self._wake is not None:
+            self._wake.set()
+        return True
+
+    async def purge_processed(self) -> int:
+        """Drop finished events older than the retention, which is also the dedup window."""
+        async with payment_db._sessionmaker() as session:
+            result = await session.execute(
+                delete(WebhookEvent).where(
+                    WebhookEvent.state.in_(("done", "failed")),
+                    WebhookEvent.received_at < naive_utcnow() - self.retention,
+                )
+            )
+            await session.commit()
+        return result.rowcount or 0
+
+    # Processing ------------------------------------------------------------
+
+    def start(self, handler: Handler) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(handler))
+
+    async def shutdown(self) -> None:
+        """Stop processing; leases of events in flight lapse and they are claimed again."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    async def _dispatch(self, handler: Handler) -> None:
+        running: Set[asyncio.Task] = set()
+        try:
+            while True:
+                self._wake.clear()
+                free = self.workers - len(running)
+                claimed = await self._claim(free) if free else []
+                for event in claimed:
+                    running.add(asyncio.create_task(self._process(event, handler)))
+                # Claim again once an event finishes (which may unblock the
+                # next one for its entity), one is enqueued here, or another
+                # worker may have enqueued some.
+                woken = asyncio.create_task(self._wake.wait())
+                done, _ = await asyncio.wait(
+                    running | {woken}, timeout=self.poll_seconds, return_when=asyncio.FIRST_COMPLETED
+                )
+                woken.cancel()
+                running -= done
+        except Exception:
+            logger.exception("Webhook dispatcher stopped")
+            raise
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` events that are first in line for their entity."""
+        now = naive_utcnow()
+        candidate = aliased(WebhookEvent)
+        earlier = aliased(WebhookEvent)
+        earlier_unfinished = exists().where(
+            earlier.entity_key == candidate.entity_key,
+            earlier.id < candidate.id,
+            earlier.state.in_(UNFINISHED_STATES),
+        )
+        claimable = (
+            select(candidate.id)
+            .where(_leasable(candidate, now), ~earlier_unfinished)
+            .order_by(candidate.id)
+            .limit(limit)
+        )
+        async with payment_db._sessionmaker() as session:
+            if session.bind.dialect.name == "postgresql":
+                # Concurrent workers skip each other's candidates instead of
+                # both picking them under READ COMMITTED.
+                claimable = claimable.with_for_update(skip_locked=True)
+            result = await session.execute(
+                update(WebhookEvent)
+                # Re-checked on the row itself, in case another worker
+                # leased it after the subquery read it.
+                .where(WebhookEvent.id.in_(claimable), _leasable(WebhookEvent, now))
+                .values(state="processing", lease_owner=worker_id(), lease_expires_at=now + self.lease)
+                .returning(WebhookEvent)
+                .execution_options(synchronize_session=False)
+            )
+            events = [event_to_dict(event) for event in result.scalars()]
+            await session.commit()
+        return sorted(events, key=lambda event: event["id"])
+
+    async def _run_leased(self, event: Dict[str, Any], handler: Handler) -> None:
+        renewer = asyncio.create_task(self._renew(event["id"]))
+        try:
+            await handler(event)
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+
+    async def _renew(self, webhook_event_id: int) -> None:
+        """Extend the lease every third of its length, so a slow handler keeps it."""
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                async with payment_db._sessionmaker() as session:
+                    await session.execute(
+                        update(WebhookEvent)
+                        .where(
+                            WebhookEvent.id == webhook_event_id,
+                            WebhookEvent.state == "processing",
+                            WebhookEvent.lease_owner == worker_id(),
+                        )
+                        .values(lease_expires_at=naive_utcnow() + self.lease)
+                    )
+                    await session.commit()
+            except Exception:
+                logger.warning(
+                    "Renewing a webhook lease failed",
+                    extra={"webhook_event_id": webhook_event_id},
+                    exc_info=True,
+                )
+
+    async def _process(self, event: Dict[str, Any], handler: Handler) -> None:
+        now = naive_utcnow()
+        try:
+            await self._run_leased(event, handler)
+        except Exception as exc:
+            attempts = event["attempts"] + 1
+            logger.warning(
+                "Webhook processing failed",
+                extra={"webhook_event_id": event["id"], "attempts": attempts, "error": str(exc)},
+            )
+            if attempts >= self.max_attempts:
+                values: Dict[str, Any] = {"state": "failed", "processed_at": now}
+            else:
+                delay = self.retry_seconds * 2 ** (attempts - 1)
+                values = {"state": "pending", "available_at": now + timedelta(seconds=delay)}
+            values.update(attempts=attempts, error=str(exc)[:500])
+        else:
+            values = {"state": "done", "processed_at": naive_utcnow(), "error": None}
+        async with payment_db._sessionmaker() as session:
+            await session.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id == event["id"], WebhookEvent.lease_owner == worker_id())
+                .values(lease_owner=None, lease_expires_at=None, **values)
+            )
+            await session.commit()
@@ -1,7 +1,8 @@
 "use client"
 
-import React, { use } from 'react'
+import React, { use, useEffect } from 'react'
 import { useSearchParams } from 'next/navigation'
+import { readPrimaryForAWhile } from '@/lib/api-client'
 
 export default function ProviderCancel({ params }: { params: Promise<{ provider: string }> }) {
   // `params` is a Promise in client components - unwrap it with React.use()
@@ -11,6 +12,10 @@ export default function ProviderCancel({ params }: { params: Promise<{ provider:
   const searchParams = useSearchParams()
   const entries = Array.from(searchParams.entries())
 
+  useEffect(() => {
+    readPrimaryForAWhile()
+  }, [])
+
   return (
     <div className="max-w-3xl mx-auto py-12 px-6">
       <h1 className="text-2xl font-semibold mb-4">{provider} payment cancelled</h1>
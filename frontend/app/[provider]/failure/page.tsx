@@ -1,12 +1,17 @@
 "use client"
 
-import React from 'react'
+import React, { useEffect } from 'react'
 import { useSearchParams } from 'next/navigation'
+import { readPrimaryForAWhile } from '@/lib/api-client'
 
 export default function ProviderFailure({ params }: { params: { provider: string } }) {
   const searchParams = useSearchParams()
   const entries = Array.from(searchParams.entries())
 
+  useEffect(() => {
+    readPrimaryForAWhile()
+  }, [])
+
   return (
     <div className="max-w-3xl mx-auto py-12 px-6">
       <h1 className="text-2xl font-semibold mb-4">{params.provider} payment failed</h1>
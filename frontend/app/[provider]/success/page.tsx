@@ -5,6 +5,7 @@ import { useSearchParams } from 'next/navigation'
 import Link from 'next/link'
 import { Button } from '@/components/ui/button'
 import { CheckCircle2 } from 'lucide-react'
+import { readPrimaryForAWhile } from '@/lib/api-client'
 
 export default function ProviderSuccess({ params }: { params: { provider: string } }) {
   const searchParams = useSearchParams()
@@ -13,6 +14,8 @@ export default function ProviderSuccess({ params }: { params: { provider: string
   const [mandateToken, setMandateToken] = useState<string | null>(null)
 
   useEffect(() => {
+    readPrimaryForAWhile()
+
     // Check if this is a PayU subscription (SI) success
     const status = searchParams.get('status')
     const si = searchParams.get('si')
@@ -8,6 +8,25 @@ const apiClient = axios.create({
   },
 });
 
+// After a provider redirects back, the backend has just written the outcome
+// to the primary database, which a read replica may not show yet. The
+// redirect-return pages call readPrimaryForAWhile() so the reads that follow
+// ask the backend for the primary (X-Read-Primary) for a short window.
+const READ_PRIMARY_KEY = 'readPrimaryUntil';
+const READ_PRIMARY_WINDOW_MS = 60_000;
+
+export function readPrimaryForAWhile() {
+  if (typeof window === 'undefined') return;
+  window.sessionStorage.setItem(READ_PRIMARY_KEY, String(Date.now() + READ_PRIMARY_WINDOW_MS));
+}
+
+apiClient.interceptors.request.use(config => {
+  if (typeof window !== 'undefined' && Number(window.sessionStorage.getItem(READ_PRIMARY_KEY)) > Date.now()) {
+    config.headers['X-Read-Primary'] = '1';
+  }
+  return config;
+});
+
 // Add response interceptor for error handling
 apiClient.interceptors.response.use(
   response => response,